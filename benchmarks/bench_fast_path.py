@@ -0,0 +1,108 @@
+"""
+Benchmark: fast-path intent routing for first-turn messages.
+
+Scores the app's FastPathRouter against the labelled corpus in
+benchmarks/data/fast_path_corpus.jsonl (one {"text", "intent"} object per
+line; "intent" is null for messages the LLM must answer), then reports the
+weighted hit rate over the first messages of the SalesIQ conversations in
+benchmarks/data/salesiq_conversations.json and the routing time per
+message. Exits non-zero if any corpus line is routed wrongly — a false
+positive would send a canned answer the LLM would not have given.
+
+Usage:
+    python benchmarks/bench_fast_path.py [--rounds 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+os.environ.setdefault("SESSION_SNAPSHOT_PATH", "")
+
+import llm_chatbot_simplified as app  # noqa: E402
+import fast_path  # noqa: E402
+from fast_path import FastPathRouter  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "fast_path_corpus.jsonl")
+SCENARIOS_PATH = os.path.join(os.path.dirname(__file__), "data", "salesiq_conversations.json")
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_messages():
+    """(first user message, weight) per SalesIQ scenario."""
+    with open(SCENARIOS_PATH, encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    return [
+        (next(t["text"] for t in s["turns"] if t["kind"] != "trigger"), s.get("weight", 1))
+        for s in scenarios
+    ]
+
+
+def fresh_router() -> FastPathRouter:
+    router = FastPathRouter(app.FAST_PATH_INTENTS, mode="on")
+    router.load_prompt(app.prompt_registry.current)
+    return router
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    app.logger.disabled = True
+    fast_path.logger.disabled = True
+
+    corpus = load_corpus()
+    router = fresh_router()
+    wrong = []
+    outcomes = Counter()
+    for row in corpus:
+        match = router.route(row["text"])
+        got = match.intent if match else None
+        outcomes[(row["intent"], got)] += 1
+        if got != row["intent"]:
+            wrong.append((row, got))
+
+    print(f"Corpus: {len(corpus)} labelled messages, {len(wrong)} routed wrongly\n")
+    print(f"{'intent':<22} {'expected':>8} {'served':>7} {'missed':>7} {'false +':>8}")
+    for intent in [i.name for i in app.FAST_PATH_INTENTS]:
+        expected = sum(n for (e, _), n in outcomes.items() if e == intent)
+        served = outcomes[(intent, intent)]
+        false_pos = sum(n for (e, g), n in outcomes.items() if g == intent and e != intent)
+        print(f"{intent:<22} {expected:>8} {served:>7} {expected - served:>7} {false_pos:>8}")
+    print(f"declined: {dict(router.declined)}")
+
+    router = fresh_router()
+    firsts = first_messages()
+    for text, weight in firsts:
+        for _ in range(weight):
+            router.route(text)
+    print(f"\nSalesIQ first messages: {len(firsts)} scenarios, weighted hit rate {router.stats()['hit_rate']:.1%}")
+
+    texts = [row["text"] for row in corpus]
+    router = fresh_router()
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for text in texts:
+            router.route(text)
+    per_message = (time.perf_counter() - start) / (args.rounds * len(texts)) * 1e6
+    print(f"route(): {per_message:.1f} µs per message")
+
+    if wrong:
+        print("\nMisrouted:")
+        for row, got in wrong:
+            print(f"  expected {row['intent']}, got {got}: {row['text']!r}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
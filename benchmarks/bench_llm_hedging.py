@@ -0,0 +1,87 @@
+"""
+Benchmark: LLM latency with and without hedging, against the local fake
+OpenAI-compatible server.
+
+The primary model is usually fast but has a slow tail; the secondary is a
+little slower but steady. Runs the same number of calls through HedgedLLM
+with a single model (no hedging) and with the two-model cascade, and
+reports p50 / p95 / p99, failed calls, which model won and the estimated
+latency saved. Give the primary an error rate to exercise the fallback.
+
+Usage:
+    python benchmarks/bench_llm_hedging.py [--calls 300] [--concurrency 20] \\
+        [--primary 200,0.08,3000] [--secondary 350]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from fake_openai_server import ModelProfile, create_app, serve_in_thread  # noqa: E402
+from llm_hedging import HedgedLLM  # noqa: E402
+
+PRIMARY = "google/gemini-2.5-flash"
+SECONDARY = "openai/gpt-4o-mini"
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(llm: HedgedLLM, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await llm.create(messages=[{"role": "user", "content": "quickbooks is frozen"}], max_tokens=50)
+            except Exception:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--primary", default="200,0.08,3000", help="base_ms[,slow_prob,slow_ms[,error_rate]]")
+    parser.add_argument("--secondary", default="350")
+    args = parser.parse_args()
+
+    app = create_app({PRIMARY: ModelProfile.parse(args.primary), SECONDARY: ModelProfile.parse(args.secondary)})
+    serve_in_thread(app, args.port)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    print(f"{'cascade':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'hedges':>7} "
+          f"{'wins':<40} {'saved ms':>9}")
+    for name, models in (("single", [PRIMARY]), ("hedged", [PRIMARY, SECONDARY])):
+        client = AsyncOpenAI(api_key="bench", base_url=base_url, max_retries=0)
+        llm = HedgedLLM(client, models, hedge_after_ms=1000, min_hedge_ms=100)
+        latencies, errors = asyncio.run(run(llm, args.calls, args.concurrency))
+        stats = llm.stats()
+        wins = ", ".join(f"{m.split('/')[-1]}={n}" for m, n in stats["wins"].items())
+        print(f"{name:<10} {_percentile(latencies, 0.5):>8.0f} {_percentile(latencies, 0.95):>8.0f} "
+              f"{_percentile(latencies, 0.99):>8.0f} {errors:>7} {stats['hedges']:>7} {wins:<40} "
+              f"{stats['latency_saved_ms']:>9}")
+
+    print(f"\nRequests seen by the fake server: {app.state.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: escalation / resolution phrase detection, substring loop vs.
+compiled PhraseMatcher.
+
+Scores both approaches against the labelled corpus in
+benchmarks/data/phrase_corpus.jsonl (one {"kind", "text", "fires"} object
+per line) and times them per message. "substring" is the original
+`phrase in text` loop over each phrase list; "compiled" is the matcher the
+app uses now. "short" times the corpus lines, "chat" the user messages of
+the SalesIQ conversations in benchmarks/data/salesiq_conversations.json
+(closer to live traffic, where most messages fire nothing), and "long" a
+pasted error log. Exits non-zero if the compiled matcher mislabels any line.
+
+Usage:
+    python benchmarks/bench_phrase_matcher.py [--rounds 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+import llm_chatbot_simplified as app  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "phrase_corpus.jsonl")
+SCENARIOS_PATH = os.path.join(os.path.dirname(__file__), "data", "salesiq_conversations.json")
+
+# Long messages (pasted error logs) are where per-phrase scans hurt most
+LONG_MESSAGE = ("QuickBooks error -6000 -83 while opening company file on the server. " * 40).strip()
+
+
+def substring_detector(kind):
+    """The original detection logic, kept here as the baseline."""
+    if kind == "resolution":
+        def detect(text):
+            text = text.lower().strip()
+            if any(p in text for p in app.EXPLICIT_CLOSE_PHRASES):
+                return True
+            return len(text) < 60 and any(p in text for p in app.USER_RESOLUTION_PHRASES)
+    elif kind == "escalation_user":
+        def detect(text):
+            return any(p in text.lower() for p in app.ESCALATION_KEYWORDS)
+    else:
+        def detect(text):
+            return any(p in text.lower() for p in app.BOT_ESCALATION_PHRASES)
+    return detect
+
+
+def compiled_detector(kind):
+    if kind == "resolution":
+        def detect(text):
+            return app.detect_resolution(text, [])
+    elif kind == "escalation_user":
+        def detect(text):
+            return app.USER_ESCALATION_MATCHER.search(text) is not None
+    else:
+        def detect(text):
+            return app.BOT_ESCALATION_MATCHER.search(text) is not None
+    return detect
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def chat_messages():
+    with open(SCENARIOS_PATH, encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    return [t["text"] for s in scenarios for t in s["turns"] if t["kind"] != "trigger"]
+
+
+def score(corpus, factory):
+    wrong = []
+    for row in corpus:
+        if factory(row["kind"])(row["text"]) != row["fires"]:
+            wrong.append(row)
+    return wrong
+
+
+def time_per_message(texts, detect, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            detect(text)
+    return (time.perf_counter() - start) / (rounds * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    app.logger.disabled = True
+    corpus = load_corpus()
+    chat = chat_messages()
+
+    print(f"Corpus: {len(corpus)} labelled messages\n")
+    print(f"{'detector':<10} {'kind':<16} {'errors':>6} {'short µs':>9} {'chat µs':>9} {'long µs':>9}")
+    failures = []
+    for name, factory in (("substring", substring_detector), ("compiled", compiled_detector)):
+        wrong = score(corpus, factory)
+        if name == "compiled":
+            failures = wrong
+        for kind in ("resolution", "escalation_user", "escalation_bot"):
+            texts = [r["text"] for r in corpus if r["kind"] == kind]
+            detect = factory(kind)
+            errors = sum(1 for r in wrong if r["kind"] == kind)
+            short_us = time_per_message(texts, detect, args.rounds)
+            chat_us = time_per_message(chat, detect, args.rounds)
+            long_us = time_per_message([LONG_MESSAGE], detect, args.rounds)
+            print(f"{name:<10} {kind:<16} {errors:>6} {short_us:>9.2f} {chat_us:>9.2f} {long_us:>9.2f}")
+
+    if failures:
+        print("\nCompiled matcher mislabels:")
+        for row in failures:
+            print(f"  [{row['kind']}] expected fires={row['fires']}: {row['text']!r}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: prompt tokens per LLM call, full expert prompt vs. retrieval.
+
+Replays a set of representative multi-turn conversations through
+PromptRetriever and reports the estimated system-prompt tokens per turn
+(~4 chars/token) plus the time spent building each prompt.
+
+The multi-hop conversations follow a procedure's routing ("Go to LOGIN
+ERROR DIAGNOSIS") with a follow-up that names no procedure itself; the
+procedure the script leads to must be in that turn's prompt. Exits non-zero
+if one is missing (compare with --max-link-tokens 0).
+
+Usage:
+    python benchmarks/bench_prompt_retrieval.py [--top-k 3] [--max-link-tokens 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from prompt_retrieval import PromptRetriever, estimate_tokens  # noqa: E402
+
+PROMPT_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "config", "prompts", "expert_system_prompt_production.txt"
+)
+
+# Each conversation is the sequence of user turns (assistant turns are filled in)
+CONVERSATIONS = [
+    ["I forgot my password", "only me", "ok I'm there", "done", "it's working now"],
+    ["quickbooks is frozen", "no I don't see the reset icon", "ok", "done", "still not working"],
+    ["how do I find my server name?", "yes I have the rdp icon", "found it thanks"],
+    ["I need to generate a new rdp file", "ok", "I don't know my username", "yes", "done"],
+    ["my printer is not showing on the server", "nothing happens", "quickbooks", "usb", "windows"],
+    ["the server keeps disconnecting", "no error", "just me", "done", "50 mbps down 20 up 15ms"],
+    ["excel says unlicensed product", "yes", "ok"],
+    ["outlook is not working", "it won't open", "no error"],
+    ["disk space is low on my server", "ok", "done"],
+    ["cpu usage is at 99%", "ok", "still slow"],
+    ["hi", "I'm facing an issue", "can't login", "the logon attempt failed"],
+    ["I want to set up dual monitors", "use multiple monitors", "windows", "done"],
+]
+
+# (user turns, procedure the last turn must have in its prompt)
+MULTI_HOP = [
+    (["I forgot my password", "only me", "done", "no", "it's a different error now"],
+     "LOGIN ERROR DIAGNOSIS"),
+    (["I can't login", "it says the remote computer can't be found"], "CONNECTION ERROR"),
+    (["I can't login", "the logon attempt failed"], "PASSWORD RESET (SelfCare)"),
+    (["I'm facing an issue", "it's stuck"], "APPLICATION FROZEN"),
+    (["I'm having a problem", "it keeps dropping"], "SERVER DISCONNECTION"),
+    (["I'm having a problem", "everything is really sluggish"], "SYSTEM SLOWNESS / LAG"),
+    (["having an issue with an application", "it's not responding"], "APPLICATION FROZEN"),
+    (["having an issue with an application", "excel"], "OFFICE 365 / EXCEL LICENSE ISSUE"),
+    (["having an issue with an application", "outlook"], "OUTLOOK / EMAIL NOT WORKING"),
+    (["my rdp file is not working", "the file seems corrupted"], "RDP FILE GENERATION (New User Setup)"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-link-tokens", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(PROMPT_PATH, encoding="utf-8") as f:
+        prompt = f.read()
+
+    retriever = PromptRetriever(prompt, top_k=args.top_k, max_link_tokens=args.max_link_tokens)
+    full_tokens = estimate_tokens(prompt)
+
+    turns = 0
+    retrieved_tokens = 0
+    build_times = []
+    for n, user_turns in enumerate(CONVERSATIONS):
+        session_id = f"bench-{n}"
+        history = []
+        for text in user_turns:
+            history.append({"role": "user", "content": text})
+            start = time.perf_counter()
+            system_prompt = retriever.build_system_prompt(history, session_id)
+            build_times.append(time.perf_counter() - start)
+            retrieved_tokens += estimate_tokens(system_prompt)
+            turns += 1
+            history.append({"role": "assistant", "content": "(assistant reply)"})
+
+    avg_retrieved = retrieved_tokens / turns
+    build_times.sort()
+    print(f"procedures indexed      : {len(retriever.procedures)}")
+    print(f"turns replayed          : {turns}")
+    print(f"full prompt tokens/turn : {full_tokens}")
+    print(f"retrieved tokens/turn   : {avg_retrieved:.0f}")
+    print(f"reduction               : {100 * (1 - avg_retrieved / full_tokens):.1f}%")
+    print(f"build p50 / max         : {build_times[len(build_times) // 2] * 1e6:.0f} us"
+          f" / {build_times[-1] * 1e6:.0f} us")
+
+    missing = []
+    for n, (user_turns, expected) in enumerate(MULTI_HOP):
+        history = []
+        for text in user_turns:
+            history.append({"role": "user", "content": text})
+            system_prompt = retriever.build_system_prompt(history, f"hop-{n}")
+            history.append({"role": "assistant", "content": "(assistant reply)"})
+        if f"PROCEDURE: {expected}\n" not in system_prompt:
+            missing.append((user_turns[-1], expected))
+    print(f"multi-hop next procedure: {len(MULTI_HOP) - len(missing)}/{len(MULTI_HOP)} present")
+    if missing:
+        for text, expected in missing:
+            print(f"  missing {expected!r} after {text!r}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: response cache near-duplicate lookups.
+
+Replays the labelled pairs in benchmarks/data/cache_pairs.jsonl (one
+{"cached", "asked", "hit"} object per line, optionally with the cached
+"answer"): "cached" is stored, "asked" is looked up, and the lookup must hit
+exactly when "hit" is true. Pairs that differ only in a negation or an error
+code must miss — reusing the answer to the opposite question is worse than
+calling the LLM — and so must near-duplicates of a message whose answer
+echoes a name from it (the cache knows the production prompt's words). Then times
+exact hits, near hits and misses against a cache filled with --entries
+messages. Exits non-zero if any pair is answered wrongly.
+
+Usage:
+    python benchmarks/bench_response_cache.py [--entries 1000] [--rounds 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from response_cache import ResponseCache  # noqa: E402
+
+PAIRS_PATH = os.path.join(os.path.dirname(__file__), "data", "cache_pairs.jsonl")
+PROMPT_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "config", "prompts", "expert_system_prompt_production.txt"
+)
+
+
+def load_pairs():
+    with open(PAIRS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def time_lookup(cache: ResponseCache, message: str, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        cache.get(message)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(PROMPT_PATH, encoding="utf-8") as f:
+        prompt = f.read()
+
+    wrong = []
+    pairs = load_pairs()
+    for pair in pairs:
+        cache = ResponseCache()
+        cache.set_prompt_version("bench", prompt)
+        cache.put(pair["cached"], pair.get("answer", "cached answer"))
+        if (cache.get(pair["asked"]) is not None) != pair["hit"]:
+            wrong.append(pair)
+    print(f"Pairs: {len(pairs)} labelled, {len(wrong)} answered wrongly")
+
+    cache = ResponseCache(max_entries=args.entries, max_bytes=1 << 30)
+    for i in range(args.entries):
+        cache.put(f"quickbooks error {i} when opening company file number {i * 7}", "answer")
+    cache.put("quickbooks is frozen on the hosted server", "answer")
+    print(f"exact hit  {time_lookup(cache, 'quickbooks is frozen on the hosted server', args.rounds):8.1f} µs")
+    print(f"near hit   {time_lookup(cache, 'quickbooks is frozen on hosted server', args.rounds):8.1f} µs")
+    print(f"miss       {time_lookup(cache, 'quickbooks error 99999 when opening company file', args.rounds):8.1f} µs")
+    print(f"stats      {cache.stats()}")
+
+    if wrong:
+        print("\nWrong lookups:")
+        for pair in wrong:
+            print(f"  expected hit={pair['hit']}: {pair['cached']!r} → {pair['asked']!r}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: session expiry cost, full scan vs. O(expired) sweep.
+
+For each store size, fills a store, ages the oldest 1% past the TTL and
+measures (a) one cleanup pass and (b) get_or_create latency (p50 / p99 /
+max) over a mix of existing and new sessions. "full-scan" is the original
+datetime-based SessionStore; "sweep" is MemorySessionStore.
+
+Usage:
+    python benchmarks/bench_session_expiry.py [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session_store import MemorySessionStore  # noqa: E402
+
+
+class FullScanStore:
+    """The original SessionStore expiry logic, kept here as the baseline."""
+
+    def __init__(self, max_sessions, ttl_minutes):
+        self._store = OrderedDict()
+        self._last_active = {}
+        self.max_sessions = max_sessions
+        self.ttl_minutes = ttl_minutes
+
+    def get_or_create(self, session_id):
+        if session_id in self._store:
+            self._store.move_to_end(session_id)
+        else:
+            if len(self._store) >= self.max_sessions:
+                oldest_key, _ = self._store.popitem(last=False)
+                self._last_active.pop(oldest_key, None)
+            self._store[session_id] = []
+        self._last_active[session_id] = datetime.now()
+        return self._store[session_id]
+
+    def cleanup_expired(self):
+        now = datetime.now()
+        expired = [
+            sid for sid, last in self._last_active.items()
+            if (now - last).total_seconds() > self.ttl_minutes * 60
+        ]
+        for sid in expired:
+            self._store.pop(sid, None)
+            self._last_active.pop(sid, None)
+        return len(expired)
+
+    def age(self, ids):
+        old = datetime.now() - timedelta(minutes=self.ttl_minutes * 2)
+        for sid in ids:
+            self._last_active[sid] = old
+
+
+class SweepStore(MemorySessionStore):
+    def age(self, ids):
+        old = time.monotonic() - self.ttl_minutes * 120
+        for sid in ids:
+            self._last_active[sid] = old
+
+
+def run(cls, size):
+    store = cls(max_sessions=size * 2, ttl_minutes=30)
+    ids = [f"sess-{i}" for i in range(size)]
+    for sid in ids:
+        store.get_or_create(sid)
+    store.age(ids[: size // 100])
+    gc.collect()
+
+    start = time.perf_counter()
+    removed = store.cleanup_expired()
+    cleanup_ms = (time.perf_counter() - start) * 1000
+
+    # Age another 1% and measure access latency while they are pending expiry
+    store.age(ids[size // 100: size // 50])
+    rng = random.Random(7)
+    samples = []
+    for n in range(20000):
+        sid = f"new-{n}" if n % 10 == 0 else ids[rng.randrange(size // 50, size)]
+        start = time.perf_counter()
+        store.get_or_create(sid)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    pct = lambda q: samples[int(q * (len(samples) - 1))] * 1e6  # noqa: E731
+    return removed, cleanup_ms, pct(0.5), pct(0.99), samples[-1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session expiry benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'sessions':>9} {'store':<10} {'expired':>8} {'cleanup ms':>11} "
+          f"{'get p50 us':>11} {'get p99 us':>11} {'get max us':>11}")
+    for size in args.sizes:
+        for name, cls in (("full-scan", FullScanStore), ("sweep", SweepStore)):
+            removed, cleanup_ms, p50, p99, worst = run(cls, size)
+            print(f"{size:>9} {name:<10} {removed:>8} {cleanup_ms:>11.2f} "
+                  f"{p50:>11.2f} {p99:>11.2f} {worst:>11.1f}")
+            gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: session snapshot write and restore time.
+
+Fills a MemorySessionStore with N sessions whose histories are replayed
+from benchmarks/data/salesiq_conversations.json (a mix of short and long
+conversations, some carrying the callback marker), ages a share of them
+past the TTL, then measures a full `snapshot()`, a periodic re-snapshot
+after a few sessions changed, and `restore()` into a fresh store.
+Exits with status 1 if restoring takes longer than --max-restore-ms.
+
+Usage:
+    python benchmarks/bench_session_snapshot.py [--sessions 100000] [--expired 0.1] \\
+        [--active 0.05] [--max-restore-ms 1000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session_store import MemorySessionStore  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "salesiq_conversations.json")
+BOT_REPLY = ("Let's try this: 1. Close QuickBooks from Task Manager 2. Reopen the company file. "
+             "Did that work?")
+
+
+def _histories():
+    """One history per scenario, as the bot would have stored it mid-conversation."""
+    with open(DATA, encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    histories = []
+    for scenario in scenarios:
+        history = []
+        for turn in scenario["turns"]:
+            if turn["kind"] == "trigger":
+                continue
+            if turn["kind"] == "button" and turn["text"] == "SCHEDULE_CALLBACK":
+                history.append({"role": "system", "content": "WAITING_FOR_CALLBACK_DETAILS"})
+                continue
+            history.append({"role": "user", "content": turn["text"]})
+            history.append({"role": "assistant", "content": BOT_REPLY})
+        histories.append(history)
+    return histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--expired", type=float, default=0.1, help="share of sessions past the TTL")
+    parser.add_argument("--active", type=float, default=0.05,
+                        help="share of sessions touched between two snapshots")
+    parser.add_argument("--max-restore-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    templates = _histories()
+    ttl_minutes = 30
+    store = MemorySessionStore(max_sessions=args.sessions, ttl_minutes=ttl_minutes, max_messages=20)
+    for i in range(args.sessions):
+        sid = f"bench-{i:07d}"
+        store.get_or_create(sid)
+        store.save(sid, [dict(m) for m in rng.choice(templates)])
+
+    # Age the least recently used share past the TTL
+    expired = int(args.sessions * args.expired)
+    for sid in list(store._store)[:expired]:
+        store._last_active[sid] -= ttl_minutes * 60 + 1
+
+    path = os.path.join(tempfile.mkdtemp(), "sessions.snapshot")
+    gc.collect()
+    start = time.perf_counter()
+    written = store.snapshot(path)
+    write_ms = (time.perf_counter() - start) * 1000
+    size_mb = os.path.getsize(path) / 1e6
+
+    # Periodic snapshot: only sessions active since the last one are re-encoded
+    active = int(args.sessions * args.active)
+    for i in rng.sample(range(expired, args.sessions), active):
+        store.add_message(f"bench-{i:07d}", {"role": "user", "content": "still not working"})
+    start = time.perf_counter()
+    store.snapshot(path)
+    rewrite_ms = (time.perf_counter() - start) * 1000
+
+    restored_store = MemorySessionStore(max_sessions=args.sessions, ttl_minutes=ttl_minutes, max_messages=20)
+    gc.collect()
+    start = time.perf_counter()
+    restored = restored_store.restore(path)
+    restore_ms = (time.perf_counter() - start) * 1000
+
+    sample = f"bench-{args.sessions - 1:07d}"
+    assert restored == written == args.sessions - expired, (written, restored)
+    assert restored_store.get_or_create(sample) == store.get_or_create(sample)
+
+    print(f"sessions      {args.sessions:>10,}  ({expired:,} expired)")
+    print(f"snapshot      {written:>10,} written in {write_ms:8.1f} ms  ({size_mb:.1f} MB)")
+    print(f"re-snapshot   {written:>10,} written in {rewrite_ms:8.1f} ms  ({active:,} changed)")
+    print(f"restore       {restored:>10,} loaded  in {restore_ms:8.1f} ms")
+    if restore_ms > args.max_restore_ms:
+        print(f"FAIL: restore took longer than {args.max_restore_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
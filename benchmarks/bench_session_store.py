@@ -0,0 +1,100 @@
+"""
+Benchmark: per-operation latency of each SessionStore backend.
+
+Runs the same workload (create, get_or_create, add_message, save, reset)
+against the memory, SQLite and Redis-protocol backends. Redis uses
+--redis-url if given, otherwise the local RESP stand-in (resp_server.py).
+
+Usage:
+    python benchmarks/bench_session_store.py [--sessions 2000] [--redis-url redis://...]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from session_store import create_session_store  # noqa: E402
+from resp_server import serve  # noqa: E402
+
+MESSAGE = {"role": "user", "content": "QuickBooks is frozen and I can't close it " * 3}
+
+
+def _start_stand_in(port: int):
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def run():
+        await serve("127.0.0.1", port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=loop.run_until_complete, args=(run(),), daemon=True).start()
+    ready.wait(5)
+
+
+def _percentiles(samples):
+    samples.sort()
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6  # noqa: E731
+    return pick(0.5), pick(0.99)
+
+
+def bench(store, sessions: int):
+    results = {}
+
+    def timed(name, fn, ids):
+        samples = []
+        for sid in ids:
+            start = time.perf_counter()
+            fn(sid)
+            samples.append(time.perf_counter() - start)
+        results[name] = _percentiles(samples)
+
+    ids = [f"bench-{i}" for i in range(sessions)]
+    timed("create", store.get_or_create, ids)
+    timed("get_or_create", store.get_or_create, ids)
+    timed("add_message", lambda sid: store.add_message(sid, MESSAGE), ids)
+
+    def save(sid):
+        history = store.get_or_create(sid)
+        history.append(MESSAGE)
+        store.save(sid, history)
+    timed("get+save", save, ids)
+    timed("reset", store.reset, ids)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SessionStore backend latency")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--redis-url", default="")
+    args = parser.parse_args()
+
+    redis_url = args.redis_url
+    if not redis_url:
+        _start_stand_in(6399)
+        redis_url = "redis://127.0.0.1:6399/0"
+
+    tmpdir = tempfile.mkdtemp()
+    backends = {
+        "memory": {},
+        "sqlite": {"sqlite_path": os.path.join(tmpdir, "sessions.db")},
+        "redis": {"redis_url": redis_url},
+    }
+
+    print(f"{'backend':<8} {'operation':<14} {'p50 us':>10} {'p99 us':>10}")
+    for name, extra in backends.items():
+        store = create_session_store(name, max_sessions=args.sessions * 2, max_messages=20, **extra)
+        for op, (p50, p99) in bench(store, args.sessions).items():
+            print(f"{name:<8} {op:<14} {p50:>10.1f} {p99:>10.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: webhook payload parse + reply render, per request.
+
+Times three SalesIQ events (initial trigger, a short message, a pasted
+error log from benchmarks/data/salesiq_conversations.json), each decoded
+and answered with a reply:
+
+  baseline  → json.loads + chained .get / isinstance, JSONResponse (stdlib json)
+  typed     → webhook_payload.parse_webhook + render_reply
+  static    → parse_webhook + a pre-serialized StaticReply (greeting/reset/transfer)
+
+The typed paths use orjson when it is installed; --stdlib forces the stdlib
+fallback so both can be compared.
+
+Usage:
+    python benchmarks/bench_webhook_json.py [--rounds 20000] [--stdlib]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "salesiq_conversations.json")
+
+GREETING = "Hi! I'm AceBuddy, What can I help you with today?"
+REPLY = ("Let's try this: 1. Close QuickBooks from Task Manager 2. Reopen the company file. "
+         "Did that work?")
+
+
+def _payloads():
+    with open(DATA, encoding="utf-8") as f:
+        scenarios = {s["name"]: s for s in json.load(f)["scenarios"]}
+    visitor = {"active_conversation_id": "2782000001234567", "name": "Jane Doe",
+               "email": "jane@example.com", "ip": "203.0.113.7", "channel": "website"}
+    pasted = scenarios["pasted_error_log"]["turns"][1]["text"]
+    return {
+        "trigger": {"handler": "trigger", "visitor": visitor},
+        "short": {"handler": "message", "message": {"text": "QuickBooks is frozen", "type": "text"},
+                  "visitor": visitor},
+        "pasted_log": {"handler": "message", "message": {"text": pasted, "type": "text"}, "visitor": visitor},
+    }
+
+
+def baseline(body: bytes):
+    """The original extraction and JSONResponse rendering, kept as the baseline."""
+    data = json.loads(body)
+    handler = data.get("handler", "")
+    message = data.get("message", {}).get("text", "") if isinstance(data.get("message"), dict) else ""
+    visitor = data.get("visitor", {})
+    session_id = visitor.get("active_conversation_id", data.get("session_id", "unknown"))
+    visitor.get("email"), visitor.get("name")
+    text = GREETING if handler == "trigger" and not message else REPLY
+    return JSONResponse(status_code=200, content={"action": "reply", "replies": [text], "session_id": session_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--stdlib", action="store_true", help="block orjson to time the stdlib fallback")
+    args = parser.parse_args()
+    if args.stdlib:
+        sys.modules["orjson"] = None
+
+    import webhook_payload as wp
+
+    greeting = wp.StaticReply([GREETING])
+
+    def typed(body: bytes):
+        payload = wp.parse_webhook(body)
+        text = GREETING if payload.handler == "trigger" and not payload.message else REPLY
+        return wp.render_reply([text], payload.session_id)
+
+    def static(body: bytes):
+        return greeting.render(wp.parse_webhook(body).session_id)
+
+    variants = {"baseline": baseline, "typed": typed, "static": static}
+    payloads = {name: json.dumps(p).encode() for name, p in _payloads().items()}
+
+    # Same reply bytes (modulo key order for static) before timing anything
+    for body in payloads.values():
+        assert json.loads(typed(body).body) == json.loads(baseline(body).body)
+
+    print(f"JSON backend: {wp.JSON_BACKEND}")
+    print(f"{'payload':<11} {'bytes':>6} " + " ".join(f"{name + ' us':>12}" for name in variants) + "  speedup")
+    for name, body in payloads.items():
+        timings = {}
+        for variant, fn in variants.items():
+            for _ in range(min(1000, args.rounds)):
+                fn(body)
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                fn(body)
+            timings[variant] = (time.perf_counter() - start) / args.rounds * 1e6
+        print(f"{name:<11} {len(body):>6} " + " ".join(f"{t:>12.2f}" for t in timings.values())
+              + f"  {timings['baseline'] / timings['typed']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local multi-process rig for consistent-hash session routing.
+
+1. Ring check (no processes): places 100k session ids on a ring of N
+   replicas, then removes one and adds one, and reports how many sessions
+   moved — ideally 1/N and 1/(N+1), and only to/from the changed replica.
+
+2. Cluster run: starts the fake OpenAI and Zoho servers and N app
+   processes (`python llm_chatbot_simplified.py`, memory session backend)
+   that list each other in CLUSTER_PEERS. Virtual visitors replay the
+   SalesIQ conversations in benchmarks/data/salesiq_conversations.json,
+   sending every turn to a *random* replica, as a load balancer without
+   affinity would. Each reply's X-Chatbot-Handled-By header tells which
+   replica answered; every conversation must be answered by one replica.
+
+3. Failover: kills the last replica and runs again. Its sessions move to
+   the survivors, which must keep answering without HTTP errors.
+
+Usage:
+    python benchmarks/cluster_rig.py [--replicas 3] [--concurrency 20] [--duration 15] \\
+        [--llm google/gemini-2.5-flash=300]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_openai_server  # noqa: E402
+import fake_zoho_server  # noqa: E402
+from fake_openai_server import parse_models, serve_in_thread  # noqa: E402
+from load_test import (  # noqa: E402
+    DEGRADED_MARKERS, SCENARIOS_PATH, _percentile, app_env, build_payload, load_scenarios,
+    start_app, stop_app,
+)
+from session_router import HANDLED_BY_HEADER, HashRing  # noqa: E402
+
+
+def ring_check(replicas: int, keys: int = 100_000):
+    nodes = [f"http://127.0.0.1:{9000 + i}" for i in range(replicas)]
+    ids = [f"conv-{i}" for i in range(keys)]
+    ring = HashRing(nodes)
+    before = {k: ring.owner(k) for k in ids}
+    shares = Counter(before.values())
+    print(f"ring: {replicas} replicas, {keys:,} sessions, share per replica "
+          f"{min(shares.values()) / keys:.1%} .. {max(shares.values()) / keys:.1%}")
+
+    ring.remove(nodes[-1])
+    moved = [k for k in ids if ring.owner(k) != before[k]]
+    stray = sum(1 for k in moved if before[k] != nodes[-1])
+    print(f"  remove 1 replica: {len(moved) / keys:6.1%} moved (ideal {1 / replicas:.1%}), "
+          f"{stray} moved off a surviving replica")
+
+    ring.add(nodes[-1])
+    ring.add(f"http://127.0.0.1:{9000 + replicas}")
+    after = {k: ring.owner(k) for k in ids}
+    moved = [k for k in ids if after[k] != before[k]]
+    stray = sum(1 for k in moved if after[k] != f"http://127.0.0.1:{9000 + replicas}")
+    print(f"  add 1 replica:    {len(moved) / keys:6.1%} moved (ideal {1 / (replicas + 1):.1%}), "
+          f"{stray} moved to an old replica")
+
+
+class Run:
+    def __init__(self):
+        self.handlers: Dict[str, set] = defaultdict(set)
+        self.latency: Dict[str, List[float]] = {"local": [], "forwarded": []}
+        self.http_errors = 0
+        self.degraded = 0
+
+
+async def visitor(client: httpx.AsyncClient, urls: List[str], scenarios, weights, index: int, tag: str,
+                  stop_at: float, run: Run, rng: random.Random):
+    n = 0
+    while time.monotonic() < stop_at:
+        scenario = rng.choices(scenarios, weights)[0]
+        conversation_id = f"rig-{tag}-{index}-{n}"
+        visitor_info = {"active_conversation_id": conversation_id, "name": f"Rig Visitor {index}"}
+        n += 1
+        for turn in scenario["turns"]:
+            if time.monotonic() >= stop_at:
+                return
+            target = rng.choice(urls)
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{target}/webhook", json=build_payload(turn, visitor_info))
+            except httpx.HTTPError:
+                run.http_errors += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                run.http_errors += 1
+                continue
+            handled_by = response.headers.get(HANDLED_BY_HEADER)
+            run.latency["forwarded" if handled_by else "local"].append(elapsed)
+            if turn["kind"] != "trigger":  # triggers don't touch the session
+                run.handlers[conversation_id].add(handled_by or target)
+            text = " ".join(response.json().get("replies", [])).lower()
+            if any(marker in text for marker in DEGRADED_MARKERS):
+                run.degraded += 1
+
+
+async def run_phase(urls: List[str], scenarios, concurrency: int, duration: float, tag: str, seed: int) -> Run:
+    run = Run()
+    weights = [s.get("weight", 1) for s in scenarios]
+    stop_at = time.monotonic() + duration
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        await asyncio.gather(*(
+            visitor(client, urls, scenarios, weights, i, tag, stop_at, run, random.Random(seed + i))
+            for i in range(concurrency)
+        ))
+    return run
+
+
+def report(name: str, run: Run, urls: List[str]):
+    split = [cid for cid, handlers in run.handlers.items() if len(handlers) > 1]
+    owners = Counter(next(iter(h)) for h in run.handlers.values() if len(h) == 1)
+    print(f"{name}: {len(run.handlers)} conversations, {len(split)} answered by more than one replica, "
+          f"{run.http_errors} HTTP errors, {run.degraded} degraded replies")
+    print("  conversations per replica: " + ", ".join(f"{u.rsplit(':', 1)[1]}={owners[u]}" for u in urls))
+    for kind, samples in run.latency.items():
+        print(f"  {kind:<9} turns {len(samples):>6}  p50 {_percentile(samples, 0.5):7.1f} ms  "
+              f"p95 {_percentile(samples, 0.95):7.1f} ms")
+    return not split and not run.http_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per phase")
+    parser.add_argument("--llm", action="append", help="model=base_ms[,slow_prob,slow_ms[,error_rate]]")
+    parser.add_argument("--port", type=int, default=8920, help="first replica port (fakes use the two below)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    ring_check(args.replicas)
+
+    llm_models = parse_models(args.llm or ["google/gemini-2.5-flash=300"])
+    llm_port, zoho_port = args.port - 2, args.port - 1
+    serve_in_thread(fake_openai_server.create_app(llm_models), llm_port)
+    serve_in_thread(fake_zoho_server.create_app({}), zoho_port)
+
+    workdir = tempfile.mkdtemp(prefix="chatbot-cluster-")
+    env_args = argparse.Namespace(session_backend="memory", max_sessions=100000,
+                                  proactive_refresh=False, token_ttl=3600.0)
+    urls = [f"http://127.0.0.1:{args.port + i}" for i in range(args.replicas)]
+    procs = []
+    ok = True
+    try:
+        for i, url in enumerate(urls):
+            env = app_env(env_args, llm_port, zoho_port, workdir, 1, list(llm_models))
+            env.update({
+                "CLUSTER_SELF_URL": url,
+                "CLUSTER_PEERS": ",".join(urls),
+                "CLUSTER_PEER_DOWN_SECONDS": str(args.duration * 4),
+                "OUTBOX_DB_PATH": os.path.join(workdir, f"outbox-{i}.db"),
+                "SESSION_SNAPSHOT_PATH": "",
+            })
+            procs.append(start_app(args.port + i, 1, env, os.path.join(workdir, f"replica-{i}.log")))
+
+        scenarios = load_scenarios(SCENARIOS_PATH)
+        run = asyncio.run(run_phase(urls, scenarios, args.concurrency, args.duration, "all", args.seed))
+        ok &= report(f"\n{args.replicas} replicas", run, urls)
+
+        stop_app(procs.pop())
+        survivors = urls[:-1]
+        run = asyncio.run(run_phase(survivors, scenarios, args.concurrency, args.duration, "failover", args.seed))
+        ok &= report(f"\nafter stopping {urls[-1]}", run, survivors)
+        for url in survivors:
+            cluster = httpx.get(f"{url}/health", timeout=5).json()["cluster"]
+            print(f"  {url}: forwarded={cluster['forwarded']} received={cluster['received']} "
+                  f"local={cluster['local']} down={list(cluster['down'])}")
+    finally:
+        for proc in procs:
+            stop_app(proc)
+    print(f"\nReplica logs: {workdir}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Local OpenAI-compatible chat completions server with scripted latency.
+
+Answers POST /v1/chat/completions (and OpenRouter's /api/v1/... path) with a
+canned reply after a per-model delay, so hedging, fallback and load behaviour
+can be exercised without calling OpenRouter. Point the app at it with
+LLM_BASE_URL=http://127.0.0.1:<port>/v1.
+
+A model profile is "name=base_ms[,slow_prob,slow_ms[,error_rate]]":
+each request sleeps base_ms ±20%; with probability slow_prob it sleeps
+slow_ms instead, and with probability error_rate it answers HTTP 500.
+
+Usage:
+    python benchmarks/fake_openai_server.py [--port 8900] \\
+        [--model google/gemini-2.5-flash=400,0.05,6000] [--model openai/gpt-4o-mini=600]
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class ModelProfile:
+    base_ms: float = 300.0
+    slow_prob: float = 0.0
+    slow_ms: float = 0.0
+    error_rate: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "ModelProfile":
+        values = [float(v) for v in spec.split(",")]
+        return cls(*values)
+
+    def sample_ms(self) -> float:
+        if self.slow_prob and random.random() < self.slow_prob:
+            return self.slow_ms
+        return self.base_ms * random.uniform(0.8, 1.2)
+
+
+def parse_models(specs) -> Dict[str, ModelProfile]:
+    models = {}
+    for spec in specs or []:
+        name, _, profile = spec.partition("=")
+        models[name] = ModelProfile.parse(profile) if profile else ModelProfile()
+    return models
+
+
+def create_app(models: Dict[str, ModelProfile], default: Optional[ModelProfile] = None,
+               reply: str = "Please restart QuickBooks and try again.") -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible server")
+    app.state.requests = {}
+    fallback = default or ModelProfile()
+
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        profile = models.get(model, fallback)
+        app.state.requests[model] = app.state.requests.get(model, 0) + 1
+        await asyncio.sleep(profile.sample_ms() / 1000)
+        if profile.error_rate and random.random() < profile.error_rate:
+            return JSONResponse(status_code=500, content={"error": {"message": "fake upstream error"}})
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        return {
+            "id": f"chatcmpl-fake-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 12,
+                      "total_tokens": prompt_tokens + 12},
+        }
+
+    app.post("/v1/chat/completions")(completions)
+    app.post("/api/v1/chat/completions")(completions)
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Run `app` on a daemon thread; returns once it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--model", action="append", help="name=base_ms[,slow_prob,slow_ms[,error_rate]]")
+    args = parser.parse_args()
+    uvicorn.run(create_app(parse_models(args.model)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Local stand-in for the Zoho APIs the bot calls: accounts (OAuth token
+refresh), SalesIQ (chat transfer, chat close) and Desk (callback calls).
+
+One app serves all three — their paths don't overlap — so the bot can be
+pointed at it with
+
+    ZOHO_ACCOUNTS_URL=http://127.0.0.1:<port>
+    SALESIQ_BASE_URL=http://127.0.0.1:<port>
+    DESK_BASE_URL=http://127.0.0.1:<port>
+
+Each endpoint (token, transfer, close, callback) takes a latency profile in
+the fake OpenAI server's format, "name=base_ms[,slow_prob,slow_ms[,error_rate]]".
+
+Access tokens expire: a token is accepted for `token_ttl` seconds after it
+was issued (the initial tokens count as issued at startup); after that the
+API answers 401 "Invalid OAuthtoken" like Zoho does, and the bot has to
+refresh it through /oauth/v2/token.
+
+Usage:
+    python benchmarks/fake_zoho_server.py [--port 8901] [--token-ttl 3600] \\
+        [--endpoint close=150,0.02,2000] [--endpoint callback=300,0,0,0.05]
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from fake_openai_server import ModelProfile, parse_models
+
+ENDPOINTS = ("token", "transfer", "close", "callback")
+INITIAL_TOKENS = ("fake-salesiq-token", "fake-visitor-token", "fake-desk-token")
+
+_INVALID_TOKEN = {"code": "INVALID_OAUTHTOKEN", "message": "Invalid OAuthtoken"}
+
+
+def create_app(profiles: Dict[str, ModelProfile], token_ttl: float = 3600.0) -> FastAPI:
+    app = FastAPI(title="Fake Zoho APIs")
+    app.state.requests = {name: 0 for name in ENDPOINTS}
+    app.state.rejected_tokens = 0
+    started = time.monotonic()
+    issued: Dict[str, float] = {token: started for token in INITIAL_TOKENS}
+    counter = itertools.count(1)
+
+    async def _simulate(endpoint: str) -> Optional[Response]:
+        """Sleep for the endpoint's latency; returns a 500 response on an injected error."""
+        app.state.requests[endpoint] += 1
+        profile = profiles.get(endpoint, ModelProfile(base_ms=100))
+        await asyncio.sleep(profile.sample_ms() / 1000)
+        if profile.error_rate and random.random() < profile.error_rate:
+            return JSONResponse(status_code=500, content={"message": "fake upstream error"})
+        return None
+
+    def _authorized(request: Request) -> bool:
+        token = request.headers.get("Authorization", "").replace("Zoho-oauthtoken", "").strip()
+        issued_at = issued.get(token)
+        if issued_at is None or time.monotonic() - issued_at > token_ttl:
+            app.state.rejected_tokens += 1
+            return False
+        return True
+
+    @app.post("/oauth/v2/token")
+    async def token(request: Request):
+        error = await _simulate("token")
+        if error is not None:
+            return error
+        # Form-encoded body, parsed by hand (python-multipart is not a dependency)
+        form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+        if form.get("grant_type") != "refresh_token" or not form.get("refresh_token"):
+            return JSONResponse(status_code=400, content={"error": "invalid_code"})
+        access_token = f"fake-access-{next(counter)}"
+        issued[access_token] = time.monotonic()
+        return {"access_token": access_token, "expires_in": int(token_ttl), "token_type": "Bearer"}
+
+    @app.post("/api/visitor/v1/{screen_name}/conversations")
+    async def transfer(screen_name: str, request: Request):
+        error = await _simulate("transfer")
+        if error is not None:
+            return error
+        if not _authorized(request):
+            return JSONResponse(status_code=401, content=_INVALID_TOKEN)
+        return {"data": {"id": f"conv-{next(counter)}", "status": "waiting"}}
+
+    @app.put("/api/v2/{screen_name}/conversations/{conversation_id}/close")
+    async def close(screen_name: str, conversation_id: str, request: Request):
+        error = await _simulate("close")
+        if error is not None:
+            return error
+        if not _authorized(request):
+            return JSONResponse(status_code=401, content=_INVALID_TOKEN)
+        return {"data": {"id": conversation_id, "status": "closed"}}
+
+    @app.post("/api/v1/calls")
+    async def callback(request: Request):
+        error = await _simulate("callback")
+        if error is not None:
+            return error
+        if not _authorized(request):
+            return JSONResponse(status_code=401, content=_INVALID_TOKEN)
+        return {"id": f"call-{next(counter)}", "status": "Open"}
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "requests": app.state.requests,
+            "rejected_tokens": app.state.rejected_tokens,
+            "tokens_issued": len(issued) - len(INITIAL_TOKENS),
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--token-ttl", type=float, default=3600.0)
+    parser.add_argument("--endpoint", action="append",
+                        help=f"name=base_ms[,slow_prob,slow_ms[,error_rate]] for one of {', '.join(ENDPOINTS)}")
+    args = parser.parse_args()
+    app = create_app(parse_models(args.endpoint), token_ttl=args.token_ttl)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Load test: throughput and tail latency of POST /webhook, entirely offline.
+
+Starts the fake OpenAI-compatible server and the fake Zoho server in this
+process, then launches the real app (`python llm_chatbot_simplified.py`,
+the Procfile entry point) with UVICORN_WORKERS=N pointed at them. Virtual
+visitors replay the multi-turn SalesIQ conversations in
+benchmarks/data/salesiq_conversations.json — trigger, free text, button
+clicks, the callback two-step flow and resolution — each visitor one turn
+at a time, as the SalesIQ widget does.
+
+For every worker count × concurrency level it reports requests/s and
+p50 / p95 / p99 latency, overall and per turn kind, plus HTTP errors and
+degraded replies (slow / LLM unavailable / technical difficulties).
+
+Zoho access tokens expire after --token-ttl seconds, so the outbox's close
+and callback calls hit 401s and go through token refresh during the run
+(or are refreshed ahead of time with --proactive-refresh).
+With more than one worker, sessions are kept in SQLite (the memory backend
+is per process).
+
+Usage:
+    python benchmarks/load_test.py [--workers 1,2] [--concurrency 1,10,50] \\
+        [--duration 20] [--llm google/gemini-2.5-flash=800,0.05,4000] \\
+        [--zoho close=150] [--token-ttl 30] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_openai_server  # noqa: E402
+import fake_zoho_server  # noqa: E402
+from fake_openai_server import parse_models, serve_in_thread  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+SCENARIOS_PATH = os.path.join(os.path.dirname(__file__), "data", "salesiq_conversations.json")
+
+DEFAULT_LLM = ["google/gemini-2.5-flash=800,0.05,4000", "openai/gpt-4o-mini=1000"]
+
+# Substrings of the app's fallback replies
+DEGRADED_MARKERS = (
+    "taking longer than expected",
+    "receiving a lot of requests",
+    "trouble processing your request",
+    "technical difficulties",
+    "still working on your previous message",
+)
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def load_scenarios(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["scenarios"]
+
+
+def build_payload(turn: Dict, visitor: Dict) -> Dict:
+    if turn["kind"] == "trigger":
+        return {"handler": "trigger", "visitor": visitor}
+    return {"handler": "message", "message": {"text": turn["text"]}, "visitor": visitor}
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.http_errors = 0
+        self.degraded = 0
+        self.outcomes: Counter = Counter()
+        self.conversations = 0
+
+    def record(self, kind: str, latency_ms: float, response: httpx.Response):
+        self.latencies[kind].append(latency_ms)
+        if response.status_code != 200:
+            self.http_errors += 1
+            return
+        body = response.json()
+        text = " ".join(body.get("replies", [])).lower()
+        if any(marker in text for marker in DEGRADED_MARKERS):
+            self.degraded += 1
+        if body.get("action") == "forward":
+            self.outcomes["transferred"] += 1
+        elif "issue is resolved" in text:
+            self.outcomes["resolved"] += 1
+        elif "callback" in text and kind == "callback_details":
+            self.outcomes["callback_booked"] += 1
+        if body.get("suggestions"):
+            self.outcomes["escalation_offered"] += 1
+
+    def all_latencies(self) -> List[float]:
+        return [ms for samples in self.latencies.values() for ms in samples]
+
+
+async def visitor_loop(client: httpx.AsyncClient, url: str, scenarios: List[Dict], weights: List[float],
+                       visitor_index: int, run_id: str, stop_at: float, think_ms: float,
+                       results: Results, rng: random.Random):
+    n = 0
+    while time.monotonic() < stop_at:
+        scenario = rng.choices(scenarios, weights)[0]
+        conversation_id = f"lt-{run_id}-{visitor_index}-{n}"
+        visitor = {
+            "active_conversation_id": conversation_id,
+            "name": f"Load Visitor {visitor_index}",
+            "email": f"visitor{visitor_index}@example.com",
+        }
+        n += 1
+        for turn in scenario["turns"]:
+            if time.monotonic() >= stop_at:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=build_payload(turn, visitor))
+            except httpx.HTTPError:
+                results.http_errors += 1
+                continue
+            results.record(turn["kind"], (time.perf_counter() - start) * 1000, response)
+            if think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+        results.conversations += 1
+
+
+async def run_level(base_url: str, scenarios: List[Dict], concurrency: int, duration: float,
+                    think_ms: float, seed: int) -> Results:
+    results = Results()
+    weights = [s.get("weight", 1) for s in scenarios]
+    run_id = f"{int(time.time())}-{concurrency}"
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        await asyncio.gather(*(
+            visitor_loop(client, f"{base_url}/webhook", scenarios, weights, i, run_id, stop_at,
+                         think_ms, results, random.Random(seed + i))
+            for i in range(concurrency)
+        ))
+    return results
+
+
+def start_app(port: int, workers: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    proc = subprocess.Popen(
+        [sys.executable, "-u", "llm_chatbot_simplified.py"],
+        cwd=ROOT, env={**os.environ, **env, "PORT": str(port), "UVICORN_WORKERS": str(workers)},
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with {proc.returncode}; see {log_path}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"App did not become healthy; see {log_path}")
+
+
+def stop_app(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def app_env(args, llm_port: int, zoho_port: int, workdir: str, workers: int, models: List[str]) -> Dict[str, str]:
+    zoho_url = f"http://127.0.0.1:{zoho_port}"
+    backend = args.session_backend or ("memory" if workers == 1 else "sqlite")
+    env = {
+        "OPENROUTER_API_KEY": "load-test",
+        "WEBHOOK_SECRET": "",
+        "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "LLM_MODELS": ",".join(models),
+        "ZOHO_ACCOUNTS_URL": zoho_url,
+        "SALESIQ_BASE_URL": zoho_url,
+        "DESK_BASE_URL": zoho_url,
+        "SESSION_BACKEND": backend,
+        "SESSION_DB_PATH": os.path.join(workdir, f"sessions-{workers}.db"),
+        "OUTBOX_DB_PATH": os.path.join(workdir, f"outbox-{workers}.db"),
+        "MAX_SESSIONS": str(args.max_sessions),
+        # Off by default so expired tokens are met with 401s and refreshed on demand
+        "ZOHO_TOKEN_PROACTIVE_REFRESH": "true" if args.proactive_refresh else "false",
+        "ZOHO_TOKEN_REFRESH_MARGIN": str(args.token_ttl / 3),
+    }
+    for prefix, token in (("SALESIQ", "fake-salesiq-token"), ("SALESIQ_VISITOR", "fake-visitor-token"),
+                          ("DESK", "fake-desk-token")):
+        env.update({
+            f"{prefix}_ACCESS_TOKEN": token,
+            f"{prefix}_REFRESH_TOKEN": f"{prefix.lower()}-refresh",
+            f"{prefix}_CLIENT_ID": f"{prefix.lower()}-client",
+            f"{prefix}_CLIENT_SECRET": "secret",
+        })
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1", help="comma-separated worker counts")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated concurrent visitors")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a visitor's turns")
+    parser.add_argument("--llm", action="append", help="model=base_ms[,slow_prob,slow_ms[,error_rate]]")
+    parser.add_argument("--zoho", action="append", help="endpoint=base_ms[,slow_prob,slow_ms[,error_rate]]")
+    parser.add_argument("--token-ttl", type=float, default=30.0, help="Zoho access token lifetime (s)")
+    parser.add_argument("--proactive-refresh", action="store_true",
+                        help="refresh tokens before they expire instead of after a 401")
+    parser.add_argument("--session-backend", choices=["memory", "sqlite"],
+                        help="default: memory for 1 worker, sqlite for more")
+    parser.add_argument("--max-sessions", type=int, default=100000)
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    parser.add_argument("--port", type=int, default=8910, help="app port (fakes use the next two)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write all results to this file")
+    args = parser.parse_args()
+
+    llm_models = parse_models(args.llm or DEFAULT_LLM)
+    llm_app = fake_openai_server.create_app(llm_models)
+    zoho_app = fake_zoho_server.create_app(parse_models(args.zoho), token_ttl=args.token_ttl)
+    llm_port, zoho_port = args.port + 1, args.port + 2
+    serve_in_thread(llm_app, llm_port)
+    serve_in_thread(zoho_app, zoho_port)
+
+    scenarios = load_scenarios(args.scenarios)
+    workdir = tempfile.mkdtemp(prefix="chatbot-load-")
+    log_path = os.path.join(workdir, "app.log")
+    rows = []
+
+    header = (f"{'workers':>7} {'conc':>5} {'reqs':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8} {'errors':>7} {'degraded':>8}")
+    print(header)
+    for workers in [int(w) for w in args.workers.split(",")]:
+        proc = start_app(args.port, workers, app_env(args, llm_port, zoho_port, workdir, workers,
+                                                     list(llm_models)), log_path)
+        try:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                started = time.perf_counter()
+                results = asyncio.run(run_level(f"http://127.0.0.1:{args.port}", scenarios, concurrency,
+                                                args.duration, args.think_ms, args.seed))
+                elapsed = time.perf_counter() - started
+                samples = results.all_latencies()
+                row = {
+                    "workers": workers,
+                    "concurrency": concurrency,
+                    "requests": len(samples),
+                    "rps": round(len(samples) / elapsed, 1),
+                    "p50_ms": round(_percentile(samples, 0.50), 1),
+                    "p95_ms": round(_percentile(samples, 0.95), 1),
+                    "p99_ms": round(_percentile(samples, 0.99), 1),
+                    "max_ms": round(max(samples, default=0.0), 1),
+                    "http_errors": results.http_errors,
+                    "degraded": results.degraded,
+                    "conversations": results.conversations,
+                    "outcomes": dict(results.outcomes),
+                    "by_kind": {
+                        kind: {"count": len(ms), "p50_ms": round(_percentile(ms, 0.50), 1),
+                               "p95_ms": round(_percentile(ms, 0.95), 1),
+                               "p99_ms": round(_percentile(ms, 0.99), 1)}
+                        for kind, ms in sorted(results.latencies.items())
+                    },
+                }
+                rows.append(row)
+                print(f"{workers:>7} {concurrency:>5} {row['requests']:>7} {row['rps']:>7} {row['p50_ms']:>8} "
+                      f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8} {row['http_errors']:>7} "
+                      f"{row['degraded']:>8}")
+                print("        " + "  ".join(
+                    f"{kind} p95={stats['p95_ms']:.0f}" for kind, stats in row["by_kind"].items()
+                ))
+        finally:
+            stop_app(proc)
+
+    print(f"\nFake LLM requests:  {llm_app.state.requests}")
+    print(f"Fake Zoho requests: {zoho_app.state.requests} "
+          f"(401 token rejections: {zoho_app.state.rejected_tokens})")
+    print(f"App log: {log_path}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Microbenchmarks for the pure per-message helpers, with JSON baselines and
+a regression check.
+
+Cases cover detect_escalation, detect_resolution, _parse_callback_details,
+_build_conversation_summary, build_reply (including JSON rendering) and
+SessionStore.get_or_create / add_message / cleanup_expired, over inputs
+from a two-word greeting to a multi-KB pasted error log and stores of up
+to 1M sessions. Each case is timed in `--repeat` samples; a sample is the
+mean per-call time over enough calls to fill ~20 ms. Logging is disabled
+while timing so the numbers are the functions' own cost.
+
+Commands:
+    run      time the cases, print a table, optionally save a baseline
+    compare  compare two result files; a case regresses when its median is
+             more than --threshold % slower AND a one-sided Mann-Whitney U
+             test over the samples gives p < --alpha. Exits 1 on regression.
+
+Baselines:
+    benchmarks/baselines/main.json is the committed reference, made with
+    `run --save` on the machine and Python version recorded in its "meta".
+    Timings only compare on the same hardware: on another machine, save
+    your own baseline from main first, then compare your branch against it:
+
+        git checkout main
+        python benchmarks/microbench.py run --save /tmp/base.json
+        git checkout my-branch
+        python benchmarks/microbench.py run --compare /tmp/base.json
+
+    Refresh main.json (on one consistent machine) when an intended change
+    moves the numbers.
+
+Usage:
+    python benchmarks/microbench.py run [--filter detect_] [--quick] \\
+        [--save benchmarks/baselines/main.json] [--compare benchmarks/baselines/main.json]
+    python benchmarks/microbench.py compare BASE.json NEW.json [--threshold 5] [--alpha 0.01]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session_store import MemorySessionStore, create_session_store  # noqa: E402
+
+ERROR_LOG = "\n".join(
+    f"2024-05-14 09:12:{i % 60:02d} {'ERROR' if i % 3 else 'WARN '}  DBCONN   "
+    f"Could not open C:\\Users\\Public\\Documents\\Intuit\\QuickBooks\\Company Files\\ACME LLC.QBW "
+    f"(error -6150, -1006, attempt {i})"
+    for i in range(40)
+)
+
+MESSAGES = {
+    "greeting": "hi",
+    "short": "QuickBooks is frozen and won't open my company file",
+    "paragraph": (
+        "Since this morning none of the users on our hosted server can open QuickBooks. It shows "
+        "the spinning wheel for a minute and then says the company file is in use, even though "
+        "nobody else is logged in. I restarted my laptop and cleared the browser cache but it is "
+        "still the same. Could you please check what is wrong on the server side?"
+    ),
+    "error_log": "Getting this error when I open the file:\n" + ERROR_LOG,
+}
+
+BOT_REPLY = (
+    "Let's try this:\n1. Close QuickBooks on the server.\n2. Open the Database Server Manager and "
+    "rescan the company file folder.\n3. Reopen the file.\nLet me know if it works."
+)
+
+CALLBACK_DETAILS = {
+    "structured": "time : tomorrow 3pm IST\nphone: +91 98765 43210",
+    "freeform": "please call me on 98765 43210 tomorrow afternoon around 3",
+    "error_log": "call me at 98765 43210\n" + ERROR_LOG,
+}
+
+
+def _history(turns: int, summary: bool = False) -> List[Dict]:
+    history = []
+    if summary:
+        history.append({"role": "system", "summary": True, "turns": 40,
+                        "content": "User's QuickBooks file fails to open with -6150; restarted twice."})
+    for i in range(turns):
+        history.append({"role": "user", "content": MESSAGES["paragraph"] if i % 3 == 0 else MESSAGES["short"]})
+        history.append({"role": "assistant", "content": BOT_REPLY})
+    return history
+
+
+def _filled_memory_store(sessions: int) -> Tuple[MemorySessionStore, List[str]]:
+    store = MemorySessionStore(max_sessions=sessions + 1, ttl_minutes=30, max_messages=20)
+    ids = [f"session-{i}" for i in range(sessions)]
+    for sid in ids:
+        store.get_or_create(sid).append({"role": "user", "content": "hi"})
+    return store, ids
+
+
+def build_cases(quick: bool, tmpdir: str) -> Dict[str, Callable[[], Callable[[], object]]]:
+    """name → factory; each factory does its (untimed) setup and returns the timed call."""
+    # Imported here so `compare` doesn't start the app module
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    import llm_chatbot_simplified as bot
+
+    cases: Dict[str, Callable[[], Callable[[], object]]] = {}
+    history = _history(4)
+
+    for size, text in MESSAGES.items():
+        cases[f"detect_escalation[{size}]"] = lambda t=text: lambda: bot.detect_escalation(t, BOT_REPLY, history)
+        cases[f"detect_resolution[{size}]"] = lambda t=text: lambda: bot.detect_resolution(t, history)
+    for kind, text in CALLBACK_DETAILS.items():
+        cases[f"parse_callback_details[{kind}]"] = lambda t=text: lambda: bot._parse_callback_details(t)
+
+    for name, hist in (("10_turns", _history(5)), ("50_turns+summary", _history(25, summary=True))):
+        cases[f"build_conversation_summary[{name}]"] = lambda h=hist: lambda: bot._build_conversation_summary(h)
+
+    suggestions = [
+        {"text": "💬 Chat with Technician", "action_type": "article", "action_value": "ESCALATE_CHAT"},
+        {"text": "📅 Schedule Callback", "action_type": "article", "action_value": "SCHEDULE_CALLBACK"},
+    ]
+    cases["build_reply[short]"] = lambda: lambda: bot.build_reply(["Sure, what can I help with?"], "s-1")
+    cases["build_reply[long+suggestions]"] = \
+        lambda: lambda: bot.build_reply([BOT_REPLY * 4], "s-1", suggestions=suggestions)
+
+    sizes = [1_000, 100_000] if quick else [1_000, 100_000, 1_000_000]
+    for sessions in sizes:
+        label = f"{sessions // 1000}k" if sessions < 1_000_000 else f"{sessions // 1_000_000}M"
+
+        def get_hit(n=sessions):
+            store, ids = _filled_memory_store(n)
+            it = iter(range(10 ** 12))
+            return lambda: store.get_or_create(ids[next(it) % n])
+
+        def add_message(n=sessions):
+            store, ids = _filled_memory_store(n)
+            it = iter(range(10 ** 12))
+            msg = {"role": "user", "content": MESSAGES["short"]}
+            return lambda: store.add_message(ids[next(it) % n], msg)
+
+        def cleanup(n=sessions):
+            store, _ = _filled_memory_store(n)
+            return store.cleanup_expired
+
+        cases[f"memory.get_or_create[{label}]"] = get_hit
+        cases[f"memory.add_message[{label}]"] = add_message
+        cases[f"memory.cleanup_expired[{label}]"] = cleanup
+
+    def sqlite_store():
+        store = create_session_store("sqlite", max_sessions=20_000, max_messages=20,
+                                     sqlite_path=os.path.join(tmpdir, f"micro-{time.monotonic_ns()}.db"))
+        ids = [f"session-{i}" for i in range(10_000)]
+        for sid in ids:
+            store.save(sid, [{"role": "user", "content": "hi"}])
+        return store, ids
+
+    def sqlite_get():
+        store, ids = sqlite_store()
+        it = iter(range(10 ** 12))
+        return lambda: store.get_or_create(ids[next(it) % len(ids)])
+
+    def sqlite_add():
+        store, ids = sqlite_store()
+        it = iter(range(10 ** 12))
+        msg = {"role": "user", "content": MESSAGES["short"]}
+        return lambda: store.add_message(ids[next(it) % len(ids)], msg)
+
+    def sqlite_cleanup():
+        store, _ = sqlite_store()
+        return store.cleanup_expired
+
+    cases["sqlite.get_or_create[10k]"] = sqlite_get
+    cases["sqlite.add_message[10k]"] = sqlite_add
+    cases["sqlite.cleanup_expired[10k]"] = sqlite_cleanup
+    return cases
+
+
+def measure(fn: Callable[[], object], repeat: int, target: float) -> List[float]:
+    """Per-call seconds for `repeat` samples of about `target` seconds each."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target / 4:
+            break
+        number *= 4
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run(args) -> Dict:
+    logging.disable(logging.CRITICAL)
+    cases = build_cases(args.quick, tempfile.mkdtemp(prefix="microbench-"))
+    pattern = re.compile(args.filter) if args.filter else None
+    repeat = 7 if args.quick and not args.repeat else (args.repeat or 15)
+    target = 0.005 if args.quick else 0.02
+
+    results = {}
+    print(f"{'case':<44} {'median us':>11} {'stdev %':>8} {'calls/s':>12}")
+    for name, factory in cases.items():
+        if pattern and not pattern.search(name):
+            continue
+        samples = measure(factory(), repeat, target)
+        median = statistics.median(samples)
+        spread = statistics.stdev(samples) / median * 100 if len(samples) > 1 and median else 0.0
+        results[name] = {"median": median, "samples": samples}
+        print(f"{name:<44} {median * 1e6:>11.2f} {spread:>8.1f} {1 / median:>12,.0f}")
+    logging.disable(logging.NOTSET)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "quick": args.quick,
+            "unit": "seconds per call",
+        },
+        "results": results,
+    }
+
+
+def mann_whitney_greater(new: List[float], base: List[float]) -> float:
+    """One-sided p-value that `new` tends to be larger than `base` (normal approximation)."""
+    n1, n2 = len(new), len(base)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted([(v, 0) for v in new] + [(v, 1) for v in base])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+    rank_sum = sum(r for r, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)     # continuity correction
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(base: Dict, new: Dict, threshold: float, alpha: float) -> int:
+    """Print a comparison table; returns the number of regressions."""
+    regressions = 0
+    print(f"{'case':<44} {'base us':>10} {'new us':>10} {'change':>8} {'p':>8}  verdict")
+    for name, result in new["results"].items():
+        if name not in base["results"]:
+            print(f"{name:<44} {'—':>10} {result['median'] * 1e6:>10.2f} {'':>8} {'':>8}  new")
+            continue
+        old = base["results"][name]
+        change = (result["median"] / old["median"] - 1) * 100
+        p_slower = mann_whitney_greater(result["samples"], old["samples"])
+        p_faster = mann_whitney_greater(old["samples"], result["samples"])
+        if change > threshold and p_slower < alpha:
+            verdict = "REGRESSION"
+            regressions += 1
+        elif change < -threshold and p_faster < alpha:
+            verdict = "faster"
+        else:
+            verdict = ""
+        p = p_slower if change > 0 else p_faster
+        print(f"{name:<44} {old['median'] * 1e6:>10.2f} {result['median'] * 1e6:>10.2f} "
+              f"{change:>+7.1f}% {p:>8.4f}  {verdict}")
+    if base["meta"].get("machine") != new["meta"].get("machine") or \
+            base["meta"].get("python") != new["meta"].get("python"):
+        print("\nWarning: results come from different machines or Python versions.")
+    print(f"\n{regressions} regression(s) (>{threshold:g}% slower, p < {alpha:g})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="time the cases")
+    run_parser.add_argument("--filter", help="regex; only run matching cases")
+    run_parser.add_argument("--quick", action="store_true", help="fewer/shorter samples, stores up to 100k")
+    run_parser.add_argument("--repeat", type=int, help="samples per case (default 15, quick 7)")
+    run_parser.add_argument("--save", help="write results to this JSON file")
+    run_parser.add_argument("--compare", help="compare against this baseline after running")
+    run_parser.add_argument("--threshold", type=float, default=5.0, help="min slowdown %% to flag")
+    run_parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("base")
+    cmp_parser.add_argument("new")
+    cmp_parser.add_argument("--threshold", type=float, default=5.0, help="min slowdown %% to flag")
+    cmp_parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+    args = parser.parse_args()
+
+    for path in ([args.base] if args.command == "compare" else [args.compare] if args.compare else []):
+        if not os.path.exists(path):
+            parser.error(f"baseline {path} not found; create one with: "
+                         f"python benchmarks/microbench.py run --save {path}")
+
+    if args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        sys.exit(1 if compare(base, new, args.threshold, args.alpha) else 0)
+
+    results = run(args)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        print()
+        sys.exit(1 if compare(base, results, args.threshold, args.alpha) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Local Redis-protocol stand-in for exercising RedisSessionStore without Redis.
+
+Implements only the commands the session store uses (strings with TTL and a
+sorted set; EVAL runs only the session-lease release script, as a
+compare-and-delete). Not for production use.
+
+Usage:
+    python benchmarks/resp_server.py [--port 6399]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class _State:
+    def __init__(self):
+        self.strings: Dict[str, Tuple[str, Optional[float]]] = {}
+        self.zsets: Dict[str, Dict[str, float]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        item = self.strings.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.strings[key]
+            return None
+        return value
+
+    def run(self, args: List[str]):
+        cmd = args[0].upper()
+        if cmd in ("PING",):
+            return "+PONG"
+        if cmd in ("AUTH", "SELECT"):
+            return "+OK"
+        if cmd == "FLUSHALL":
+            self.strings.clear()
+            self.zsets.clear()
+            return "+OK"
+        if cmd == "GET":
+            return self._live(args[1])
+        if cmd == "SET":
+            key, value, opts = args[1], args[2], [a.upper() for a in args[3:]]
+            if "NX" in opts and self._live(key) is not None:
+                return None
+            expires_at = None
+            if "EX" in opts:
+                expires_at = time.monotonic() + int(args[3 + opts.index("EX") + 1])
+            elif "PX" in opts:
+                expires_at = time.monotonic() + int(args[3 + opts.index("PX") + 1]) / 1000
+            self.strings[key] = (value, expires_at)
+            return "+OK"
+        if cmd == "DEL":
+            removed = 0
+            for key in args[1:]:
+                removed += self.strings.pop(key, None) is not None
+                removed += self.zsets.pop(key, None) is not None
+            return removed
+        if cmd == "EVAL":
+            key, token = args[3], args[4]
+            if self._live(key) == token:
+                del self.strings[key]
+                return 1
+            return 0
+        if cmd == "EXISTS":
+            return sum(1 for key in args[1:] if self._live(key) is not None)
+        if cmd == "EXPIRE":
+            value = self._live(args[1])
+            if value is None:
+                return 0
+            self.strings[args[1]] = (value, time.monotonic() + int(args[2]))
+            return 1
+        if cmd == "ZADD":
+            zset = self.zsets.setdefault(args[1], {})
+            added = 0
+            for score, member in zip(args[2::2], args[3::2]):
+                added += member not in zset
+                zset[member] = float(score)
+            return added
+        if cmd == "ZCARD":
+            return len(self.zsets.get(args[1], {}))
+        if cmd == "ZREM":
+            zset = self.zsets.get(args[1], {})
+            return sum(zset.pop(m, None) is not None for m in args[2:])
+        if cmd == "ZPOPMIN":
+            zset = self.zsets.get(args[1], {})
+            count = int(args[2]) if len(args) > 2 else 1
+            out = []
+            for member, score in sorted(zset.items(), key=lambda kv: kv[1])[:count]:
+                del zset[member]
+                out += [member, repr(score)]
+            return out
+        if cmd == "ZREMRANGEBYSCORE":
+            zset = self.zsets.get(args[1], {})
+            lo, hi = float(args[2]), float(args[3])
+            doomed = [m for m, s in zset.items() if lo <= s <= hi]
+            for member in doomed:
+                del zset[member]
+            return len(doomed)
+        return f"-ERR unknown command '{cmd}'"
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(r) for r in reply)
+    if reply.startswith(("+", "-")):
+        return reply.encode() + b"\r\n"
+    data = reply.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2].decode())
+    return args
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6399) -> asyncio.AbstractServer:
+    """Start the stand-in server and return it (caller closes it)."""
+    state = _State()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                writer.write(_encode(state.run(args)))
+                if not reader._buffer:  # flush once per pipelined batch
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"RESP stand-in listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Token-budgeted assembly of the LLM message list.
+
+History is capped by message count in the session store, but one pasted
+error log can still make every later turn expensive. ContextWindow builds
+[system prompt] + the most recent user/assistant turns that fit in
+`max_input_tokens` (canned fallback replies are never sent back):
+
+  1. The system prompt is always sent whole, followed by the session's
+     rolling summary if it has one (see rolling_summary).
+  2. Turns are added newest-first until the budget runs out; older turns
+     are dropped, and the window never opens on an assistant reply.
+  3. If the latest user message alone does not fit, its middle is cut.
+
+Token counts come from a local approximation (no tokenizer download). They
+are cached on each history message under "tokens", which every session store
+backend persists with the history, so a message is counted once per session.
+System prompt counts are memoized by content.
+"""
+
+from __future__ import annotations
+
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from rolling_summary import is_turn, summary_of
+
+logger = logging.getLogger(__name__)
+
+# Words, digit runs and single symbols — roughly how BPE tokenizers split text
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+
+# Chat formatting overhead per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TRUNCATION_MARK = "\n…[truncated]…\n"
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count.
+
+    Short words are one token; long words, numbers and identifiers split
+    into ~4-character pieces; punctuation is one token each.
+    """
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        n = len(piece)
+        if piece.isdigit():
+            total += (n + 2) // 3
+        elif n <= 6:
+            total += 1
+        else:
+            total += (n + 3) // 4
+    return total
+
+
+# System prompts repeat (full prompt, or a few retrieval combinations per topic)
+_system_prompt_tokens = lru_cache(maxsize=256)(count_tokens)
+
+
+def message_tokens(message: Dict) -> int:
+    """Token count of a history message, cached on the message itself."""
+    cached = message.get("tokens")
+    if cached is None:
+        cached = message["tokens"] = count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+    return cached
+
+
+def _truncate_middle(text: str, keep_fraction: float) -> str:
+    """Keep the start and end of `text` (error logs carry the useful bits there)."""
+    keep = max(0, int(len(text) * keep_fraction) - len(_TRUNCATION_MARK))
+    head = keep * 2 // 3
+    return text[:head] + _TRUNCATION_MARK + text[len(text) - (keep - head):]
+
+
+class ContextWindow:
+    """Builds LLM messages under a token budget, newest turns first.
+
+    - `max_input_tokens` bounds system prompt + history.
+    - `max_messages` additionally caps the number of history messages.
+    """
+
+    def __init__(self, max_input_tokens: int = 12000, max_messages: int = 20):
+        self.max_input_tokens = max_input_tokens
+        self.max_messages = max_messages
+
+        self.calls = 0
+        self.trimmed_calls = 0
+        self.messages_dropped = 0
+        self.total_input_tokens = 0
+        self.max_seen_tokens = 0
+
+    def build(self, system_prompt: str, history: List[Dict]) -> Tuple[List[Dict], int]:
+        """Return (messages, estimated input tokens) for one LLM call."""
+        used = _system_prompt_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        if used > self.max_input_tokens:
+            logger.warning("System prompt alone (~%d tokens) exceeds the context budget of %d",
+                           used, self.max_input_tokens)
+
+        summary = summary_of(history)
+        if summary is not None:
+            used += message_tokens(summary)
+
+        turns = [m for m in history if is_turn(m)]
+        candidates = turns[-self.max_messages:]
+        selected: List[Tuple[str, str, int]] = []
+        for message in reversed(candidates):
+            cost = message_tokens(message)
+            content = message.get("content", "")
+            if used + cost > self.max_input_tokens:
+                if not selected:
+                    # The latest message alone is over budget: keep what fits
+                    content, shrunk = self._shrink(content, max(self.max_input_tokens - used, 0), cost)
+                    logger.info("Truncated oversized %s message from ~%d to ~%d tokens",
+                                message["role"], cost, shrunk)
+                    selected.append((message["role"], content, shrunk))
+                    used += shrunk
+                break
+            selected.append((message["role"], content, cost))
+            used += cost
+
+        while len(selected) > 1 and selected[-1][0] == "assistant":
+            used -= selected.pop()[2]
+
+        dropped = len(candidates) - len(selected)
+        self._record(used, dropped)
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary is not None:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary['content']}"})
+        messages.extend({"role": role, "content": content} for role, content, _ in reversed(selected))
+        return messages, used
+
+    @staticmethod
+    def _shrink(content: str, budget: int, cost: int) -> Tuple[str, int]:
+        """Cut the middle of `content` until it fits in `budget` tokens."""
+        fraction = budget / cost
+        while True:
+            shrunk = _truncate_middle(content, fraction)
+            tokens = count_tokens(shrunk) + MESSAGE_OVERHEAD_TOKENS
+            if tokens <= budget or fraction <= 0:
+                return shrunk, tokens
+            fraction = max(0.0, fraction * 0.9 - 0.01)
+
+    def _record(self, used: int, dropped: int):
+        self.calls += 1
+        self.total_input_tokens += used
+        self.max_seen_tokens = max(self.max_seen_tokens, used)
+        if dropped:
+            self.trimmed_calls += 1
+            self.messages_dropped += dropped
+
+    def stats(self) -> Dict:
+        return {
+            "max_input_tokens": self.max_input_tokens,
+            "calls": self.calls,
+            "trimmed_calls": self.trimmed_calls,
+            "messages_dropped": self.messages_dropped,
+            "avg_input_tokens": round(self.total_input_tokens / self.calls) if self.calls else 0,
+            "max_input_tokens_seen": self.max_seen_tokens,
+        }
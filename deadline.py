@@ -0,0 +1,121 @@
+"""
+Per-request deadline budget, propagated through a context variable.
+
+The webhook opens a deadline for each request; anything running inside it —
+the session lock wait, the debounce window, LLM attempts and their retries,
+Zoho calls — asks how much time is left and sizes its own timeout from it:
+
+    with request_deadline(9.0) as deadline:
+        with deadline.stage("llm"):
+            await call(timeout=timeout_for(30.0))
+
+Outside a deadline (background workers, startup) `timeout_for` simply
+returns the default. Stages record where the time went so a request that
+blows its budget can be logged with the stage that consumed it.
+"""
+
+from __future__ import annotations
+
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Not enough of the request budget is left to start the next step."""
+
+
+class Deadline:
+    """A fixed time budget measured on the monotonic clock."""
+
+    def __init__(self, budget: float, reserve: float = 0.0):
+        self.budget = budget
+        # Time kept back for building and sending the reply
+        self.reserve = reserve
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget
+        self.stages: Dict[str, float] = {}
+
+    def remaining(self) -> float:
+        """Seconds left for work, after the reply reserve."""
+        return self.expires_at - self.reserve - time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def blown(self) -> bool:
+        return time.monotonic() > self.expires_at
+
+    @contextmanager
+    def stage(self, name: str):
+        """Attribute the time spent in the block to `name`."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.monotonic() - start
+
+    def slowest_stage(self) -> Optional[str]:
+        return max(self.stages, key=self.stages.get) if self.stages else None
+
+    def report(self) -> Dict:
+        return {
+            "budget_ms": round(self.budget * 1000),
+            "elapsed_ms": round(self.elapsed() * 1000),
+            "stages_ms": {name: round(s * 1000) for name, s in self.stages.items()},
+            "slowest_stage": self.slowest_stage(),
+        }
+
+
+@contextmanager
+def request_deadline(budget: float, reserve: float = 0.0):
+    """Make a new Deadline current for the enclosed (async) code."""
+    deadline = Deadline(budget, reserve)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the current deadline, or `default` outside one."""
+    deadline = _current.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+def timeout_for(default: float, minimum: float = 0.0) -> float:
+    """`default` capped by the remaining budget.
+
+    Raises DeadlineExceeded if less than `minimum` seconds are left, so the
+    caller doesn't start work it cannot finish.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    left = deadline.remaining()
+    if left <= minimum:
+        raise DeadlineExceeded(f"{left:.2f}s left of a {deadline.budget:.1f}s budget")
+    return min(default, left)
+
+
+@contextmanager
+def stage(name: str):
+    """Record a stage on the current deadline (no-op outside one)."""
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    with deadline.stage(name):
+        yield
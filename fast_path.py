@@ -0,0 +1,194 @@
+"""
+Deterministic fast path for fixed-script procedures.
+
+A few procedures in the expert prompt open with the same step every time
+("PASSWORD RESET (SelfCare)", "FIND SERVER NAME / USERNAME", "RDP FILE
+GENERATION"). When a session's first message clearly asks for one of them,
+that opening step is answered locally instead of by an LLM round trip:
+
+  1. Match   → each intent's trigger phrases (PhraseMatcher, negation-aware);
+               exactly one intent may fire, in a message of at most
+               `max_words` words
+  2. Veto    → per-intent phrases that point at a neighbouring procedure
+               ("error", "drake", "can't login") decline the match
+  3. Answer  → the intent's template around Step 1 of the procedure, taken
+               from the current prompt version: editing the prompt changes
+               the canned answer, and removing the procedure (or its
+               Step 1) disables the intent
+
+The caller stores the turn in history like an LLM turn and pins the
+procedure as the session's sticky procedure, so the LLM carries on from
+step 2. Mode "shadow" matches and audits without serving; "off" skips the
+router entirely.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import FAST_PATH
+from phrase_matcher import PhraseMatcher
+
+logger = logging.getLogger(__name__)
+
+MODES = ("on", "shadow", "off")
+
+_STEP_ONE_RE = re.compile(r'^Step 1:\s*"(.+)"\s*$', re.MULTILINE)
+
+# Characters of the user message kept in an audit entry
+_AUDIT_MESSAGE_CHARS = 80
+
+
+@dataclass(frozen=True)
+class FastPathIntent:
+    """A whitelisted procedure whose opening step can be answered locally.
+
+    `template` wraps the procedure's Step 1 text (`{step}`).
+    """
+
+    name: str
+    procedure: str
+    triggers: Tuple[str, ...]
+    veto: Tuple[str, ...] = ()
+    template: str = "{step}"
+
+
+@dataclass(frozen=True)
+class FastPathMatch:
+    intent: str
+    procedure: str
+    trigger: str
+    reply: str
+
+
+def first_step(procedure_text: str) -> Optional[str]:
+    """The quoted text of a procedure's `Step 1: "..."` line, if any."""
+    match = _STEP_ONE_RE.search(procedure_text)
+    return match.group(1).strip() if match else None
+
+
+class FastPathRouter:
+    """Routes first-turn messages to canned procedure openings.
+
+    - `load_prompt()` renders the replies for a prompt version; call it at
+      startup and on every prompt reload.
+    - `route()` returns a FastPathMatch (served, or only recorded in
+      shadow mode) or None, and keeps per-intent counts plus the last
+      `audit_size` decisions in which an intent fired.
+    """
+
+    def __init__(self, intents: Iterable[FastPathIntent], mode: str = "on",
+                 max_words: int = 25, audit_size: int = 100):
+        if mode not in MODES:
+            raise ValueError(f"fast path mode must be one of {', '.join(MODES)}, got {mode!r}")
+        self.mode = mode
+        self.max_words = max_words
+        self.intents = list(intents)
+        self._matchers = [
+            (intent, PhraseMatcher(intent.triggers, negatable=True),
+             PhraseMatcher(intent.veto) if intent.veto else None)
+            for intent in self.intents
+        ]
+        self._replies: Dict[str, str] = {}
+        self.prompt_version: Optional[str] = None
+
+        self.considered = 0
+        self.served: Counter = Counter()
+        self.shadowed: Counter = Counter()
+        self.declined: Counter = Counter()
+        self._audit: deque = deque(maxlen=audit_size)
+
+    @property
+    def serving(self) -> bool:
+        return self.mode == "on"
+
+    def load_prompt(self, prompt):
+        """Render every intent's reply from `prompt` (a PromptVersion)."""
+        replies = {}
+        for intent in self.intents:
+            procedure = prompt.retriever.procedure(intent.procedure)
+            step = first_step(procedure.text) if procedure else None
+            if step is None:
+                logger.warning("Fast path intent %s disabled: no Step 1 for procedure %r in prompt %s",
+                               intent.name, intent.procedure, prompt.version)
+                continue
+            replies[intent.name] = intent.template.replace("{step}", step)
+        self._replies = replies
+        self.prompt_version = prompt.version
+
+    def _decline(self, reason: str, intent: str = "none") -> None:
+        self.declined[reason] += 1
+        FAST_PATH.labels(intent, reason).inc()
+        return None
+
+    def _record(self, outcome: str, intent: str, trigger: str, message: str, session_id: Optional[str]):
+        self._audit.append({
+            "at": round(time.time()),
+            "session_id": session_id,
+            "intent": intent,
+            "trigger": trigger,
+            "outcome": outcome,
+            "message": message[:_AUDIT_MESSAGE_CHARS],
+        })
+
+    def route(self, message: str, session_id: Optional[str] = None) -> Optional[FastPathMatch]:
+        """Match a first-turn message; None means the LLM should answer it."""
+        if self.mode == "off":
+            return None
+        self.considered += 1
+        if len(message.split()) > self.max_words:
+            return self._decline("too_long")
+
+        hits: List[Tuple[FastPathIntent, PhraseMatcher, str]] = []
+        for intent, triggers, veto in self._matchers:
+            trigger = triggers.search(message)
+            if trigger:
+                hits.append((intent, veto, trigger))
+        if not hits:
+            return self._decline("no_match")
+
+        intent, veto, trigger = hits[0]
+        if len(hits) > 1:
+            self._record("ambiguous", "+".join(h[0].name for h in hits), trigger, message, session_id)
+            return self._decline("ambiguous", intent.name)
+        vetoed = veto.search(message) if veto else None
+        if vetoed:
+            self._record("veto", intent.name, f"{trigger} / {vetoed}", message, session_id)
+            return self._decline("veto", intent.name)
+        reply = self._replies.get(intent.name)
+        if reply is None:
+            return self._decline("procedure_missing", intent.name)
+
+        outcome = "served" if self.serving else "shadow"
+        (self.served if self.serving else self.shadowed)[intent.name] += 1
+        FAST_PATH.labels(intent.name, outcome).inc()
+        self._record(outcome, intent.name, trigger, message, session_id)
+        logger.info("Fast path %s: intent %s (trigger '%s')", outcome, intent.name, trigger)
+        return FastPathMatch(intent=intent.name, procedure=intent.procedure, trigger=trigger, reply=reply)
+
+    def stats(self) -> Dict:
+        served = sum(self.served.values())
+        return {
+            "mode": self.mode,
+            "prompt_version": self.prompt_version,
+            "considered": self.considered,
+            "served": served,
+            "shadowed": sum(self.shadowed.values()),
+            "hit_rate": round(served / self.considered, 3) if self.considered else 0.0,
+            "declined": dict(self.declined),
+            "intents": {
+                intent.name: {
+                    "procedure": intent.procedure,
+                    "active": intent.name in self._replies,
+                    "served": self.served[intent.name],
+                    "shadowed": self.shadowed[intent.name],
+                }
+                for intent in self.intents
+            },
+            "recent": list(self._audit),
+        }
@@ -4,19 +4,51 @@ No classification layer, no routing complexity
 Just: Expert Prompt → LLM → Response → Escalation Detection → SalesIQ/Desk APIs
 """
 
+import time
+
+# Import time (dependencies + module-level setup) is logged at startup, apart from warm-up
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import re
 import uuid
 import asyncio
 import logging
-from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List, Optional
 from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from openai import AsyncOpenAI, APITimeoutError, RateLimitError, APIConnectionError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from openai import AsyncOpenAI, APIStatusError, APITimeoutError, RateLimitError, APIConnectionError, InternalServerError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from zoho_live_integration import create_callback_activity, close_chat
+from zoho_live_integration import (
+    create_callback_activity, close_chat, zoho_http, tokens,
+    SALESIQ_BASE_URL, DESK_BASE_URL, ZOHO_ACCOUNTS_URL,
+)
+from prompt_registry import PromptRegistry
+from response_cache import ResponseCache
+from outbox import Outbox
+from session_store import create_session_store
+from session_locks import SessionLocks
+from session_router import (
+    DEADLINE_HEADER, FORWARDED_HEADER, HANDLED_BY_HEADER, ForwardUnanswered, SessionRouter,
+)
+from message_coalescer import MessageCoalescer
+from phrase_matcher import PhraseMatcher
+from fast_path import FastPathIntent, FastPathRouter
+from context_window import ContextWindow
+from rolling_summary import RollingSummarizer, folded_turns, render_transcript
+from llm_hedging import HedgedLLM
+from llm_guard import AdaptiveLimiter, LLMUnavailable
+from deadline import DeadlineExceeded, remaining, request_deadline, stage, timeout_for
+import metrics
+from metrics import (
+    ESCALATIONS, LLM_FALLBACKS, LLM_RETRIES, RESOLUTIONS, STARTUP_SECONDS, WEBHOOK_IN_FLIGHT,
+    WEBHOOK_SECONDS,
+)
+from tracing import TraceLogFilter, current_span, span, trace, traced, tracer
+from webhook_payload import PayloadError, StaticReply, Visitor, parse_webhook, render_reply
+from warmup import Warmup
 
 # Setup structured JSON logging
 from pythonjsonlogger import json as jsonlogger
@@ -27,6 +59,8 @@ formatter = jsonlogger.JsonFormatter(
     rename_fields={"asctime": "timestamp", "levelname": "level"},
 )
 log_handler.setFormatter(formatter)
+# Every log line written while handling a webhook carries its trace_id
+log_handler.addFilter(TraceLogFilter())
 logging.root.handlers = [log_handler]
 logging.root.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,14 +74,54 @@ from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(application):
-    """Start background session cleanup on startup, cancel on shutdown."""
+    """Restore the session snapshot, open the Zoho HTTP pool and outbox, and
+    start background session cleanup/snapshots, token refresh and warm-up on
+    startup; drain the outbox, snapshot sessions and stop everything on shutdown."""
+    if SESSION_SNAPSHOT_PATH:
+        start = time.perf_counter()
+        restored = conversations.restore(SESSION_SNAPSHOT_PATH)
+        if restored:
+            logger.info("Restored %d sessions from %s in %.0f ms", restored, SESSION_SNAPSHOT_PATH,
+                        (time.perf_counter() - start) * 1000)
+    await conversations.acount()
+    await zoho_http.start(ZOHO_HOSTS)
+    await outbox.start()
+    tracer.start()
+    prompt_registry.start()
+    # Runs in the background: /health answers at once, /ready once warmed up
+    warmup.start()
+    if ZOHO_TOKEN_PROACTIVE_REFRESH:
+        tokens.start_background_refresh()
+
     async def _cleanup_loop():
         while True:
-            await asyncio.sleep(300)  # Every 5 minutes
-            conversations.cleanup_expired()
+            await asyncio.sleep(SESSION_CLEANUP_INTERVAL)
+            await conversations.acleanup_expired()
+            response_cache.purge_expired()
     task = asyncio.create_task(_cleanup_loop())
+
+    async def _snapshot_loop():
+        while True:
+            await asyncio.sleep(SESSION_SNAPSHOT_INTERVAL)
+            await _snapshot_sessions()
+    snapshot_task = None
+    if SESSION_SNAPSHOT_PATH and SESSION_SNAPSHOT_INTERVAL > 0:
+        snapshot_task = asyncio.create_task(_snapshot_loop())
     yield
     task.cancel()
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    await warmup.aclose()
+    await prompt_registry.aclose()
+    await rolling_summarizer.aclose()
+    await outbox.drain(timeout=OUTBOX_DRAIN_TIMEOUT)
+    await tokens.stop_background_refresh()
+    await zoho_http.aclose()
+    await session_router.aclose()
+    await tracer.aclose()
+    if SESSION_SNAPSHOT_PATH:
+        await _snapshot_sessions()
+    conversations.close()
 
 app = FastAPI(title="ACE Cloud Chatbot - Simplified v2.0", lifespan=lifespan)
 
@@ -55,6 +129,8 @@ app = FastAPI(title="ACE Cloud Chatbot - Simplified v2.0", lifespan=lifespan)
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
 SALESIQ_DEPARTMENT_ID = os.getenv("SALESIQ_DEPARTMENT_ID", "2782000000002013")
+ZOHO_TOKEN_PROACTIVE_REFRESH = os.getenv("ZOHO_TOKEN_PROACTIVE_REFRESH", "true").lower() == "true"
+ZOHO_HOSTS = [SALESIQ_BASE_URL, DESK_BASE_URL, ZOHO_ACCOUNTS_URL]
 
 
 async def verify_webhook_secret(request: Request):
@@ -69,84 +145,186 @@ async def verify_webhook_secret(request: Request):
 
 
 # LLM Client (async for non-blocking event loop)
+# Retries are done by tenacity below (deadline-aware), not inside the SDK
 client = AsyncOpenAI(
     api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1"
+    base_url=os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1"),
+    max_retries=0,
+)
+
+# Request budget: SalesIQ abandons a webhook after a few seconds, so every
+# stage sizes its timeout from what is left (see deadline)
+WEBHOOK_DEADLINE_SECONDS = float(os.getenv("WEBHOOK_DEADLINE_SECONDS", "9"))
+# Kept back from the budget for building and sending the reply
+WEBHOOK_DEADLINE_RESERVE = float(os.getenv("WEBHOOK_DEADLINE_RESERVE", "0.5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Don't start an LLM attempt with less time than this left
+LLM_MIN_ATTEMPT_SECONDS = float(os.getenv("LLM_MIN_ATTEMPT_SECONDS", "1.5"))
+
+# Model cascade: the first model answers; if it is slower than its p95, the
+# next one is asked too (hedging), and a failing model hands over to the next
+LLM_MODELS = [m.strip() for m in os.getenv("LLM_MODELS", "google/gemini-2.5-flash").split(",") if m.strip()]
+
+llm = HedgedLLM(
+    client,
+    LLM_MODELS,
+    hedge_after_ms=float(os.getenv("LLM_HEDGE_AFTER_MS", "2500")),
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+    min_hedge_ms=float(os.getenv("LLM_HEDGE_MIN_MS", "500")),
+    max_hedge_ms=float(os.getenv("LLM_HEDGE_MAX_MS", "8000")),
+    # AIMD concurrency limit in front of OpenRouter + per-model circuit breakers
+    limiter=AdaptiveLimiter(
+        initial_limit=int(os.getenv("LLM_CONCURRENCY_INITIAL", "16")),
+        min_limit=int(os.getenv("LLM_CONCURRENCY_MIN", "2")),
+        max_limit=int(os.getenv("LLM_CONCURRENCY_MAX", "64")),
+        max_queue=int(os.getenv("LLM_QUEUE_MAX", "100")),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+    ),
+    breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    breaker_reset=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+)
+
+# Reply when the LLM is refused locally (overloaded / circuit open). The
+# wording matches BOT_ESCALATION_PHRASES so the escalation buttons are shown.
+LLM_UNAVAILABLE_REPLY = (
+    "I'm receiving a lot of requests right now and can't look into this immediately. "
+    "Would you like me to connect you with our support team? You can chat with a "
+    "technician or schedule a callback below."
 )
 
+# Reply when the request budget runs out before the answer is ready
+SLOW_REPLY = (
+    "Sorry, this is taking longer than expected. Please send your message again in a moment."
+)
+
+# Reply when the LLM call fails after retries
+LLM_ERROR_REPLY = (
+    "I apologize, but I'm having trouble processing your request. Please try again in a moment."
+)
+
+# Canned replies stand in for an answer: they are stored in history marked
+# "fallback" (escalation state still applies) but never fed back to the LLM
+FALLBACK_REPLIES = frozenset({LLM_UNAVAILABLE_REPLY, SLOW_REPLY, LLM_ERROR_REPLY})
+
 # Session configuration
 MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
 SESSION_TTL_MINUTES = int(os.getenv("SESSION_TTL_MINUTES", "30"))
 MAX_MESSAGES_PER_SESSION = int(os.getenv("MAX_MESSAGES_PER_SESSION", "20"))
+# memory (single process) | sqlite (several workers, one host) | redis (several hosts)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "sessions.db"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Expiry is O(expired sessions), so sweeping often is cheap
+SESSION_CLEANUP_INTERVAL = int(os.getenv("SESSION_CLEANUP_INTERVAL", "60"))
+# Memory backend: sessions are snapshotted periodically and on shutdown, and
+# restored on startup (put the file on a volume to survive redeploys).
+# Empty path disables; SQLite/Redis sessions persist on their own.
+SESSION_SNAPSHOT_PATH = os.getenv(
+    "SESSION_SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "data", "sessions.snapshot"),
+)
+SESSION_SNAPSHOT_INTERVAL = int(os.getenv("SESSION_SNAPSHOT_INTERVAL", "60"))
 
 
-class SessionStore:
-    """Bounded, TTL-based conversation store.
+conversations = create_session_store(
+    SESSION_BACKEND,
+    max_sessions=MAX_SESSIONS,
+    ttl_minutes=SESSION_TTL_MINUTES,
+    max_messages=MAX_MESSAGES_PER_SESSION,
+    sqlite_path=SESSION_DB_PATH,
+    redis_url=REDIS_URL,
+)
 
-    - Evicts sessions idle for longer than `ttl_minutes`.
-    - Caps total sessions at `max_sessions` (LRU eviction).
-    - Caps messages per session at `max_messages`.
-    """
+# Cluster routing (alternative to a shared store): every replica gets the same
+# CLUSTER_PEERS list and forwards each session's webhooks to the replica that
+# owns it on a consistent-hash ring. Off unless there are at least two peers.
+session_router = SessionRouter(
+    os.getenv("CLUSTER_SELF_URL", f"http://127.0.0.1:{os.getenv('PORT', '8000')}"),
+    os.getenv("CLUSTER_PEERS", "").split(","),
+    vnodes=int(os.getenv("CLUSTER_VNODES", "128")),
+    timeout=float(os.getenv("CLUSTER_FORWARD_TIMEOUT", "8")),
+    down_seconds=float(os.getenv("CLUSTER_PEER_DOWN_SECONDS", "10")),
+)
 
-    def __init__(self, max_sessions: int = 1000, ttl_minutes: int = 30, max_messages: int = 50):
-        self._store: OrderedDict[str, List[Dict]] = OrderedDict()
-        self._last_active: Dict[str, datetime] = {}
-        self.max_sessions = max_sessions
-        self.ttl_minutes = ttl_minutes
-        self.max_messages = max_messages
-
-    def get_or_create(self, session_id: str) -> List[Dict]:
-        """Return message history for session, creating if needed."""
-        if session_id in self._store:
-            self._store.move_to_end(session_id)
-        else:
-            # Evict LRU session if at capacity
-            if len(self._store) >= self.max_sessions:
-                oldest_key, _ = self._store.popitem(last=False)
-                self._last_active.pop(oldest_key, None)
-                logger.info("Session evicted (LRU): %s", oldest_key)
-            self._store[session_id] = []
-        self._last_active[session_id] = datetime.now()
-        return self._store[session_id]
-
-    def reset(self, session_id: str):
-        """Clear history for a session."""
-        self._store.pop(session_id, None)
-
-    def add_message(self, session_id: str, message: Dict):
-        """Append a message, dropping oldest if over max_messages."""
-        history = self.get_or_create(session_id)
-        history.append(message)
-        if len(history) > self.max_messages:
-            del history[: len(history) - self.max_messages]
-
-    def cleanup_expired(self) -> int:
-        """Remove sessions idle longer than TTL. Returns count removed."""
-        now = datetime.now()
-        expired = [
-            sid
-            for sid, last in self._last_active.items()
-            if (now - last).total_seconds() > self.ttl_minutes * 60
-        ]
-        for sid in expired:
-            self._store.pop(sid, None)
-            self._last_active.pop(sid, None)
-        if expired:
-            logger.info("Cleaned up %d expired sessions", len(expired))
-        return len(expired)
 
-    def __len__(self) -> int:
-        return len(self._store)
+async def _snapshot_sessions():
+    """Write the session snapshot on a worker thread (never fails the caller)."""
+    start = time.perf_counter()
+    try:
+        written = await asyncio.to_thread(conversations.snapshot, SESSION_SNAPSHOT_PATH)
+    except Exception as exc:
+        logger.error("Session snapshot to %s failed: %s", SESSION_SNAPSHOT_PATH, exc)
+        return
+    if written:
+        logger.info("Snapshotted %d sessions in %.0f ms", written, (time.perf_counter() - start) * 1000)
+
+
+# Read at scrape time, never on the request path; shared backends report the
+# count from the last cleanup sweep instead of querying SQLite/Redis here
+metrics.Gauge("chatbot_sessions", "Sessions held by the session store", fn=lambda: conversations.count)
+
+# Per-session locks: webhooks for one conversation are processed in arrival order.
+# With a shared store (sqlite/redis, UVICORN_WORKERS > 1) they also take a
+# store-level lease so two workers never update one session at once.
+session_locks = SessionLocks(
+    conversations,
+    lease_seconds=float(os.getenv("SESSION_LOCK_LEASE_SECONDS", "60")),
+)
 
-    def __contains__(self, session_id: str) -> bool:
-        return session_id in self._store
+# Optional debounce: messages within the window are answered as one turn (0 = off)
+message_coalescer = MessageCoalescer(
+    window_ms=int(os.getenv("MESSAGE_DEBOUNCE_MS", "0")),
+    max_wait_ms=int(os.getenv("MESSAGE_DEBOUNCE_MAX_WAIT_MS", "5000")),
+)
 
+# Durable outbox for Zoho side-effects (chat close, callback creation)
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "outbox.db"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
 
-conversations = SessionStore(
-    max_sessions=MAX_SESSIONS,
-    ttl_minutes=SESSION_TTL_MINUTES,
-    max_messages=MAX_MESSAGES_PER_SESSION,
-)
+outbox = Outbox(OUTBOX_DB_PATH, workers=OUTBOX_WORKERS, max_attempts=OUTBOX_MAX_ATTEMPTS)
+
+
+async def _outbox_close_chat(payload: Dict) -> Dict:
+    return await close_chat(payload["session_id"])
+
+
+async def _outbox_callback(payload: Dict) -> Dict:
+    """Create the Desk callback, then queue the chat close once it exists.
+
+    Once the callback exists the job must succeed: a failure to queue the
+    close is only logged, since retrying the job would create the Desk
+    callback again.
+    """
+    result = await create_callback_activity(**payload)
+    if result.get("success"):
+        try:
+            await outbox.enqueue("close_chat", payload["session_id"], {"session_id": payload["session_id"]})
+        except Exception as exc:
+            logger.error("Chat close enqueue failed after callback for %s: %s", payload["session_id"], exc)
+    return result
+
+
+def _callback_dead_letter(payload: Dict, result: Dict):
+    """The visitor was told their callback was received: hand it to a human."""
+    logger.error(
+        "Callback request for session %s could not be created in Desk — follow up manually",
+        payload["session_id"],
+        extra={
+            "alert": "callback_dead_letter",
+            "session_id": payload["session_id"],
+            "user_name": payload.get("user_name"),
+            "user_email": payload.get("user_email"),
+            "user_phone": payload.get("user_phone"),
+            "preferred_time": payload.get("preferred_time"),
+            "last_result": result,
+        },
+    )
+
+
+outbox.register("close_chat", _outbox_close_chat)
+outbox.register("callback", _outbox_callback)
+outbox.on_dead_letter("callback", _callback_dead_letter)
 
 # Default fallback prompt if expert prompt file is missing
 _FALLBACK_PROMPT = (
@@ -155,22 +333,106 @@ _FALLBACK_PROMPT = (
 )
 
 
-# Load expert prompt
-def load_expert_prompt() -> str:
-    """Load the expert system prompt with fallback."""
-    prompt_path = os.path.join(os.path.dirname(__file__), "config", "prompts", "expert_system_prompt_production.txt")
+# Prompt retrieval: send core rules + top-k relevant procedures instead of the full prompt
+PROMPT_RETRIEVAL_ENABLED = os.getenv("PROMPT_RETRIEVAL_ENABLED", "true").lower() == "true"
+PROMPT_RETRIEVAL_TOP_K = int(os.getenv("PROMPT_RETRIEVAL_TOP_K", "3"))
+# Token cap for procedures added because a selected one routes to them ("Go to ...")
+PROMPT_RETRIEVAL_MAX_LINK_TOKENS = int(os.getenv("PROMPT_RETRIEVAL_MAX_LINK_TOKENS", "2000"))
 
-    try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            logger.info("Loaded expert prompt: %d characters from %s", len(content), prompt_path)
-            return content
-    except FileNotFoundError:
-        logger.error("Prompt file not found at %s — using fallback prompt", prompt_path)
-        return _FALLBACK_PROMPT
+# Expert prompt: reloaded from config/prompts when the file changes (no
+# restart); each request uses the version that was current when it started
+PROMPT_FILE = os.getenv("PROMPT_FILE", "expert_system_prompt_production.txt")
+
+prompt_registry = PromptRegistry(
+    os.path.join(os.path.dirname(__file__), "config", "prompts", PROMPT_FILE),
+    fallback=_FALLBACK_PROMPT,
+    retriever_options={"top_k": PROMPT_RETRIEVAL_TOP_K, "max_sessions": MAX_SESSIONS,
+                       "max_link_tokens": PROMPT_RETRIEVAL_MAX_LINK_TOKENS},
+    poll_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "5")),
+)
+
+# Token budget for system prompt + history sent to the LLM (oldest turns trimmed first)
+context_window = ContextWindow(
+    max_input_tokens=int(os.getenv("LLM_CONTEXT_MAX_TOKENS", "12000")),
+    max_messages=int(os.getenv("LLM_CONTEXT_MAX_MESSAGES", "20")),
+)
+
+# Rolling summary: fold older turns of long sessions into one summary (background LLM call)
+ROLLING_SUMMARY_ENABLED = os.getenv("ROLLING_SUMMARY_ENABLED", "true").lower() == "true"
+ROLLING_SUMMARY_THRESHOLD = int(os.getenv("ROLLING_SUMMARY_THRESHOLD", "12"))
+ROLLING_SUMMARY_KEEP_RECENT = int(os.getenv("ROLLING_SUMMARY_KEEP_RECENT", "6"))
+
+# Response cache for first-turn questions, keyed on the prompt version
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+
+response_cache = ResponseCache(
+    ttl_seconds=int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(5 * 1024 * 1024))),
+    similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.8")),
+)
+response_cache.set_prompt_version(prompt_registry.current.version, prompt_registry.current.text)
+prompt_registry.on_change(lambda prompt: response_cache.set_prompt_version(prompt.version, prompt.text))
+
+# Startup warm-up: open upstream connections and refresh Zoho tokens in the
+# background right after startup, so the first webhooks don't pay for DNS,
+# TLS and OAuth round-trips. /ready answers 200 once it has finished.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_LLM_CONNECTIONS = int(os.getenv("WARMUP_LLM_CONNECTIONS", "2"))
+# Also send a 1-token completion (costs a request, warms provider-side routing)
+WARMUP_LLM_PRIME = os.getenv("WARMUP_LLM_PRIME", "false").lower() == "true"
+
+warmup = Warmup(
+    timeout=float(os.getenv("WARMUP_TIMEOUT_SECONDS", "15")),
+    enabled=WARMUP_ENABLED,
+)
+
+
+async def _warm_llm_connections() -> Dict:
+    """Open keep-alive connections to the LLM provider.
+
+    A tiny metadata request per connection; any HTTP answer (even a 404)
+    means the connection is established, only transport errors fail.
+    """
+    async def _open():
+        try:
+            await client.models.retrieve(LLM_MODELS[0])
+        except APIStatusError:
+            pass
+    await asyncio.gather(*(_open() for _ in range(WARMUP_LLM_CONNECTIONS)))
+    return {"connections": WARMUP_LLM_CONNECTIONS}
+
+
+async def _prime_llm() -> Dict:
+    _, model = await llm.create(
+        hedge=False,
+        messages=[{"role": "user", "content": "ping"}],
+        max_tokens=1,
+    )
+    return {"model": model}
+
+
+async def _warm_zoho_connections() -> Dict:
+    return {"hosts": await zoho_http.warm_up(ZOHO_HOSTS)}
+
+
+async def _warm_zoho_tokens() -> Dict:
+    refreshed = await tokens.warm_up()
+    if not all(refreshed.values()):
+        raise RuntimeError(f"token refresh failed: {[k for k, ok in refreshed.items() if not ok]}")
+    return {"refreshed": list(refreshed)}
 
 
-EXPERT_PROMPT = load_expert_prompt()
+if WARMUP_LLM_CONNECTIONS > 0:
+    warmup.add("llm_connections", _warm_llm_connections)
+if WARMUP_LLM_PRIME:
+    warmup.add("llm_prime", _prime_llm)
+if tokens.status():  # at least one Zoho token set is configured
+    warmup.add("zoho_connections", _warm_zoho_connections)
+    warmup.add("zoho_tokens", _warm_zoho_tokens)
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+STARTUP_SECONDS.labels("import").set(IMPORT_SECONDS)
 
 # Structured startup log (replaces print() banner for clean JSON logs)
 logger.info(
@@ -178,9 +440,11 @@ logger.info(
     extra={
         "version": "2.0",
         "architecture": "direct_llm",
-        "prompt_chars": len(EXPERT_PROMPT),
+        "prompt_chars": len(prompt_registry.current.text),
+        "prompt_version": prompt_registry.current.version,
         "salesiq": True,
         "desk_api": True,
+        "import_ms": round(IMPORT_SECONDS * 1000, 1),
     },
 )
 
@@ -241,6 +505,92 @@ BOT_RESOLUTION_ASK_PHRASES = [
     "glad that helped", "great to hear",
 ]
 
+EXPLICIT_CLOSE_PHRASES = ["close this chat", "close chat", "end chat"]
+
+# ── Compiled matchers (one regex pass per message, word-boundary aware) ──
+# Short affirmations only count when they open the message, and substrings
+# such as "task manager" are swallowed before "manager" can fire.
+USER_ESCALATION_MATCHER = PhraseMatcher(
+    ESCALATION_KEYWORDS,
+    exclude=["task manager", "file manager", "credential manager"],
+    negatable=True,
+)
+BOT_ESCALATION_MATCHER = PhraseMatcher(BOT_ESCALATION_PHRASES)
+USER_RESOLUTION_MATCHER = PhraseMatcher(
+    USER_RESOLUTION_PHRASES,
+    anchored=["yes", "yeah", "yep", "yup", "ya", "han", "haan", "fixed", "resolved", "solved",
+              "all good", "no more issues", "no issues", "no problem"],
+    negatable=True,
+)
+EXPLICIT_CLOSE_MATCHER = PhraseMatcher(EXPLICIT_CLOSE_PHRASES, negatable=True)
+
+# ── Fast path: fixed-script procedures answered without the LLM ──
+# Only a session's first message is routed, and only to these whitelisted
+# procedures; the reply is the intent's template around the procedure's
+# Step 1 in the current prompt. Vetoes send anything that looks like a
+# neighbouring procedure (login errors, app passwords, broken RDP files)
+# to the LLM. FAST_PATH_MODE: on | shadow (audit only) | off
+FAST_PATH_INTENTS = [
+    FastPathIntent(
+        name="password_reset",
+        procedure="PASSWORD RESET (SelfCare)",
+        triggers=(
+            "reset my password", "reset password", "reset the password", "password reset",
+            "forgot my password", "forgot password", "forgotten my password", "forgot the password",
+            "change my password", "change password", "new password",
+        ),
+        # Reporting a login problem needs the multi-user check first; app and
+        # QuickBooks file passwords have procedures of their own
+        veto=(
+            "login", "log in", "logon", "sign in", "error", "failed", "incorrect", "locked",
+            "expired", "access denied", "not working", "doesn't work", "multiple users",
+            "drake", "tax", "sage", "quicken", "quickbooks", "qb", "company file",
+            "outlook", "email", "office", "myportal", "user management",
+        ),
+        template="I can help you reset your password. {step}",
+    ),
+    FastPathIntent(
+        name="find_server_name",
+        procedure="FIND SERVER NAME / USERNAME",
+        triggers=(
+            "find my server name", "find the server name", "find server name",
+            "what is my server name", "what's my server name", "whats my server name",
+            "forgot my server name", "forgot server name",
+            "don't know my server name", "dont know my server name", "do not know my server name",
+            "find my username", "find my user name", "what is my username", "what's my username",
+            "forgot my username", "forgot my user name", "forgot username",
+            "don't know my username", "dont know my username", "do not know my username",
+        ),
+        veto=("password", "error", "not found", "cannot find server", "can't find the server",
+              "generate", "rdp generator"),
+        template="Sure, let's find those details. {step}",
+    ),
+    FastPathIntent(
+        name="rdp_file_generation",
+        procedure="RDP FILE GENERATION (New User Setup)",
+        triggers=(
+            "need an rdp file", "need a rdp file", "need a new rdp file", "need the rdp file",
+            "need rdp file", "new rdp file", "lost my rdp file", "lost the rdp file", "lost rdp file",
+            "lost my rdp icon", "deleted my rdp file", "deleted the rdp file", "deleted my rdp icon",
+            "download the rdp file", "download rdp file", "download an rdp file",
+            "generate an rdp file", "generate rdp file", "generate a new rdp file", "rdp generator",
+        ),
+        veto=("not working", "doesn't work", "error", "gateway", "won't open", "wont open",
+              "can't connect", "cannot connect", "corrupt", "display", "monitor", "password",
+              "disconnect"),
+        template="I can help you get a new RDP file. {step} Let me know when you're there.",
+    ),
+]
+
+fast_path = FastPathRouter(
+    FAST_PATH_INTENTS,
+    mode=os.getenv("FAST_PATH_MODE", "on").lower(),
+    max_words=int(os.getenv("FAST_PATH_MAX_WORDS", "25")),
+    audit_size=int(os.getenv("FAST_PATH_AUDIT_SIZE", "100")),
+)
+fast_path.load_prompt(prompt_registry.current)
+prompt_registry.on_change(fast_path.load_prompt)
+
 # ── State markers (stored in session history to track multi-step flows) ──
 CALLBACK_WAITING_MARKER = "WAITING_FOR_CALLBACK_DETAILS"
 
@@ -253,19 +603,23 @@ def detect_resolution(user_message: str, history: List[Dict]) -> bool:
     user_lower = user_message.lower().strip()
 
     # If the user explicitly says they want to close the chat, or it's resolved
-    explicit_close_phrases = ["close this chat", "close chat", "end chat"]
-    if any(phrase in user_lower for phrase in explicit_close_phrases):
+    phrase = EXPLICIT_CLOSE_MATCHER.search(user_lower)
+    if phrase:
+        logger.info("Resolution detected: explicit close '%s'", phrase)
+        RESOLUTIONS.labels("explicit_close").inc()
         return True
 
     if len(user_lower) < 60:
-        for phrase in USER_RESOLUTION_PHRASES:
-            if phrase in user_lower:
-                logger.info("Resolution detected: user said '%s'", user_lower)
-                return True
+        phrase = USER_RESOLUTION_MATCHER.search(user_lower)
+        if phrase:
+            logger.info("Resolution detected: user said '%s' (phrase '%s')", user_lower, phrase)
+            RESOLUTIONS.labels("user_phrase").inc()
+            return True
 
     return False
 
 
+@traced("detect_escalation")
 def detect_escalation(user_message: str, bot_response: str, history: List[Dict]) -> bool:
     """Detect if escalation is needed.
     Only triggers ONCE per session to prevent button spam, unless the user explicitly asks for it again.
@@ -276,48 +630,60 @@ def detect_escalation(user_message: str, bot_response: str, history: List[Dict])
     # Check if we already showed buttons recently
     already_escalated = any(msg.get("escalated", False) for msg in history[-5:])
 
-    for keyword in ESCALATION_KEYWORDS:
-        if keyword in user_lower:
-            logger.info("Escalation detected: user keyword '%s'", keyword)
-            return True
+    keyword = USER_ESCALATION_MATCHER.search(user_lower)
+    if keyword:
+        logger.info("Escalation detected: user keyword '%s'", keyword)
+        ESCALATIONS.labels("user_keyword").inc()
+        return True
 
     # If we already offered escalation, don't keep offering it automatically based on bot phrases/length
     if already_escalated:
         return False
 
-    for phrase in BOT_ESCALATION_PHRASES:
-        if phrase in bot_lower:
-            logger.info("Escalation detected: bot phrase '%s'", phrase)
-            return True
+    phrase = BOT_ESCALATION_MATCHER.search(bot_lower)
+    if phrase:
+        logger.info("Escalation detected: bot phrase '%s'", phrase)
+        ESCALATIONS.labels("bot_phrase").inc()
+        return True
 
     # Check conversation length (count only user/assistant messages)
-    msg_count = sum(1 for m in history if m.get("role") in ("user", "assistant"))
+    msg_count = sum(1 for m in history if m.get("role") in ("user", "assistant")) + folded_turns(history)
     if msg_count > 10:
         logger.info("Escalation detected: conversation too long (%d messages)", msg_count)
+        ESCALATIONS.labels("long_conversation").inc()
         return True
 
     return False
 
 
-def build_reply(replies: List[str], session_id: str, suggestions: Optional[List[Dict]] = None) -> JSONResponse:
+def build_reply(replies: List[str], session_id: str, suggestions: Optional[List[Dict]] = None) -> Response:
     """Build a SalesIQ-compatible webhook response."""
-    content: Dict = {
-        "action": "reply",
-        "replies": replies,
-        "session_id": session_id,
-    }
-    if suggestions:
-        content["suggestions"] = suggestions
-    return JSONResponse(status_code=200, content=content)
+    return render_reply(replies, session_id, suggestions)
+
+
+# Fixed replies, serialized once (only the session id is encoded per request)
+GREETING_REPLY = StaticReply(["Hi! I'm AceBuddy, What can I help you with today?"])
+EMPTY_REPLY = StaticReply([])
+RESET_REPLY = StaticReply(["Sure! Starting fresh. What issue can I help you with today?"])
+RESOLVED_REPLY = StaticReply([
+    "Great to hear your issue is resolved! "
+    "If you ever need help again, feel free to start a new chat. Have a great day!"
+])
+BUSY_REPLY = StaticReply(["I'm still working on your previous message. Please give me a moment."])
+SLOW_STATIC_REPLY = StaticReply([SLOW_REPLY])
+ERROR_REPLY = StaticReply(
+    ["I'm experiencing technical difficulties. Let me connect you with our support team."]
+)
 
 
 def _build_conversation_summary(history: List[Dict]) -> str:
-    """Build a short text summary from the last 10 user/assistant messages."""
-    return "\n".join(
-        f"{'User' if m['role'] == 'user' else 'Bot'}: {m['content']}"
-        for m in history[-10:]
-        if m.get("role") in ("user", "assistant")  # skip system markers
-    )
+    """Short text summary: the rolling summary (if any) + the last 10 user/assistant messages."""
+    return render_transcript(history, last=10)
+
+
+def _is_first_turn(history: List[Dict]) -> bool:
+    """True if the latest user message is the only turn so far."""
+    return sum(1 for m in history if m.get("role") in ("user", "assistant")) == 1
 
 
 def _is_waiting_for_callback(history: List[Dict]) -> bool:
@@ -375,80 +741,170 @@ def _parse_callback_details(message: str) -> Dict[str, Optional[str]]:
     return {"phone": phone, "preferred_time": preferred_time}
 
 
-async def generate_llm_response(message: str, history: List[Dict]) -> str:
+def _budget_spent(retry_state) -> bool:
+    """tenacity stop: the remaining budget can't cover the backoff plus another attempt."""
+    left = remaining()
+    if left is None:
+        return False
+    return left < getattr(retry_state, "upcoming_sleep", 0) + LLM_MIN_ATTEMPT_SECONDS
+
+
+@traced("generate_llm_response")
+async def generate_llm_response(message: str, history: List[Dict], session_id: Optional[str] = None) -> str:
     """Single async LLM call with expert prompt, retry, and input sanitization.
 
     NOTE: The caller must have already appended the user message to `history`
     before calling this function. This function builds the LLM messages list
-    from the system prompt + the last 20 messages in history.
+    from the system prompt + the most recent history that fits the token
+    budget (see context_window).
+
+    When prompt retrieval is enabled, the system prompt contains only the core
+    rules plus the procedures relevant to this session (see prompt_retrieval).
+    First-turn answers are served from / stored in the response cache.
     """
     # Input sanitization: strip control chars, cap length
     message = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', message)
     message = message[:2000]
 
-    messages = [{"role": "system", "content": EXPERT_PROMPT}]
-    # Only include user/assistant messages (skip system markers)
-    messages.extend(
-        m for m in history[-20:]
-        if m.get("role") in ("user", "assistant")
-    )
+    # Pinned for this turn, even if the prompt is reloaded meanwhile
+    prompt = prompt_registry.current
+    current_span().set("prompt_version", prompt.version)
+
+    # Low-context turn: the answer depends only on the message and the prompt
+    first_turn = _is_first_turn(history)
+    if RESPONSE_CACHE_ENABLED and first_turn:
+        cached = response_cache.get(message)
+        if cached is not None:
+            logger.info("Response cache hit for first-turn message")
+            current_span().set("cache_hit", True)
+            return cached
+
+    if PROMPT_RETRIEVAL_ENABLED:
+        system_prompt = prompt.retriever.build_system_prompt(history, session_id)
+    else:
+        system_prompt = prompt.text
+
+    # Only user/assistant messages are sent (system markers are skipped)
+    messages, input_tokens = context_window.build(system_prompt, history)
 
-    logger.info("Calling LLM with %d messages", len(messages))
+    logger.info("Calling LLM with %d messages, ~%d input tokens (system prompt %d chars)",
+                len(messages), input_tokens, len(system_prompt))
+    current_span().set("input_tokens", input_tokens)
+    attempts = 0
 
     @retry(
-        stop=stop_after_attempt(3),
+        stop=stop_after_attempt(3) | _budget_spent,
         wait=wait_exponential(multiplier=1, min=1, max=4),
-        retry=retry_if_exception_type((APITimeoutError, RateLimitError, APIConnectionError)),
+        retry=retry_if_exception_type((APITimeoutError, RateLimitError, APIConnectionError, InternalServerError)),
+        before_sleep=lambda _: LLM_RETRIES.inc(),
         reraise=True,
     )
     async def _call_llm():
-        return await client.chat.completions.create(
-            model="google/gemini-2.5-flash",
-            messages=messages,
-            temperature=0.3,
-            max_tokens=300,
-        )
+        nonlocal attempts
+        attempts += 1
+        with span("llm.attempt", attempt=attempts):
+            return await llm.create(
+                messages=messages,
+                temperature=0.3,
+                max_tokens=300,
+                timeout=timeout_for(LLM_TIMEOUT_SECONDS, minimum=LLM_MIN_ATTEMPT_SECONDS),
+            )
 
     try:
-        response = await _call_llm()
+        with stage("llm"):
+            response, model = await _call_llm()
         bot_response = response.choices[0].message.content.strip()
-        logger.info("LLM response length: %d chars", len(bot_response))
+        logger.info("LLM response length: %d chars (model %s)", len(bot_response), model)
+        current_span().set("model", model)
+        if RESPONSE_CACHE_ENABLED and first_turn and bot_response:
+            response_cache.put(message, bot_response, version=prompt.version)
         return bot_response
 
+    except LLMUnavailable as e:
+        logger.warning("LLM unavailable, failing fast: %s", e)
+        LLM_FALLBACKS.labels("unavailable").inc()
+        return LLM_UNAVAILABLE_REPLY
+    except DeadlineExceeded as e:
+        logger.warning("LLM skipped, request budget spent: %s", e)
+        LLM_FALLBACKS.labels("deadline").inc()
+        return SLOW_REPLY
     except (APITimeoutError, RateLimitError, APIConnectionError) as e:
         logger.error("LLM transient failure after retries: %s", e)
-        return "I apologize, but I'm having trouble processing your request. Please try again in a moment."
+        LLM_FALLBACKS.labels("error").inc()
+        return LLM_ERROR_REPLY
     except Exception as e:
         logger.error("LLM generation failed: %s", e)
-        return "I apologize, but I'm having trouble processing your request. Please try again in a moment."
+        LLM_FALLBACKS.labels("error").inc()
+        return LLM_ERROR_REPLY
+
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a technical support chat between a user and "
+    "AceBuddy, the Ace Cloud Hosting support bot. Merge the previous summary with the new "
+    "messages into one updated summary of at most 120 words. Keep the user's problem, "
+    "product/server details, error messages, steps already tried and their outcome, and "
+    "anything still unresolved. Plain text, no greetings."
+)
+
+
+async def summarize_conversation(previous_summary: str, turns: List[Dict]) -> str:
+    """Fold `turns` into `previous_summary` with a short LLM call (used by RollingSummarizer)."""
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Bot'}: {m['content'][:1500]}" for m in turns
+    )
+    response, _ = await llm.create(
+        hedge=False,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": (
+                f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}"
+            )},
+        ],
+        temperature=0.0,
+        max_tokens=250,
+    )
+    return response.choices[0].message.content or ""
+
+
+rolling_summarizer = RollingSummarizer(
+    conversations,
+    session_locks,
+    summarize_conversation,
+    threshold=ROLLING_SUMMARY_THRESHOLD,
+    keep_recent=ROLLING_SUMMARY_KEEP_RECENT,
+    enabled=ROLLING_SUMMARY_ENABLED,
+)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # BUTTON HANDLERS
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def handle_chat_transfer(session_id: str) -> JSONResponse:
+TRANSFER_REPLY = StaticReply(
+    ["I'm connecting you with our support team. An operator will assist you shortly."],
+    action="forward",
+    department=SALESIQ_DEPARTMENT_ID,
+)
+
+
+async def handle_chat_transfer(session_id: str) -> Response:
     """Handle 'Chat with Technician' button click.
 
     Uses SalesIQ's official "forward" action — this tells SalesIQ to
     hand off the chat to a human operator in the specified department.
     No custom API call needed; SalesIQ handles the routing natively.
+    The handoff description (rolling summary + recent turns) is logged with
+    the transfer so the operator side has the context without rebuilding it.
     """
-    logger.info("Chat transfer requested — using SalesIQ forward action for session %s", session_id)
-    return JSONResponse(
-        status_code=200,
-        content={
-            "action": "forward",
-            "department": SALESIQ_DEPARTMENT_ID,
-            "replies": [
-                "I'm connecting you with our support team. "
-                "An operator will assist you shortly."
-            ],
-        },
-    )
+    handoff_summary = ""
+    if await conversations.acontains(session_id):
+        handoff_summary = _build_conversation_summary(await conversations.aget_or_create(session_id))
+    logger.info("Chat transfer requested — using SalesIQ forward action for session %s", session_id,
+                extra={"session_id": session_id, "handoff_summary": handoff_summary})
+    return TRANSFER_REPLY.render(session_id)
 
 
-async def handle_callback_step1(session_id: str, history: List[Dict]) -> JSONResponse:
+async def handle_callback_step1(session_id: str, history: List[Dict]) -> Response:
     """Handle 'Schedule Callback' button click — Step 1: Ask for details.
 
     Sets a WAITING_FOR_CALLBACK_DETAILS marker in session history so the
@@ -468,6 +924,7 @@ async def handle_callback_step1(session_id: str, history: List[Dict]) -> JSONRes
     history.append({"role": "user", "content": "Schedule Callback"})
     history.append({"role": "assistant", "content": response_text})
     history.append({"role": "system", "content": CALLBACK_WAITING_MARKER})
+    await conversations.asave(session_id, history)
 
     return build_reply([response_text], session_id)
 
@@ -475,15 +932,15 @@ async def handle_callback_step1(session_id: str, history: List[Dict]) -> JSONRes
 async def handle_callback_step2(
     session_id: str,
     message: str,
-    visitor: Dict,
+    visitor: Visitor,
     history: List[Dict],
-) -> JSONResponse:
+) -> Response:
     """Handle callback Step 2: Parse details, create activity, close chat.
 
     1. Remove the WAITING marker
     2. Parse phone + preferred time from user's message
-    3. Create callback activity on Desk
-    4. On success → close chat via SalesIQ API + clear session
+    3. Queue the callback activity in the outbox (closes the chat on success)
+    4. Acknowledge immediately + clear session
     """
     # Remove the system marker
     if history and history[-1].get("content") == CALLBACK_WAITING_MARKER:
@@ -497,55 +954,160 @@ async def handle_callback_step2(
     logger.info("Callback details parsed: time=%s, phone=%s", details["preferred_time"], details["phone"])
 
     # Extract visitor info
-    visitor_email = visitor.get("email", "support@acecloudhosting.com")
-    visitor_name = visitor.get("name", visitor_email.split("@")[0] if visitor_email else "Chat User")
+    visitor_email = visitor.email or "support@acecloudhosting.com"
+    visitor_name = visitor.name or visitor_email.split("@")[0]
 
     # Build full description including user-provided details
     summary = _build_conversation_summary(history)
     full_description = f"{summary}\n\nUSER PROVIDED DETAILS:\n{message}"
 
-    # Create callback activity on Desk
+    # Queue the Desk callback activity; the outbox closes the chat once it succeeds
     try:
-        result = await create_callback_activity(
-            session_id=session_id,
-            user_name=visitor_name,
-            user_email=visitor_email,
-            user_phone=details["phone"] or "",
-            preferred_time=details["preferred_time"] or "",
-            conversation_summary=full_description,
-        )
-        logger.info("Callback activity result: %s", result.get("success"))
+        await outbox.enqueue("callback", session_id, {
+            "session_id": session_id,
+            "user_name": visitor_name,
+            "user_email": visitor_email,
+            "user_phone": details["phone"] or "",
+            "preferred_time": details["preferred_time"] or "",
+            "conversation_summary": full_description,
+        })
     except Exception as exc:
-        logger.error("Callback activity exception: %s", exc, exc_info=True)
-        result = {"success": False, "error": "exception", "details": str(exc)}
-
-    if result.get("success"):
-        logger.info("Callback created successfully for session %s", session_id)
-
+        logger.error("Callback enqueue failed for session %s: %s", session_id, exc, exc_info=True)
+        await conversations.asave(session_id, history)
         response_text = (
-            "Your callback has been created successfully.\n"
-            "You will receive a call from our support team at your requested time. "
-            "Thank you for contacting Ace Cloud Hosting!"
+            "I got your details, but I couldn't create the callback in our system right now. "
+            "Please call our support team at 1-888-415-5240 for immediate help."
         )
+        return build_reply([response_text], session_id)
+
+    logger.info("Callback queued for session %s", session_id)
+    response_text = (
+        "Your callback request has been received.\n"
+        "You will receive a call from our support team at your requested time. "
+        "Thank you for contacting Ace Cloud Hosting!"
+    )
+
+    # Clear conversation memory
+    await conversations.areset(session_id)
+    prompt_registry.forget(session_id)
+
+    return build_reply([response_text], session_id)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# MESSAGE HANDLER
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+@dataclass
+class TurnState:
+    """Hand-off between handle_message and the webhook's budget backstop.
+
+    `abandoned`: the visitor already got an early "taking longer" reply, so
+    the late answer is stored as an unseen fallback. `committed`: the answer
+    is being saved and will be returned, so the backstop waits for it.
+    """
+
+    abandoned: bool = False
+    committed: bool = False
+
+
+async def handle_message(session_id: str, message: str, visitor: Visitor,
+                         turn: Optional[TurnState] = None) -> Response:
+    """Process a user message against the session's history.
 
-        # Close the SalesIQ chat session
+    The caller must hold `session_locks.hold(session_id)` so concurrent
+    webhooks for the same session are applied in order.
+    """
+    message_stripped = message.strip()
+    message_lower = message_stripped.lower()
+
+    # ── Button click: Schedule Callback (Step 1 — ask for details) ──
+    if message_stripped in CALLBACK_TRIGGERS or message_lower in CALLBACK_TRIGGERS:
+        with span("session.get_or_create", backend=SESSION_BACKEND):
+            history = await conversations.aget_or_create(session_id)
+        # Only start step 1 if not already waiting
+        if not _is_waiting_for_callback(history):
+            return await handle_callback_step1(session_id, history)
+
+    # ── Callback Step 2: User is providing phone + time details ──
+    with span("session.get_or_create", backend=SESSION_BACKEND):
+        history = await conversations.aget_or_create(session_id)
+    if _is_waiting_for_callback(history):
+        return await handle_callback_step2(session_id, message, visitor, history)
+
+    # ── Session reset keyword ──
+    if message_lower in ("new issue", "start fresh", "reset", "clear context"):
+        await conversations.areset(session_id)
+        prompt_registry.forget(session_id)
+        logger.info("Session reset for %s", session_id)
+        return RESET_REPLY.render(session_id)
+
+    # ── Check for resolution BEFORE generating a new LLM response ──
+    if len(history) >= 2 and detect_resolution(message, history):
+        logger.info("Resolution confirmed for session %s — closing chat", session_id)
+
+        # Close the SalesIQ chat session in the background (outbox retries on failure)
         try:
-            close_result = await close_chat(session_id)
-            logger.info("Chat closure result: %s", close_result.get("success"))
+            await outbox.enqueue("close_chat", session_id, {"session_id": session_id})
         except Exception as exc:
-            logger.error("Chat closure error: %s", exc)
+            logger.error("Chat close enqueue failed for %s: %s", session_id, exc)
 
-        # Clear conversation memory
-        conversations.reset(session_id)
+        # Clear session memory
+        await conversations.areset(session_id)
+        prompt_registry.forget(session_id)
 
-        return build_reply([response_text], session_id)
+        return RESOLVED_REPLY.render(session_id)
+
+    # ── Normal message flow ──
+    # Add user message to history
+    history.append({"role": "user", "content": message})
+
+    # Fixed-script procedure: answer its opening step locally and let the
+    # LLM take over from step 2 (the procedure stays sticky for the session)
+    fast = fast_path.route(message, session_id) if _is_first_turn(history) else None
+    if fast is not None and fast_path.serving:
+        bot_response = fast.reply
+        prompt_registry.current.retriever.pin(session_id, fast.procedure)
+        current_span().set("fast_path", fast.intent)
     else:
-        logger.warning("Callback creation failed for session %s: %s", session_id, result.get("error"))
-        response_text = (
-            "I got your details, but I couldn't create the callback in our system right now. "
-            "Please call our support team at 1-888-415-5240 for immediate help."
-        )
-        return build_reply([response_text], session_id)
+        fast = None
+        # Generate LLM response (SINGLE CALL)
+        bot_response = await generate_llm_response(message, history, session_id)
+
+    # Check if escalation needed (consolidated detection)
+    needs_escalation = detect_escalation(message, bot_response, history)
+
+    # The visitor already got an early reply: keep this answer out of the
+    # context and never count its (unseen) escalation buttons as shown
+    unseen = turn is not None and turn.abandoned
+    if unseen:
+        logger.info("Late answer for session %s stored as unseen", session_id)
+        needs_escalation = False
+    elif turn is not None:
+        turn.committed = True
+
+    # Add bot response to history (and mark if we escalated so we don't spam it)
+    reply_message = {"role": "assistant", "content": bot_response, "escalated": needs_escalation}
+    if fast is not None:
+        reply_message["fast_path"] = fast.intent
+    if unseen or bot_response in FALLBACK_REPLIES:
+        reply_message["fallback"] = True
+    history.append(reply_message)
+    await conversations.asave(session_id, history)
+    rolling_summarizer.maybe_fold(session_id, history)
+
+    if needs_escalation:
+        logger.info("Escalation triggered for session %s", session_id)
+
+        # Show escalation buttons — actual API calls happen when user clicks
+        suggestions = [
+            {"text": "💬 Chat with Technician", "action_type": "article", "action_value": "ESCALATE_CHAT"},
+            {"text": "📅 Schedule Callback", "action_type": "article", "action_value": "SCHEDULE_CALLBACK"},
+        ]
+
+        return build_reply([bot_response], session_id, suggestions=suggestions)
+
+    return build_reply([bot_response], session_id)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -562,6 +1124,46 @@ async def webhook_health():
     }
 
 
+async def _handle_within_budget(session_id: str, message: str, visitor: Visitor,
+                                deadline, request_id: str) -> Response:
+    """Run handle_message under the session lock, replying before the budget runs out.
+
+    Every stage already sizes its timeouts from the deadline; this is the
+    backstop. If the budget runs out while the request is still queued
+    behind the session lock, it is dropped. If it is already being handled,
+    it finishes in the background and the visitor gets a short "taking
+    longer" reply instead of a SalesIQ timeout; the late answer is saved as
+    an unseen fallback (see TurnState). An answer already being saved is
+    waited for instead.
+    """
+    started = asyncio.Event()
+    turn = TurnState()
+
+    async def _locked():
+        async with session_locks.hold(session_id) as waited_ms:
+            deadline.stages["lock_wait"] = waited_ms / 1000
+            started.set()
+            return await handle_message(session_id, message, visitor, turn)
+
+    task = asyncio.ensure_future(_locked())
+    done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline.remaining() + deadline.reserve / 2))
+    if task not in done and turn.committed:
+        done, _ = await asyncio.wait({task}, timeout=deadline.reserve / 4)
+    if task in done:
+        return task.result()
+
+    if not started.is_set():
+        task.cancel()
+        stage_name, reply = "lock_wait", BUSY_REPLY
+    else:
+        turn.abandoned = True
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        stage_name, reply = deadline.slowest_stage(), SLOW_STATIC_REPLY
+    logger.warning("Webhook budget of %.1fs spent in %s — replying early", deadline.budget, stage_name,
+                   extra={"request_id": request_id, "session_id": session_id, **deadline.report()})
+    return reply.render(session_id)
+
+
 @app.post("/webhook")
 async def webhook(request: Request, _auth=Depends(verify_webhook_secret)):
     """
@@ -576,121 +1178,146 @@ async def webhook(request: Request, _auth=Depends(verify_webhook_secret)):
     """
     session_id = "unknown"
     request_id = str(uuid.uuid4())[:8]
-    try:
-        data = await request.json()
-
-        # Extract data
-        handler = data.get("handler", "")
-        message = data.get("message", {}).get("text", "") if isinstance(data.get("message"), dict) else ""
-        visitor = data.get("visitor", {})
-        session_id = visitor.get("active_conversation_id", data.get("session_id", "unknown"))
-
-        logger.info("Webhook received", extra={
-            "request_id": request_id, "handler": handler,
-            "session_id": session_id, "msg_len": len(message),
-        })
-
-        # Handle initial contact (trigger event)
-        if handler == "trigger" and not message:
-            logger.info("Initial contact — session %s", session_id)
-            return build_reply(["Hi! I'm AceBuddy, What can I help you with today?"], session_id)
-
-        if not message:
-            return build_reply([], session_id)
-
-        message_stripped = message.strip()
-        message_lower = message_stripped.lower()
-
-        # ── Button click: Chat with Technician ──
-        # Uses SalesIQ native "forward" action — no API call needed
-        if message_stripped in CHAT_TRANSFER_TRIGGERS or message_lower in CHAT_TRANSFER_TRIGGERS:
-            return handle_chat_transfer(session_id)
-
-        # ── Button click: Schedule Callback (Step 1 — ask for details) ──
-        if message_stripped in CALLBACK_TRIGGERS or message_lower in CALLBACK_TRIGGERS:
-            history = conversations.get_or_create(session_id)
-            # Only start step 1 if not already waiting
-            if not _is_waiting_for_callback(history):
-                return await handle_callback_step1(session_id, history)
-
-        # ── Callback Step 2: User is providing phone + time details ──
-        history = conversations.get_or_create(session_id)
-        if _is_waiting_for_callback(history):
-            return await handle_callback_step2(session_id, message, visitor, history)
-
-        # ── Session reset keyword ──
-        if message_lower in ("new issue", "start fresh", "reset", "clear context"):
-            conversations.reset(session_id)
-            logger.info("Session reset for %s", session_id)
-            return build_reply(["Sure! Starting fresh. What issue can I help you with today?"], session_id)
-
-        # ── Check for resolution BEFORE generating a new LLM response ──
-        if len(history) >= 2 and detect_resolution(message, history):
-            logger.info("Resolution confirmed for session %s — closing chat", session_id)
-
-            # Close the SalesIQ chat session via API
-            close_result = await close_chat(session_id)
-            if close_result.get("success"):
-                logger.info("Chat closed successfully for session %s", session_id)
-            else:
-                logger.warning("Chat close API failed for %s: %s", session_id, close_result.get("error"))
-
-            # Clear session memory
-            conversations.reset(session_id)
-
-            return build_reply(
-                [
-                    "Great to hear your issue is resolved! "
-                    "If you ever need help again, feel free to start a new chat. Have a great day!"
-                ],
-                session_id,
-            )
-
-        # ── Normal message flow ──
-        # Add user message to history
-        conversations.add_message(session_id, {"role": "user", "content": message})
-
-        # Generate LLM response (SINGLE CALL)
-        bot_response = await generate_llm_response(message, history)
-
-        # Check if escalation needed (consolidated detection)
-        needs_escalation = detect_escalation(message, bot_response, history)
-
-        # Add bot response to history (and mark if we escalated so we don't spam it)
-        conversations.add_message(session_id, {"role": "assistant", "content": bot_response, "escalated": needs_escalation})
-
-        if needs_escalation:
-            logger.info("Escalation triggered for session %s", session_id)
-
-            # Show escalation buttons — actual API calls happen when user clicks
-            suggestions = [
-                {"text": "💬 Chat with Technician", "action_type": "article", "action_value": "ESCALATE_CHAT"},
-                {"text": "📅 Schedule Callback", "action_type": "article", "action_value": "SCHEDULE_CALLBACK"},
-            ]
-
-            return build_reply([bot_response], session_id, suggestions=suggestions)
-
-        return build_reply([bot_response], session_id)
-
-    except Exception as e:
-        logger.error("Webhook error: %s", e, exc_info=True)
-        return build_reply(
-            ["I'm experiencing technical difficulties. Let me connect you with our support team."],
-            session_id,
-        )
+    WEBHOOK_IN_FLIGHT.inc()
+    # A webhook forwarded by a peer replica only gets what is left of the original budget
+    forwarded_by = request.headers.get(FORWARDED_HEADER)
+    budget = WEBHOOK_DEADLINE_SECONDS
+    if forwarded_by:
+        try:
+            budget = min(budget, float(request.headers.get(DEADLINE_HEADER, budget)))
+        except ValueError:
+            pass
+    with request_deadline(budget, WEBHOOK_DEADLINE_RESERVE) as deadline, \
+            trace("webhook", request_id=request_id) as root:
+        try:
+            body = await request.body()
+            try:
+                payload = parse_webhook(body)
+            except PayloadError as e:
+                logger.warning("Rejected webhook payload (%d): %s", e.status_code, e.detail,
+                               extra={"request_id": request_id})
+                root.set("error", e.detail)
+                return e.response()
+
+            handler, message, visitor = payload.handler, payload.message, payload.visitor
+            session_id = payload.session_id
+            root.set("session_id", session_id)
+            root.set("handler", handler)
+
+            # ── Cluster routing: hand the webhook to the replica owning the session ──
+            if session_router.enabled:
+                if not forwarded_by and not session_router.is_local(session_id):
+                    try:
+                        forwarded = await session_router.forward(
+                            session_id, "/webhook", body, dict(request.headers),
+                            remaining=deadline.remaining(),
+                        )
+                    except ForwardUnanswered as exc:
+                        # The owner may still be handling it: never run it here too
+                        logger.warning("Forwarded webhook unanswered, replying early: %s", exc,
+                                       extra={"request_id": request_id, "session_id": session_id})
+                        root.set("forward_unanswered", True)
+                        return SLOW_STATIC_REPLY.render(session_id)
+                    if forwarded is not None:
+                        owner = str(forwarded.request.url.copy_with(path=None, query=None)).rstrip("/")
+                        root.set("forwarded_to", owner)
+                        return Response(content=forwarded.content, status_code=forwarded.status_code,
+                                        media_type=forwarded.headers.get("content-type"),
+                                        headers={HANDLED_BY_HEADER: owner})
+                    # The owner never got it (it is off the ring now): answer here
+                session_router.note_local(forwarded_by)
+
+            logger.info("Webhook received", extra={
+                "request_id": request_id, "handler": handler,
+                "session_id": session_id, "msg_len": len(message),
+            })
+
+            # Handle initial contact (trigger event)
+            if handler == "trigger" and not message:
+                logger.info("Initial contact — session %s", session_id)
+                return GREETING_REPLY.render(session_id)
+
+            if not message:
+                return EMPTY_REPLY.render(session_id)
+
+            message_stripped = message.strip()
+            message_lower = message_stripped.lower()
+
+            # ── Button click: Chat with Technician ──
+            # Uses SalesIQ native "forward" action — no API call needed
+            if message_stripped in CHAT_TRANSFER_TRIGGERS or message_lower in CHAT_TRANSFER_TRIGGERS:
+                return await handle_chat_transfer(session_id)
+
+            # ── Debounce: merge quick bursts of free text into one turn ──
+            is_button = message_stripped in CALLBACK_TRIGGERS or message_lower in CALLBACK_TRIGGERS
+            if message_coalescer.enabled and not is_button:
+                with deadline.stage("debounce"):
+                    merged = await message_coalescer.collect(session_id, message)
+                if merged is None:
+                    # A later message in the same burst will answer for both
+                    return EMPTY_REPLY.render(session_id)
+                message = merged
+
+            # ── Everything below reads/writes session history: one request at a time ──
+            return await _handle_within_budget(session_id, message, visitor, deadline, request_id)
+
+        except Exception as e:
+            logger.error("Webhook error: %s", e, exc_info=True)
+            root.set("error", f"{type(e).__name__}: {e}")
+            return ERROR_REPLY.render(session_id)
+        finally:
+            WEBHOOK_IN_FLIGHT.dec()
+            WEBHOOK_SECONDS.observe(deadline.elapsed())
+            if root.sampled:
+                for name, seconds in deadline.stages.items():
+                    root.set(f"stage.{name}_ms", round(seconds * 1000, 1))
+            if deadline.blown:
+                logger.warning("Webhook exceeded its %.1fs budget (slowest stage: %s)",
+                               deadline.budget, deadline.slowest_stage(),
+                               extra={"request_id": request_id, "session_id": session_id, **deadline.report()})
 
 
 @app.get("/health")
 async def health():
     """Health check endpoint"""
+    outbox_stats = await outbox.stats() if outbox.running else {}
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "expert_prompt_loaded": len(EXPERT_PROMPT) > 0,
-        "active_sessions": len(conversations)
+        "expert_prompt_loaded": prompt_registry.current.source != "fallback",
+        "active_sessions": await conversations.acount(),
+        "session_locks": session_locks.stats(),
+        "message_coalescing": message_coalescer.stats(),
+        "llm": llm.stats(),
+        "context_window": context_window.stats(),
+        "rolling_summary": rolling_summarizer.stats(),
+        "tracing": tracer.stats(),
+        "prompt": prompt_registry.stats(),
+        "cluster": session_router.stats(),
+        "warmup": warmup.stats(),
+        "response_cache": response_cache.stats(),
+        "fast_path": fast_path.stats(),
+        "zoho_http": zoho_http.stats(),
+        "zoho_token_expires_in": tokens.status(),
+        "outbox": outbox_stats,
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness check: 503 until startup warm-up has finished"""
+    stats = warmup.stats()
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **stats})
+    return {"status": "ready", **stats}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/webhook/salesiq")
 async def webhook_salesiq_health():
     """Health check for SalesIQ webhook endpoint"""
@@ -730,4 +1357,10 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    if workers > 1:
+        if SESSION_BACKEND == "memory":
+            logger.warning("UVICORN_WORKERS=%d with SESSION_BACKEND=memory — sessions will not be shared", workers)
+        uvicorn.run("llm_chatbot_simplified:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
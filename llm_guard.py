@@ -0,0 +1,212 @@
+"""
+Load protection for LLM calls: an AIMD concurrency limiter and per-model
+circuit breakers.
+
+AdaptiveLimiter
+  Caps concurrent LLM requests at `limit`. Every successful call raises the
+  limit by 1/limit (about +1 per limit's worth of successes); a call that
+  signals overload (429, timeout, 5xx) halves it, at most once per
+  `decrease_interval`. Requests over the limit wait in a bounded FIFO
+  queue; a full queue or a wait longer than `queue_timeout` is rejected at
+  once instead of piling more load on the provider.
+
+CircuitBreaker
+  closed → open after `failure_threshold` consecutive failures; open
+  rejects immediately for `reset_timeout` seconds; then half_open lets a
+  single probe through, which closes the breaker on success or reopens it
+  on failure.
+
+Both raise LLMUnavailable subclasses so callers can answer with a fallback
+instead of sleeping through retries.
+"""
+
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The LLM call was refused locally (limiter or breaker)."""
+
+
+class LimiterRejected(LLMUnavailable):
+    """The concurrency limiter's queue is full or the wait timed out."""
+
+
+class CircuitOpenError(LLMUnavailable):
+    """The model's circuit breaker is open."""
+
+
+class _Outcome:
+    """Result reported by the caller when a limiter slot is released."""
+    __slots__ = ("ok", "overloaded")
+
+    def __init__(self):
+        self.ok = False
+        self.overloaded = False
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded wait queue."""
+
+    def __init__(self, initial_limit: int = 16, min_limit: int = 2, max_limit: int = 64,
+                 backoff: float = 0.5, max_queue: int = 100, queue_timeout: float = 10.0,
+                 decrease_interval: float = 1.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.decrease_interval = decrease_interval
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.decreases = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot; set `.ok` / `.overloaded` on the yielded outcome."""
+        await self._acquire()
+        outcome = _Outcome()
+        try:
+            yield outcome
+        finally:
+            self._release(outcome)
+
+    async def _acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LimiterRejected(f"LLM queue full ({self.max_queue} waiting)")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        # Don't queue past the request's deadline budget
+        timeout = max(0.0, min(self.queue_timeout, remaining(default=self.queue_timeout)))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up: pass it on
+                self._release(_Outcome())
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.TimeoutError):
+                self.rejected += 1
+                raise LimiterRejected(f"LLM queue wait exceeded {timeout:.1f}s") from None
+            raise
+        self.admitted += 1
+
+    def _release(self, outcome: _Outcome):
+        self.in_flight -= 1
+        if outcome.overloaded:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_interval:
+                old = self.limit
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.warning("LLM concurrency limit %.1f → %.1f (provider overloaded)", old, self.limit)
+        elif outcome.ok:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "decreases": self.decreases,
+        }
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.opens = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            logger.info("Circuit %s half-open: sending a probe", self.name)
+            return
+        self.short_circuited += 1
+        raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit %s closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning("Circuit %s opened after %d consecutive failures", self.name, self.failures)
+        self._probing = False
+
+    def record_cancelled(self):
+        """A call ended without a verdict (e.g. a cancelled hedge)."""
+        self._probing = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "short_circuited": self.short_circuited,
+        }
@@ -0,0 +1,257 @@
+"""
+Hedged chat completions over a cascade of models.
+
+The first model in the cascade is asked first. If it has not answered after
+the hedge delay — its observed p95 latency, clamped to [min, max] — the next
+model is asked as well and whichever answers first wins; the other request
+is cancelled. A model that fails outright hands over to the next model
+immediately, so the cascade also acts as a fallback chain.
+
+    llm = HedgedLLM(client, ["google/gemini-2.5-flash", "openai/gpt-4o-mini"])
+    response, model = await llm.create(messages=[...], max_tokens=300)
+
+Every attempt passes the model's circuit breaker and a shared AIMD
+concurrency limiter first (see llm_guard); a model whose breaker is open
+fails immediately, so the cascade moves straight on to the next one.
+
+With a single model there is nothing to hedge to and `create` is a plain
+call. Every call records which model won and, for hedge wins, the latency
+saved — estimated from how long the primary takes when it is that slow.
+Cancelling the loser hides exactly those slow latencies, so a small
+`tail_sample_rate` of losing primaries is left to finish in the background
+(result discarded) to keep measuring the tail.
+"""
+
+from __future__ import annotations
+
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from llm_guard import AdaptiveLimiter, CircuitBreaker, LimiterRejected
+from metrics import LLM_FALLBACKS, LLM_HEDGES, LLM_SECONDS, LLM_TOKENS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Primary latencies needed before the percentile replaces the static delay
+_MIN_SAMPLES = 20
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    return exc.status_code if isinstance(exc, APIStatusError) else None
+
+
+def _is_overload(exc: BaseException) -> bool:
+    """Provider is shedding load or unreachable: 429, 5xx, timeouts, connection errors."""
+    status = _status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (APITimeoutError, APIConnectionError))
+
+
+def _is_failure(exc: BaseException) -> bool:
+    """Counts against the model's breaker (request-specific 4xx errors do not)."""
+    status = _status(exc)
+    return status is None or not 400 <= status < 500 or status in (408, 429)
+
+
+class HedgedLLM:
+    """Chat completions with latency hedging and model fallback.
+
+    - `hedge_after_ms` is the delay used until enough primary latencies
+      are observed; after that the `percentile` of the last `window`
+      latencies is used, clamped to [`min_hedge_ms`, `max_hedge_ms`].
+    - `hedge=False` on `create` keeps the fallback on errors but never
+      hedges on latency (for background calls).
+    """
+
+    def __init__(self, client, models: List[str], hedge_after_ms: float = 2500.0,
+                 percentile: float = 95.0, min_hedge_ms: float = 500.0,
+                 max_hedge_ms: float = 8000.0, window: int = 200,
+                 tail_sample_rate: float = 0.05, limiter: Optional[AdaptiveLimiter] = None,
+                 breaker_failures: int = 5, breaker_reset: float = 30.0):
+        if not models:
+            raise ValueError("HedgedLLM needs at least one model")
+        self.client = client
+        self.models = list(models)
+        self.hedge_after_ms = hedge_after_ms
+        self.percentile = percentile
+        self.min_hedge_ms = min_hedge_ms
+        self.max_hedge_ms = max_hedge_ms
+        self.tail_sample_rate = tail_sample_rate
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breakers = {m: CircuitBreaker(m, breaker_failures, breaker_reset) for m in self.models}
+        # Primary latencies; a cancelled primary counts with its elapsed time
+        self._latencies: Deque[float] = deque(maxlen=window)
+        # Primary latencies of calls that actually finished
+        self._completed: Deque[float] = deque(maxlen=window)
+
+        self.calls = 0
+        self.hedges = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.wins: Dict[str, int] = {m: 0 for m in self.models}
+        self.hedge_wins = 0
+        self.saved_ms = 0.0
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before asking the next model."""
+        if len(self._latencies) < _MIN_SAMPLES:
+            delay_ms = self.hedge_after_ms
+        else:
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            delay_ms = ordered[index]
+        return min(max(delay_ms, self.min_hedge_ms), self.max_hedge_ms) / 1000
+
+    def _slow_primary_ms(self, threshold_ms: float) -> Optional[float]:
+        """Mean primary latency among finished calls slower than `threshold_ms`."""
+        slow = [ms for ms in self._completed if ms > threshold_ms]
+        return sum(slow) / len(slow) if slow else None
+
+    async def _timed(self, model: str, kwargs: Dict):
+        breaker = self.breakers[model]
+        breaker.check()
+        try:
+            with span("llm.request", model=model) as s:
+                async with self.limiter.slot() as outcome:
+                    start = time.perf_counter()
+                    try:
+                        response = await self.client.chat.completions.create(model=model, **kwargs)
+                    except asyncio.CancelledError:
+                        LLM_SECONDS.labels(model, "cancelled").observe(time.perf_counter() - start)
+                        raise
+                    except Exception as exc:
+                        LLM_SECONDS.labels(model, "error").observe(time.perf_counter() - start)
+                        outcome.overloaded = _is_overload(exc)
+                        if _is_failure(exc):
+                            breaker.record_failure()
+                        else:
+                            breaker.record_cancelled()
+                        raise
+                    elapsed = time.perf_counter() - start
+                    LLM_SECONDS.labels(model, "ok").observe(elapsed)
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+                        LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+                        s.set("prompt_tokens", usage.prompt_tokens or 0)
+                        s.set("completion_tokens", usage.completion_tokens or 0)
+                    outcome.ok = True
+                    breaker.record_success()
+                    return response, elapsed * 1000
+        except (asyncio.CancelledError, LimiterRejected):
+            breaker.record_cancelled()
+            raise
+
+    async def create(self, hedge: bool = True, **kwargs) -> Tuple[object, str]:
+        """Run one chat completion; returns (response, model that answered)."""
+        self.calls += 1
+        start = time.perf_counter()
+        pending: Dict[asyncio.Task, str] = {}
+        next_model = 0
+        last_error: Optional[BaseException] = None
+        hedged_at: Optional[float] = None
+
+        def launch():
+            nonlocal next_model
+            model = self.models[next_model]
+            next_model += 1
+            pending[asyncio.create_task(self._timed(model, kwargs))] = model
+
+        launch()
+        try:
+            while pending:
+                can_hedge = hedge and next_model < len(self.models) and hedged_at is None
+                timeout = None
+                if can_hedge:
+                    timeout = max(0.0, self.hedge_delay() - (time.perf_counter() - start))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slow: ask the next model too
+                    hedged_at = (time.perf_counter() - start) * 1000
+                    self.hedges += 1
+                    LLM_HEDGES.inc()
+                    logger.info("LLM hedge: %s slower than %.0f ms, also asking %s",
+                                self.primary, hedged_at, self.models[next_model])
+                    launch()
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        if isinstance(last_error, LimiterRejected):
+                            # The limit is shared by all models: don't cascade
+                            next_model = len(self.models)
+                            continue
+                        logger.warning("LLM model %s failed: %s", model, last_error)
+                        continue
+                    response, latency_ms = task.result()
+                    self._record_win(model, latency_ms, (time.perf_counter() - start) * 1000, hedged_at)
+                    return response, model
+
+                if not pending and next_model < len(self.models):
+                    self.fallbacks += 1
+                    LLM_FALLBACKS.labels("model").inc()
+                    logger.warning("LLM falling back to %s", self.models[next_model])
+                    launch()
+        finally:
+            for task, model in pending.items():
+                if model == self.primary and random.random() < self.tail_sample_rate:
+                    task.add_done_callback(self._sample_tail)
+                    continue
+                task.cancel()
+                if model == self.primary:
+                    self._latencies.append((time.perf_counter() - start) * 1000)
+
+        self.failures += 1
+        raise last_error
+
+    def _sample_tail(self, task: asyncio.Task):
+        """Record the latency of a losing primary that was left to finish."""
+        if task.cancelled() or task.exception() is not None:
+            return
+        _, latency_ms = task.result()
+        self._latencies.append(latency_ms)
+        self._completed.append(latency_ms)
+
+    def _record_win(self, model: str, latency_ms: float, total_ms: float, hedged_at: Optional[float]):
+        self.wins[model] = self.wins.get(model, 0) + 1
+        if model == self.primary:
+            self._latencies.append(latency_ms)
+            self._completed.append(latency_ms)
+            return
+        if hedged_at is None:
+            return
+        self.hedge_wins += 1
+        expected = self._slow_primary_ms(total_ms)
+        saved = max(0.0, expected - total_ms) if expected is not None else 0.0
+        self.saved_ms += saved
+        logger.info("LLM hedge won by %s in %.0f ms (~%.0f ms saved)", model, total_ms, saved)
+
+    def stats(self) -> Dict:
+        return {
+            "models": self.models,
+            "calls": self.calls,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "wins": dict(self.wins),
+            "latency_saved_ms": round(self.saved_ms),
+            "limiter": self.limiter.stats(),
+            "breakers": {m: b.stats() for m, b in self.breakers.items()},
+        }
@@ -0,0 +1,83 @@
+"""
+Debounce bursts of user messages into a single LLM turn.
+
+Chat users often split one thought across quick messages ("hi", "my
+quickbooks", "is frozen"). With a non-zero window, each message for a
+session waits `window_ms`; if another message arrives in the meantime, the
+earlier request steps aside (the webhook replies with no text) and the
+latest request answers the merged text with one LLM call. A burst is never
+held longer than `max_wait_ms` after its first message.
+"""
+
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+
+class _Burst:
+    __slots__ = ("messages", "seq", "started")
+
+    def __init__(self):
+        self.messages: List[str] = []
+        self.seq = 0
+        self.started = time.monotonic()
+
+
+class MessageCoalescer:
+    """Per-session message debouncer. A `window_ms` of 0 disables it."""
+
+    def __init__(self, window_ms: int = 0, max_wait_ms: int = 5000):
+        self.window = window_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self._bursts: Dict[str, _Burst] = {}
+
+        self.bursts_merged = 0
+        self.llm_calls_saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def collect(self, session_id: str, message: str) -> Optional[str]:
+        """Add `message` to the session's burst.
+
+        Returns the merged text if this request should answer the burst, or
+        None if a later message arrived and will answer it instead.
+        """
+        burst = self._bursts.get(session_id)
+        if burst is None:
+            burst = self._bursts[session_id] = _Burst()
+        burst.messages.append(message)
+        burst.seq += 1
+        my_seq = burst.seq
+
+        wait = min(self.window, burst.started + self.max_wait - time.monotonic())
+        # Never debounce past the request's deadline budget
+        await asyncio.sleep(max(0.0, min(wait, remaining(default=wait))))
+
+        if burst.seq != my_seq:
+            self.llm_calls_saved += 1
+            return None
+
+        if self._bursts.get(session_id) is burst:
+            del self._bursts[session_id]
+        if len(burst.messages) > 1:
+            self.bursts_merged += 1
+            logger.info("Coalesced %d messages for session %s", len(burst.messages), session_id)
+        return "\n".join(burst.messages)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": int(self.window * 1000),
+            "pending_sessions": len(self._bursts),
+            "bursts_merged": self.bursts_merged,
+            "llm_calls_saved": self.llm_calls_saved,
+        }
@@ -0,0 +1,233 @@
+"""
+Minimal Prometheus metrics (text exposition format 0.0.4), no dependencies.
+
+    WEBHOOK_SECONDS.observe(0.42)
+    LLM_TOKENS.labels("google/gemini-2.5-flash", "prompt").inc(1830)
+    body = render()          # served by GET /metrics
+
+Recording is a couple of dict/list operations on the event loop thread — no
+locks, no I/O — so it never shows up in request latency; all formatting
+happens at scrape time. Labelled children are created on first use and
+cached. Gauges can be backed by a callable evaluated at scrape time.
+
+Each process keeps its own registry: with UVICORN_WORKERS > 1 a scrape sees
+one worker, so scrape each worker or run one worker per container.
+"""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans cache hits (ms) through slow LLM answers and Zoho timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported (as zero) before the first event
+            self._children[()] = self._new_child()
+        _REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        """Child metric for one combination of label values."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _unlabelled(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self._children.items()]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or a callable read at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def _samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {_format_value(self.fn())}"]
+            except Exception:
+                return []
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self._children.items()]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Per-bucket (non-cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observations in fixed buckets (seconds by default)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = _label_text(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format."""
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Application metrics
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+WEBHOOK_SECONDS = Histogram("chatbot_webhook_seconds", "Webhook handling time")
+WEBHOOK_IN_FLIGHT = Gauge("chatbot_webhook_in_flight", "Webhook requests being handled")
+
+LLM_SECONDS = Histogram("chatbot_llm_request_seconds", "LLM request time per attempt",
+                        ["model", "outcome"])
+LLM_TOKENS = Counter("chatbot_llm_tokens_total", "LLM tokens reported in response.usage",
+                     ["model", "kind"])
+LLM_RETRIES = Counter("chatbot_llm_retries_total", "LLM calls retried after a transient error")
+LLM_FALLBACKS = Counter("chatbot_llm_fallbacks_total",
+                        "LLM calls answered by a later model or a canned reply", ["reason"])
+LLM_HEDGES = Counter("chatbot_llm_hedges_total", "Hedge requests sent to a second model")
+
+ZOHO_SECONDS = Histogram("chatbot_zoho_request_seconds", "Zoho API request time",
+                         ["endpoint", "outcome"])
+
+ESCALATIONS = Counter("chatbot_escalations_total", "Escalation buttons shown", ["source"])
+RESOLUTIONS = Counter("chatbot_resolutions_total", "Conversations closed as resolved", ["source"])
+
+STARTUP_SECONDS = Gauge("chatbot_startup_seconds", "Time spent importing the app and warming up",
+                        ["phase"])
+
+SESSION_ROUTING = Counter("chatbot_session_routing_total",
+                          "Webhooks by cluster routing decision", ["outcome"])
+
+SESSION_EVICTIONS = Counter("chatbot_session_evictions_total", "Sessions removed by the store",
+                            ["reason"])
+
+OUTBOX_DEAD_LETTERS = Counter("chatbot_outbox_dead_letters_total",
+                              "Outbox jobs marked failed after exhausting their attempts", ["kind"])
+
+OUTBOX_WORKER_ERRORS = Counter("chatbot_outbox_worker_errors_total",
+                               "Outbox worker loop iterations that failed (e.g. database locked)")
+
+FAST_PATH = Counter("chatbot_fast_path_total",
+                    "First-turn messages by fast-path intent and outcome", ["intent", "outcome"])
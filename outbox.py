@@ -0,0 +1,302 @@
+"""
+Durable SQLite outbox for Zoho side-effects (chat close, callback creation).
+
+The webhook enqueues a job and replies to the visitor immediately; a pool of
+background workers then performs the Zoho call:
+
+  1. Enqueue   → INSERT into SQLite (WAL), deduplicated per (kind, key)
+  2. Process   → up to `workers` jobs run concurrently
+  3. Retry     → exponential backoff until `max_attempts`, then "failed"
+                 (a dead letter: counted in metrics and passed to the
+                 kind's `on_dead_letter` listeners for follow-up)
+  4. Restart   → pending jobs are picked up again on the next start; jobs
+                 that were mid-flight are retried once their lease expires
+
+A worker survives database errors ("database is locked" when several
+processes share the file): the failure is logged and counted, and the
+worker backs off before claiming again.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import OUTBOX_DEAD_LETTERS, OUTBOX_WORKER_ERRORS
+from tracing import trace
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict], Awaitable[Dict]]
+DeadLetterListener = Callable[[Dict, Dict], None]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT    NOT NULL,
+    dedup_key   TEXT    NOT NULL,
+    payload     TEXT    NOT NULL,
+    status      TEXT    NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL    NOT NULL,
+    last_error  TEXT,
+    created_at  REAL    NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS outbox_dedup
+    ON outbox (kind, dedup_key) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_run_at);
+"""
+
+# Backoff of a worker after a failed loop iteration: 0.5s doubling up to 30s
+_WORKER_ERROR_DELAY = 0.5
+_WORKER_ERROR_MAX_DELAY = 30.0
+
+# HTTP statuses that will not succeed on retry (other 4xx are permanent too)
+_RETRYABLE_4XX = {"401", "408", "429"}
+
+
+def _is_permanent(result: Dict) -> bool:
+    error = str(result.get("error", ""))
+    return error.isdigit() and error.startswith("4") and error not in _RETRYABLE_4XX
+
+
+class Outbox:
+    """SQLite-backed job queue with a bounded async worker pool.
+
+    - `workers` caps how many side-effects run at once.
+    - Failed jobs retry after `base_delay * 2**attempts` seconds (capped at
+      `max_delay`) and are marked "failed" after `max_attempts`.
+    - Only one pending job per (kind, dedup_key) exists at a time.
+    - Several processes may share one database; a job left "running" for
+      `lease_seconds` (its worker died) is retried.
+    """
+
+    def __init__(self, path: str, workers: int = 4, max_attempts: int = 8,
+                 base_delay: float = 2.0, max_delay: float = 300.0,
+                 lease_seconds: float = 120.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._handlers: Dict[str, Handler] = {}
+        self._dead_letter_listeners: Dict[str, List[DeadLetterListener]] = {}
+        self.dead_letters = 0
+        self.worker_errors = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._active = 0
+
+    @property
+    def running(self) -> bool:
+        return self._db is not None
+
+    def register(self, kind: str, handler: Handler):
+        """Register the coroutine that performs jobs of `kind`."""
+        self._handlers[kind] = handler
+
+    def on_dead_letter(self, kind: str, listener: DeadLetterListener):
+        """Call `listener(payload, last_result)` when a `kind` job fails for good."""
+        self._dead_letter_listeners.setdefault(kind, []).append(listener)
+
+    # ── Database helpers (run in a thread; one shared connection) ─
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._db_lock:
+            return self._db.execute(sql, params)
+
+    def _claim(self) -> Optional[tuple]:
+        """Atomically take the next due job (safe across worker processes).
+
+        A claimed job's `next_run_at` is set to the claim time; jobs still
+        "running" `lease_seconds` later belonged to a worker that died and
+        are handed out again.
+        """
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                recovered = self._db.execute(
+                    "UPDATE outbox SET status = 'pending' WHERE status = 'running' AND next_run_at < ?",
+                    (now - self.lease_seconds,),
+                ).rowcount
+                row = self._db.execute(
+                    "SELECT id, kind, payload, attempts FROM outbox "
+                    "WHERE status = 'pending' AND next_run_at <= ? ORDER BY next_run_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE outbox SET status = 'running', next_run_at = ? WHERE id = ?",
+                        (now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if recovered:
+            logger.info("Outbox recovered %d interrupted jobs", recovered)
+        return row
+
+    # ── Public API ────────────────────────────────────────────────
+
+    async def start(self):
+        """Open the database and start the worker pool."""
+        await asyncio.to_thread(self._open)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("Outbox started: path=%s, workers=%d, pending=%d",
+                    self.path, self.workers, (await self.stats()).get("pending", 0))
+
+    async def enqueue(self, kind: str, dedup_key: str, payload: Dict) -> bool:
+        """Persist a job. Returns False if an identical job is already queued."""
+        if kind not in self._handlers:
+            raise ValueError(f"No outbox handler registered for '{kind}'")
+        now = time.time()
+        cursor = await asyncio.to_thread(
+            self._execute,
+            "INSERT OR IGNORE INTO outbox (kind, dedup_key, payload, next_run_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (kind, dedup_key, json.dumps(payload), now, now),
+        )
+        if cursor.rowcount == 0:
+            logger.info("Outbox job deduplicated: %s/%s", kind, dedup_key)
+            return False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait (up to `timeout`) for due jobs to finish, then stop workers.
+
+        Jobs scheduled for a later retry stay in the database for next start.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            due = await asyncio.to_thread(
+                lambda: self._execute(
+                    "SELECT COUNT(*) FROM outbox WHERE status = 'pending' AND next_run_at <= ?",
+                    (time.time(),),
+                ).fetchone()[0]
+            )
+            if not due and not self._active:
+                break
+            await asyncio.sleep(0.1)
+        else:
+            logger.warning("Outbox drain timed out after %.1fs", timeout)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            await asyncio.to_thread(self._db.close)
+            self._db = None
+
+    async def stats(self) -> Dict:
+        """Job counts per status plus the number currently in progress."""
+        rows = await asyncio.to_thread(
+            lambda: self._execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        )
+        counts = {status: n for status, n in rows}
+        counts["active"] = self._active
+        counts["dead_letters"] = self.dead_letters
+        counts["worker_errors"] = self.worker_errors
+        return counts
+
+    # ── Workers ───────────────────────────────────────────────────
+
+    async def _worker(self, index: int):
+        failures = 0
+        while True:
+            try:
+                await self._step()
+                failures = 0
+            except Exception as exc:
+                failures += 1
+                self.worker_errors += 1
+                OUTBOX_WORKER_ERRORS.inc()
+                delay = min(_WORKER_ERROR_DELAY * 2 ** (failures - 1), _WORKER_ERROR_MAX_DELAY)
+                logger.error("Outbox worker %d failed (%d in a row), retrying in %.1fs: %s",
+                             index, failures, delay, exc, exc_info=True)
+                await asyncio.sleep(delay)
+
+    async def _step(self):
+        """Claim and run one job, or wait briefly for one to be enqueued."""
+        job = await asyncio.to_thread(self._claim)
+        if job is None:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        job_id, kind, payload, attempts = job
+        self._active += 1
+        try:
+            await self._run(job_id, kind, json.loads(payload), attempts)
+        finally:
+            self._active -= 1
+
+    async def _run(self, job_id: int, kind: str, payload: Dict, attempts: int):
+        attempts += 1
+        with trace(f"outbox.{kind}", job_id=job_id, attempt=attempts) as s:
+            try:
+                result = await self._handlers[kind](payload)
+            except Exception as exc:
+                logger.error("Outbox %s job %d raised: %s", kind, job_id, exc)
+                result = {"success": False, "error": "exception", "message": str(exc)}
+            s.set("success", bool(result.get("success")))
+
+        if result.get("success"):
+            await asyncio.to_thread(self._execute, "DELETE FROM outbox WHERE id = ?", (job_id,))
+            logger.info("Outbox %s job %d done (attempt %d)", kind, job_id, attempts)
+            return
+
+        error = json.dumps(result)[:500]
+        if attempts >= self.max_attempts or _is_permanent(result):
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, job_id),
+            )
+            logger.error("Outbox %s job %d failed permanently after %d attempts: %s",
+                         kind, job_id, attempts, error)
+            self.dead_letters += 1
+            OUTBOX_DEAD_LETTERS.labels(kind).inc()
+            for listener in self._dead_letter_listeners.get(kind, ()):
+                try:
+                    listener(payload, result)
+                except Exception as exc:
+                    logger.error("Outbox dead-letter listener for %s failed: %s", kind, exc)
+            return
+
+        delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_run_at = ? "
+            "WHERE id = ?",
+            (attempts, error, time.time() + delay, job_id),
+        )
+        logger.warning("Outbox %s job %d attempt %d failed — retrying in %.0fs",
+                       kind, job_id, attempts, delay)
@@ -0,0 +1,157 @@
+"""
+Compiled phrase matching for escalation and resolution detection.
+
+Each phrase list is compiled once into a single regex shaped like a trie
+("c(?:all me|ustomer service)"), so a message is scanned in one pass instead
+of one `in` check per phrase, and the longest phrase at a position wins.
+On top of plain matching:
+
+  - Prefilter       → a message without the longest word of any phrase is
+                       rejected by plain substring checks, before the regex.
+  - Word boundaries  → "ya" does not fire inside "maya".
+  - Anchored phrases → short affirmations ("yes", "no problem", "fixed")
+                       only count at the start of the message, optionally
+                       after filler like "ok" or "thanks".
+  - Exclusions       → longer phrases that swallow a match ("task manager"
+                       is not a request for a "manager").
+  - Negation         → with `negatable=True`, a match preceded by a negation
+                       ("not working now") is ignored; anchored phrases are
+                       also rejected if a negation follows ("yes but still
+                       not working").
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, Optional
+
+# Words that flip the meaning of a following phrase
+_NEGATIONS = frozenset({
+    "not", "no", "never", "nothing", "nope", "cannot", "cant", "can't", "dont", "don't",
+    "doesnt", "doesn't", "didnt", "didn't", "isnt", "isn't", "wasnt", "wasn't",
+    "wont", "won't", "aint", "ain't", "neither", "nor", "without",
+})
+
+# Words allowed before an anchored phrase ("ok yes", "great, fixed")
+_FILLERS = frozenset({
+    "ok", "okay", "oh", "ah", "great", "thanks", "thank", "you", "cool", "hi", "hey", "and", "so",
+})
+
+# How many words before a match (within its clause) are checked for a negation
+_NEGATION_WINDOW = 3
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_SPACES_RE = re.compile(r"\s+")
+_PUNCTUATION = ".,;:!?\"()[]-"
+_CLAUSE_END = ",.;:!?"
+
+
+def _normalize(text: str) -> str:
+    text = text.lower()
+    if "\u2019" in text or "\u2018" in text:
+        text = text.replace("\u2019", "'").replace("\u2018", "'")
+    return text
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch in "_'"
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Regex for `phrases` as a character trie (shared prefixes factored out).
+
+    Starting with a plain character class lets `re` skip ahead to candidate
+    positions in C, and greedy optional branches prefer the longest phrase.
+    """
+    root: Dict = {}
+    for phrase in phrases:
+        node = root
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(root)
+
+
+class PhraseMatcher:
+    """Single-pass matcher over a fixed phrase list.
+
+    - `anchored` phrases must open the message (after optional fillers).
+    - `exclude` phrases are matched but never reported.
+    - `negatable` enables the negation rules described above.
+    """
+
+    def __init__(self, phrases: Iterable[str], anchored: Iterable[str] = (),
+                 exclude: Iterable[str] = (), negatable: bool = False):
+        self.phrases = [_normalize(p) for p in phrases]
+        self.anchored = frozenset(_normalize(p) for p in anchored)
+        self.exclude = frozenset(_normalize(p) for p in exclude)
+        self.negatable = negatable
+
+        reportable = {" ".join(p.split()) for p in self.phrases} | self.anchored
+        alternatives = reportable | self.exclude
+        # Prefilter: every reportable phrase contains its longest word, so a
+        # message containing none of these words cannot match. Plain `in`
+        # checks run in C and rule out most messages before the regex scan.
+        words = {max(p.split(), key=len) for p in reportable}
+        self._anchor_words = tuple(sorted(
+            w for w in words if not any(o != w and o in w for o in words)
+        ))
+        # The left word boundary is checked in Python: a leading lookbehind
+        # would stop `re` from skipping quickly to candidate positions.
+        self._regex = re.compile(rf"{_trie_pattern(alternatives)}(?![\w'])")
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first phrase that fires in `text`, or None."""
+        text = _normalize(text)
+        for word in self._anchor_words:
+            if word in text:
+                break
+        else:
+            return None
+        pos = 0
+        while True:
+            match = self._regex.search(text, pos)
+            if match is None:
+                return None
+            start = match.start()
+            if start and _is_word_char(text[start - 1]):
+                pos = start + 1
+                continue
+            pos = match.end()
+            phrase = _SPACES_RE.sub(" ", match.group())
+            if phrase in self.exclude:
+                continue
+            if phrase in self.anchored:
+                before = _WORD_RE.findall(text[:start])
+                if any(w not in _FILLERS for w in before):
+                    continue
+                if self.negatable and any(w in _NEGATIONS for w in _WORD_RE.findall(text[pos:])):
+                    continue
+            if self.negatable:
+                if self._negated_before(text, start):
+                    continue
+            return phrase
+
+    @staticmethod
+    def _negated_before(text: str, start: int) -> bool:
+        """True if a negation sits in the same clause, a few words before `start`."""
+        for word in reversed(text[:start].rsplit(None, _NEGATION_WINDOW)[-_NEGATION_WINDOW:]):
+            if word[-1] in _CLAUSE_END:
+                return False
+            if word.strip(_PUNCTUATION) in _NEGATIONS:
+                return True
+        return False
+
+    def __contains__(self, text: str) -> bool:
+        return self.search(text) is not None
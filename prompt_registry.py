@@ -0,0 +1,193 @@
+"""
+Hot-reloadable, versioned expert prompt.
+
+The prompt file under config/prompts is polled every `poll_interval`
+seconds. When its content changes, a new `PromptVersion` is built on a
+worker thread — content hash, token count, section offsets and the
+retrieval index — and then swapped in with a single reference assignment,
+so there is no restart and no half-updated state.
+
+Request handlers take `registry.current` once and use that object for the
+whole turn: a request that started before a reload finishes on the version
+it started with, and its cache writes are tagged with that version's hash
+(see response_cache). Change listeners (e.g. the response cache) are called
+after each swap.
+
+An empty or unreadable file never replaces a working version; a file that is
+missing at startup falls back to a built-in prompt until it appears.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from context_window import count_tokens
+from prompt_retrieval import PromptRetriever, section_offsets
+from response_cache import prompt_version
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PromptVersion:
+    """One loaded prompt and everything precomputed from it."""
+
+    text: str
+    version: str                            # content hash, used as cache key
+    source: str                             # file path, or "fallback"
+    loaded_at: float                        # wall-clock time of the load
+    tokens: int
+    sections: Tuple[Tuple[str, int], ...]   # (title, character offset)
+    retriever: PromptRetriever
+
+    def summary(self) -> Dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": round(self.loaded_at),
+            "chars": len(self.text),
+            "tokens": self.tokens,
+            "sections": dict(self.sections),
+            "procedures": len(self.retriever.procedures),
+        }
+
+
+class PromptRegistry:
+    """Holds the current prompt version and reloads it when the file changes.
+
+    - `retriever_options` are passed to `PromptRetriever` (top_k, max_sessions).
+    - `poll_interval` <= 0 disables the watcher; `check()` still works.
+    - The last `history` versions are kept (metadata only) for `stats()`.
+    """
+
+    def __init__(self, path: str, fallback: str, retriever_options: Optional[Dict] = None,
+                 poll_interval: float = 5.0, history: int = 10):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retriever_options = retriever_options or {}
+        self._listeners: List[Callable[[PromptVersion], None]] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self.history: deque = deque(maxlen=history)
+
+        self.reloads = 0
+        self.rejected = 0
+
+        self._stat = self._file_stat()
+        text = self._read()
+        if text is None or not text.strip():
+            logger.error("Prompt file not found or empty at %s — using fallback prompt", path)
+            self.current = self._build(fallback, "fallback")
+        else:
+            self.current = self._build(text, path)
+        logger.info("Loaded expert prompt: %d characters from %s (version %s)",
+                    len(self.current.text), self.current.source, self.current.version)
+
+    # ── Loading ───────────────────────────────────────────────────
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> Optional[str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError) as exc:
+            logger.warning("Could not read prompt file %s: %s", self.path, exc)
+            return None
+
+    def _build(self, text: str, source: str, previous: Optional[PromptVersion] = None) -> PromptVersion:
+        if previous is not None:
+            retriever = previous.retriever.rebuild(text)
+        else:
+            retriever = PromptRetriever(text, **self.retriever_options)
+        return PromptVersion(
+            text=text,
+            version=prompt_version(text),
+            source=source,
+            loaded_at=time.time(),
+            tokens=count_tokens(text),
+            sections=tuple(section_offsets(text)),
+            retriever=retriever,
+        )
+
+    async def check(self) -> bool:
+        """Reload the prompt if the file changed. Returns True if a new version was swapped in."""
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return False
+        text = await asyncio.to_thread(self._read)
+        if self._file_stat() != stat:
+            return False  # Still being written — look again on the next poll
+        self._stat = stat
+        if text is None or not text.strip():
+            self.rejected += 1
+            logger.error("Prompt file %s is empty or unreadable — keeping version %s",
+                         self.path, self.current.version)
+            return False
+        if prompt_version(text) == self.current.version:
+            return False
+        self._swap(await asyncio.to_thread(self._build, text, self.path, self.current))
+        return True
+
+    def _swap(self, new: PromptVersion):
+        old = self.current
+        self.current = new
+        self.history.appendleft(old.summary())
+        self.reloads += 1
+        logger.info("Expert prompt reloaded: version %s → %s (%d chars, ~%d tokens)",
+                    old.version, new.version, len(new.text), new.tokens)
+        for listener in self._listeners:
+            try:
+                listener(new)
+            except Exception as exc:
+                logger.error("Prompt change listener failed: %s", exc)
+
+    def on_change(self, listener: Callable[[PromptVersion], None]):
+        """Call `listener(new_version)` after every reload."""
+        self._listeners.append(listener)
+
+    # ── Watcher ───────────────────────────────────────────────────
+
+    def start(self):
+        if self.poll_interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_loop())
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.check()
+            except Exception as exc:
+                self.rejected += 1
+                logger.error("Prompt reload failed, keeping version %s: %s", self.current.version, exc)
+
+    async def aclose(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    # ── Sessions / stats ──────────────────────────────────────────
+
+    def forget(self, session_id: str):
+        """Drop a session's sticky procedure (shared by every version)."""
+        self.current.retriever.forget(session_id)
+
+    def stats(self) -> Dict:
+        return {
+            "current": self.current.summary(),
+            "watching": self._watcher is not None,
+            "reloads": self.reloads,
+            "rejected": self.rejected,
+            "previous": list(self.history),
+        }
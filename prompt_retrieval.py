@@ -0,0 +1,340 @@
+"""
+Local retrieval over the expert system prompt.
+
+The expert prompt is ~29 KB, but any single turn only needs the core rules
+plus the one or two PROCEDURE blocks that match the user's issue. At startup
+the prompt is split into:
+
+  1. Core      → everything outside the PROCEDURES section (rules, style,
+                 URLs, shared sub-routines, escalation rules, unknown issues)
+  2. Procedures → one entry per "PROCEDURE:" block, indexed with BM25
+
+Per turn, the recent user messages are scored against the index and the
+system prompt is rebuilt from the core plus the top-k procedures. Each
+session keeps a "sticky" procedure so short follow-ups ("ok", "done",
+"still not working") stay on the procedure that is being walked through.
+Procedures that a selected one routes to ("Go to PASSWORD RESET") are sent
+along with it, up to a token cap, so the next hop of a script is present.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SECTION_RULE = re.compile(r"^={8,}\s*$")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# "Go to PASSWORD RESET", "Go to PASSWORD RESET or LOGIN ERROR"
+_LINK_TITLE = r"[A-Z][A-Z0-9 /&'()-]*[A-Z0-9)]"
+_LINK_RE = re.compile(rf"\bGo to ({_LINK_TITLE})(?: or ({_LINK_TITLE}))?")
+
+# Words that carry no signal for picking a procedure
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have i if in is it its
+me my no not of on or our so that the then this to was we what when with you
+your yes ok okay please step user says ask escalate go let know see there
+done sure thanks thank hi hello hey just now will try tried still same got
+""".split())
+
+# BM25 parameters and per-field weights (title > triggers > body)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_TITLE_WEIGHT = 3
+_TRIGGER_WEIGHT = 2
+
+# How much older user turns count toward the query (current turn = 1.0)
+_HISTORY_DECAY = (1.0, 0.5, 0.25)
+
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords dropped and a naive plural strip."""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class Procedure:
+    """A single PROCEDURE block from the expert prompt."""
+
+    title: str
+    text: str
+    terms: Counter = field(default_factory=Counter)
+    length: int = 0
+    links: List[str] = field(default_factory=list)
+
+
+def split_expert_prompt(prompt: str) -> Tuple[str, str, List[Procedure]]:
+    """Split the expert prompt into (core_head, core_tail, procedures).
+
+    `core_head` is everything before the PROCEDURES banner, `core_tail`
+    everything after the last procedure (escalation rules, unknown issues).
+    Returns ("", "", []) if the prompt has no PROCEDURES section, in which
+    case callers should send the prompt unchanged.
+    """
+    lines = prompt.splitlines()
+
+    # Locate the "=====\nPROCEDURES\n=====" banner and the banner that follows it
+    start = end = None
+    for i in range(1, len(lines) - 1):
+        if not (_SECTION_RULE.match(lines[i - 1]) and _SECTION_RULE.match(lines[i + 1])):
+            continue
+        if start is None and lines[i].strip() == "PROCEDURES":
+            start = i - 1
+        elif start is not None and i - 1 > start + 2:
+            end = i - 1
+            break
+    if start is None:
+        return "", "", []
+    if end is None:
+        end = len(lines)
+
+    core_head = "\n".join(lines[:start]).rstrip()
+    core_tail = "\n".join(lines[end:]).strip()
+
+    procedures: List[Procedure] = []
+    current: List[str] = []
+    for line in lines[start + 3:end]:
+        if line.startswith("PROCEDURE:") and current:
+            procedures.append(_make_procedure(current))
+            current = []
+        if line.startswith("PROCEDURE:") or current:
+            current.append(line)
+    if current:
+        procedures.append(_make_procedure(current))
+
+    return core_head, core_tail, procedures
+
+
+def section_offsets(prompt: str) -> List[Tuple[str, int]]:
+    """(title, character offset) of every "=====\nTITLE\n=====" banner."""
+    lines = prompt.splitlines(keepends=True)
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    return [
+        (lines[i].strip(), starts[i - 1])
+        for i in range(1, len(lines) - 1)
+        if lines[i].strip() and _SECTION_RULE.match(lines[i - 1]) and _SECTION_RULE.match(lines[i + 1])
+    ]
+
+
+def _make_procedure(lines: List[str]) -> Procedure:
+    text = "\n".join(lines).strip()
+    title = lines[0][len("PROCEDURE:"):].strip()
+    triggers = next((l for l in lines[1:4] if l.startswith("Triggers:")), "")
+
+    terms: Counter = Counter()
+    for tok in _tokenize(title):
+        terms[tok] += _TITLE_WEIGHT
+    for tok in _tokenize(triggers):
+        terms[tok] += _TRIGGER_WEIGHT
+    terms.update(_tokenize(text))
+    return Procedure(title=title, text=text, terms=terms, length=sum(terms.values()))
+
+
+class PromptRetriever:
+    """Builds a per-turn system prompt from the core + top-k procedures.
+
+    - `top_k` procedures are selected by BM25 over the recent user turns.
+    - `min_score` filters out weak matches; if nothing clears it and the
+      session has no sticky procedure, the full prompt is sent unchanged.
+    - Sticky procedures are kept per session (LRU-capped at `max_sessions`);
+      `rebuild()` carries them over to the index of a new prompt version.
+    """
+
+    def __init__(self, prompt: str, top_k: int = 3, min_score: float = 1.5,
+                 max_sessions: int = 10000, sticky: Optional[OrderedDict] = None,
+                 max_link_tokens: int = 2000):
+        self.full_prompt = prompt
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_sessions = max_sessions
+        self.max_link_tokens = max_link_tokens
+        self._sticky: OrderedDict[str, str] = sticky if sticky is not None else OrderedDict()
+
+        self._core_head, self._core_tail, self.procedures = split_expert_prompt(prompt)
+        self._by_title: Dict[str, Procedure] = {p.title: p for p in self.procedures}
+        for proc in self.procedures:
+            proc.links = self._resolve_links(proc)
+
+        # Document frequencies for BM25
+        self._df: Counter = Counter()
+        for proc in self.procedures:
+            self._df.update(proc.terms.keys())
+        n = len(self.procedures)
+        self._avg_len = (sum(p.length for p in self.procedures) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in self._df.items()
+        }
+
+        logger.info(
+            "Prompt retrieval index built: %d procedures, core=%d chars, full=%d chars",
+            len(self.procedures), len(self._core_head) + len(self._core_tail), len(prompt),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.procedures)
+
+    def rebuild(self, prompt: str) -> "PromptRetriever":
+        """Index a new prompt with the same settings and shared sticky state.
+
+        Sessions keep their sticky procedure across a prompt reload as long
+        as a procedure with that title still exists.
+        """
+        return PromptRetriever(prompt, self.top_k, self.min_score, self.max_sessions,
+                               sticky=self._sticky, max_link_tokens=self.max_link_tokens)
+
+    def _resolve_links(self, proc: Procedure) -> List[str]:
+        """Titles of the procedures `proc` routes to, in order of mention.
+
+        References may shorten a title ("PASSWORD RESET" for "PASSWORD
+        RESET (SelfCare)"); one that matches no title, or several, is skipped.
+        """
+        links: List[str] = []
+        for match in _LINK_RE.finditer(proc.text):
+            for ref in filter(None, match.groups()):
+                if ref in self._by_title:
+                    title = ref
+                else:
+                    found = [t for t in self._by_title if t.startswith(ref + " ")]
+                    if len(found) != 1:
+                        logger.debug("Procedure %r links to unknown procedure %r", proc.title, ref)
+                        continue
+                    title = found[0]
+                if title != proc.title and title not in links:
+                    links.append(title)
+        return links
+
+    # ── Scoring ───────────────────────────────────────────────────
+
+    def score(self, text: str) -> List[Tuple[float, Procedure]]:
+        """BM25 score of every procedure against `text`, best first."""
+        return self._score_terms(Counter(_tokenize(text)))
+
+    def _score_terms(self, query: Counter) -> List[Tuple[float, Procedure]]:
+        scored = []
+        for proc in self.procedures:
+            norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * proc.length / self._avg_len)
+            s = 0.0
+            for term, q_weight in query.items():
+                tf = proc.terms.get(term)
+                if not tf:
+                    continue
+                s += q_weight * self._idf[term] * tf * (_BM25_K1 + 1) / (tf + norm)
+            if s > 0:
+                scored.append((s, proc))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    @staticmethod
+    def _query_from_history(history: List[Dict]) -> Counter:
+        """Weighted bag of words over the last few user messages."""
+        query: Counter = Counter()
+        user_msgs = [m["content"] for m in reversed(history) if m.get("role") == "user"]
+        for weight, content in zip(_HISTORY_DECAY, user_msgs):
+            for tok in _tokenize(content):
+                query[tok] += weight
+        return query
+
+    # ── Selection ─────────────────────────────────────────────────
+
+    def select(self, history: List[Dict], session_id: Optional[str] = None) -> List[Procedure]:
+        """Pick the procedures for this turn (sticky first, then by score)."""
+        sticky = self._sticky.get(session_id) if session_id else None
+
+        # A strong match on the latest message alone means the user changed topic
+        latest = next((m["content"] for m in reversed(history) if m.get("role") == "user"), "")
+        latest_ranked = self.score(latest)
+        if latest_ranked and latest_ranked[0][0] >= self.min_score:
+            sticky = latest_ranked[0][1].title
+
+        ranked = [
+            proc for s, proc in self._score_terms(self._query_from_history(history))
+            if s >= self.min_score
+        ]
+
+        selected: List[Procedure] = []
+        if sticky and sticky in self._by_title:
+            selected.append(self._by_title[sticky])
+        for proc in ranked:
+            if len(selected) >= self.top_k:
+                break
+            if proc not in selected:
+                selected.append(proc)
+
+        if session_id and selected:
+            self.pin(session_id, selected[0].title)
+        return selected + self._linked(selected)
+
+    def _linked(self, selected: List[Procedure]) -> List[Procedure]:
+        """Procedures the selected ones route to, within `max_link_tokens`."""
+        linked: List[Procedure] = []
+        budget = self.max_link_tokens
+        for proc in selected:
+            for title in proc.links:
+                target = self._by_title[title]
+                if target in selected or target in linked:
+                    continue
+                cost = estimate_tokens(target.text)
+                if cost > budget:
+                    continue
+                linked.append(target)
+                budget -= cost
+        return linked
+
+    def procedure(self, title: str) -> Optional[Procedure]:
+        return self._by_title.get(title)
+
+    def pin(self, session_id: str, title: str):
+        """Make `title` the session's sticky procedure (e.g. after a canned answer)."""
+        self._sticky[session_id] = title
+        self._sticky.move_to_end(session_id)
+        while len(self._sticky) > self.max_sessions:
+            self._sticky.popitem(last=False)
+
+    def build_system_prompt(self, history: List[Dict], session_id: Optional[str] = None) -> str:
+        """Return the system prompt for this turn.
+
+        Falls back to the full prompt when the index is empty or nothing
+        relevant was found, so an unmatched issue still sees every procedure.
+        """
+        if not self.enabled:
+            return self.full_prompt
+        selected = self.select(history, session_id)
+        if not selected:
+            return self.full_prompt
+
+        logger.info("Prompt procedures selected: %s", [p.title for p in selected])
+        banner = "=" * 64
+        parts = [
+            self._core_head,
+            f"{banner}\nPROCEDURES (most relevant to this conversation)\n{banner}",
+            "\n\n".join(p.text for p in selected),
+        ]
+        if self._core_tail:
+            parts.append(self._core_tail)
+        return "\n\n".join(parts)
+
+    def forget(self, session_id: str):
+        """Drop the sticky procedure for a session (on reset/close)."""
+        self._sticky.pop(session_id, None)
@@ -0,0 +1,304 @@
+"""
+Response cache for first-turn (low-context) questions.
+
+Many sessions open with the same few questions ("forgot password", "QB
+frozen", "how do I find my server name"). For those turns the LLM output
+depends only on the user message and the expert prompt, so it can be reused:
+
+  1. Exact match  → key = normalized message + prompt version hash
+  2. Near match   → MinHash over character shingles, LSH-banded, verified
+                    against a Jaccard similarity threshold and a meaning
+                    guard: both messages must carry the same negations
+                    (with the word each one applies to) and the same
+                    numbers, so "can't login" never reuses the answer to
+                    "can login" and error 6129 never gets the one for 6123
+
+An answer that echoes words of its message which the prompt does not
+contain (a name, a company) is personal to that message: it is only reused
+for an exact match, never for a near-duplicate ("hi this is jonathon" must
+not be greeted as Jonathan).
+
+Entries expire after `ttl_seconds` and are evicted LRU-first once either
+`max_entries` or `max_bytes` is exceeded. The whole cache is dropped when
+the prompt version changes.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import zlib
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_NORMALIZE_RE = re.compile(r"[^a-z0-9 ]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+_APOSTROPHE_RE = re.compile(r"['\u2018\u2019]")
+_WORD_RE = re.compile(r"[a-z]+|[0-9]+")
+
+# Words that flip the meaning of what follows (apostrophes removed: "can't" → "cant")
+_NEGATIONS = frozenset({
+    "not", "no", "never", "nothing", "none", "nobody", "nor", "neither", "without", "nope",
+    "cannot", "cant", "dont", "doesnt", "didnt", "isnt", "wasnt", "arent", "werent",
+    "wont", "wouldnt", "couldnt", "shouldnt", "havent", "hasnt", "hadnt", "aint",
+})
+
+# MinHash configuration: 32 permutations in 8 bands of 4 rows
+_NUM_PERM = 32
+_BANDS = 8
+_ROWS = _NUM_PERM // _BANDS
+_SHINGLE = 3
+_MERSENNE = (1 << 61) - 1
+_PERMS = [
+    (
+        zlib.crc32(f"a{i}".encode()) * 2654435761 % _MERSENNE | 1,
+        zlib.crc32(f"b{i}".encode()) * 40503 % _MERSENNE,
+    )
+    for i in range(_NUM_PERM)
+]
+
+# Near-duplicate candidates verified per lookup (most band collisions first)
+_MAX_CANDIDATES = 16
+
+# Rough per-entry overhead (dict slots, tuples, signature list) in bytes
+_ENTRY_OVERHEAD = 600
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace."""
+    text = _NORMALIZE_RE.sub(" ", text.lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def prompt_version(prompt: str) -> str:
+    """Short content hash used to key cache entries to a prompt version."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def meaning_guard(text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """(negation + following word, digit runs) of a message, in order.
+
+    Shingle similarity cannot tell "is not working" from "is working" or
+    error 6129 from 6123; near-duplicates must agree on this exactly.
+    """
+    words = _WORD_RE.findall(_APOSTROPHE_RE.sub("", text.lower()))
+    negations = tuple(
+        f"{word} {words[i + 1] if i + 1 < len(words) else ''}".rstrip()
+        for i, word in enumerate(words) if word in _NEGATIONS
+    )
+    return negations, tuple(word for word in words if word.isdigit())
+
+
+def _words(text: str) -> Set[str]:
+    return {w for w in _WORD_RE.findall(_APOSTROPHE_RE.sub("", text.lower())) if not w.isdigit()}
+
+
+def _minhash(text: str) -> Tuple[Set[int], List[int]]:
+    padded = f" {text} "
+    shingles = {
+        zlib.crc32(padded[i:i + _SHINGLE].encode())
+        for i in range(max(1, len(padded) - _SHINGLE + 1))
+    }
+    signature = [min((a * h + b) % _MERSENNE for h in shingles) for a, b in _PERMS]
+    return shingles, signature
+
+
+class _Entry:
+    __slots__ = ("key", "response", "shingles", "signature", "guard", "exact_only", "expires_at", "size")
+
+    def __init__(self, key: str, response: str, shingles: Set[int],
+                 signature: List[int], guard: Tuple, exact_only: bool, expires_at: float):
+        self.key = key
+        self.response = response
+        self.shingles = shingles
+        self.guard = guard
+        self.signature = signature
+        self.exact_only = exact_only
+        self.expires_at = expires_at
+        self.size = _ENTRY_OVERHEAD + len(key) + len(response) * 2 + len(shingles) * 32
+
+
+class ResponseCache:
+    """TTL + LRU response cache with exact and near-duplicate lookup.
+
+    - Entries live for `ttl_seconds`.
+    - Caps at `max_entries` entries and roughly `max_bytes` of memory.
+    - Near-duplicates must reach `similarity` (Jaccard over shingles) and
+      have the same `meaning_guard()`; entries whose answer echoes words
+      missing from the prompt text (see `set_prompt_version`) are exact-only.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 1000,
+                 max_bytes: int = 5 * 1024 * 1024, similarity: float = 0.8):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.version = ""
+        self._vocabulary: frozenset = frozenset()
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bands: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.near_hits = 0
+        self.guard_rejects = 0
+        self.exact_only = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ── Versioning ────────────────────────────────────────────────
+
+    def set_prompt_version(self, version: str, prompt_text: str = ""):
+        """Bind the cache to a prompt version, clearing it if it changed.
+
+        `prompt_text` supplies the words an answer may repeat from its
+        message and still be served to near-duplicates.
+        """
+        self._vocabulary = frozenset(_words(prompt_text))
+        if version != self.version:
+            if self._entries:
+                logger.info("Prompt version changed (%s → %s) — clearing %d cached responses",
+                            self.version, version, len(self._entries))
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        self._entries.clear()
+        self._bands.clear()
+        self._bytes = 0
+
+    # ── Lookup / store ────────────────────────────────────────────
+
+    def _key(self, normalized: str) -> str:
+        return f"{self.version}:{normalized}"
+
+    def get(self, message: str) -> Optional[str]:
+        """Return a cached response for `message`, or None."""
+        normalized = normalize_message(message)
+        if not normalized:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+
+        entry = self._entries.get(self._key(normalized))
+        if entry is not None and entry.expires_at > now:
+            self._entries.move_to_end(entry.key)
+            self.hits += 1
+            return entry.response
+
+        shingles, signature = _minhash(normalized)
+        guard = meaning_guard(message)
+        best, best_sim = None, 0.0
+        for candidate_key in self._candidates(signature):
+            candidate = self._entries.get(candidate_key)
+            if candidate is None or candidate.expires_at <= now:
+                continue
+            if candidate.guard != guard:
+                self.guard_rejects += 1
+                continue
+            sim = len(shingles & candidate.shingles) / len(shingles | candidate.shingles)
+            if sim > best_sim:
+                best, best_sim = candidate, sim
+        if best is not None and best_sim >= self.similarity:
+            self._entries.move_to_end(best.key)
+            self.hits += 1
+            self.near_hits += 1
+            logger.info("Response cache near-duplicate hit (similarity=%.2f)", best_sim)
+            return best.response
+
+        self.misses += 1
+        return None
+
+    def put(self, message: str, response: str, version: Optional[str] = None):
+        """Cache `response` for `message` under the current prompt version.
+
+        `version` is the prompt version the response was generated with; a
+        response from a version that has since been replaced is not cached.
+        """
+        if version is not None and version != self.version:
+            return
+        normalized = normalize_message(message)
+        if not normalized:
+            return
+        key = self._key(normalized)
+        if key in self._entries:
+            self._remove(key)
+
+        shingles, signature = _minhash(normalized)
+        echoed = (_words(message) & _words(response)) - self._vocabulary
+        entry = _Entry(key, response, shingles, signature, meaning_guard(message),
+                       bool(echoed), time.monotonic() + self.ttl_seconds)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        if entry.exact_only:
+            self.exact_only += 1
+            logger.debug("Cached response echoes %s from its message: exact matches only", sorted(echoed))
+        else:
+            for band in self._band_keys(signature):
+                self._bands.setdefault(band, set()).add(key)
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired entries. Returns count removed."""
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    # ── Internal helpers ──────────────────────────────────────────
+
+    @staticmethod
+    def _band_keys(signature: List[int]):
+        for band in range(_BANDS):
+            yield band, tuple(signature[band * _ROWS:(band + 1) * _ROWS])
+
+    def _candidates(self, signature: List[int]) -> List[str]:
+        collisions: Counter = Counter()
+        for band in self._band_keys(signature):
+            collisions.update(self._bands.get(band, ()))
+        return [key for key, _ in collisions.most_common(_MAX_CANDIDATES)]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        if entry.exact_only:
+            return
+        for band in self._band_keys(entry.signature):
+            bucket = self._bands.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band]
+
+    # ── Monitoring ────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "guard_rejects": self.guard_rejects,
+            "exact_only": self.exact_only,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "prompt_version": self.version,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,163 @@
+"""
+Incremental rolling summary of long conversations.
+
+Once a session has more than `threshold` user/assistant messages, its older
+turns are folded in the background into one summary entry at the head of
+the history:
+
+    {"role": "system", "summary": True, "turns": <messages folded so far>,
+     "content": "<compact summary>"}
+
+Only the newest `keep_recent` messages stay verbatim. Each fold feeds the
+previous summary plus the newly folded turns to `summarize`, so work per
+fold is bounded no matter how long the chat runs. The LLM context, callback
+descriptions and agent handoffs all read the stored summary instead of
+rebuilding one on the request path. Canned fallback replies (marked
+"fallback": True) are folded away with their turn but never summarized.
+
+Folding never blocks a reply: it runs after the turn is saved and applies
+its result under the session lock, only if the folded turns are still at the
+head of the history (a reset or concurrent change discards the fold).
+"""
+
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+import contextvars
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# summarize(previous_summary, turns) -> new summary text
+Summarize = Callable[[str, List[Dict]], Awaitable[str]]
+
+
+def summary_of(history: List[Dict]) -> Optional[Dict]:
+    """The rolling summary entry of `history`, if it has one."""
+    if history and history[0].get("summary"):
+        return history[0]
+    return None
+
+
+def folded_turns(history: List[Dict]) -> int:
+    """How many user/assistant messages the summary stands in for."""
+    summary = summary_of(history)
+    return summary.get("turns", 0) if summary else 0
+
+
+def is_turn(message: Dict) -> bool:
+    """True for user/assistant messages other than canned fallback replies."""
+    return message.get("role") in ("user", "assistant") and not message.get("fallback")
+
+
+def render_transcript(history: List[Dict], last: int = 10) -> str:
+    """Summary (if any) followed by the last `last` conversation turns."""
+    lines = []
+    summary = summary_of(history)
+    if summary:
+        lines.append(f"Earlier in the conversation: {summary['content']}")
+    lines.extend(
+        f"{'User' if m['role'] == 'user' else 'Bot'}: {m['content']}"
+        for m in [m for m in history if is_turn(m)][-last:]
+    )
+    return "\n".join(lines)
+
+
+class RollingSummarizer:
+    """Folds old turns of long sessions into a summary, off the request path.
+
+    - `store` / `locks` are the app's session store and SessionLocks.
+    - `summarize` produces the new summary text (usually an LLM call).
+    """
+
+    def __init__(self, store, locks, summarize: Summarize,
+                 threshold: int = 12, keep_recent: int = 6, enabled: bool = True):
+        self.store = store
+        self.locks = locks
+        self.summarize = summarize
+        self.threshold = threshold
+        self.keep_recent = max(2, keep_recent)
+        self.enabled = enabled
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.folds = 0
+        self.turns_folded = 0
+        self.discarded = 0
+        self.failures = 0
+        self.total_ms = 0.0
+
+    def maybe_fold(self, session_id: str, history: List[Dict]):
+        """Schedule a background fold if the session is over the threshold."""
+        if not self.enabled or session_id in self._tasks:
+            return
+        turns = sum(1 for m in history if m.get("role") in ("user", "assistant"))
+        if turns <= self.threshold:
+            return
+        # Background work must not inherit the request's context (deadline)
+        task = contextvars.Context().run(asyncio.create_task, self._fold(session_id, list(history)))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def _fold(self, session_id: str, snapshot: List[Dict]):
+        start = time.perf_counter()
+        positions = [i for i, m in enumerate(snapshot) if m.get("role") in ("user", "assistant")]
+        to_fold = positions[:-self.keep_recent]
+        cut = to_fold[-1] + 1
+        folded = [snapshot[i] for i in to_fold if is_turn(snapshot[i])]
+
+        previous = summary_of(snapshot)
+        try:
+            text = (await self.summarize(previous["content"] if previous else "", folded)).strip()
+        except Exception as exc:
+            self.failures += 1
+            logger.warning("Rolling summary failed for session %s: %s", session_id, exc)
+            return
+        if not text:
+            self.failures += 1
+            return
+
+        entry = {
+            "role": "system",
+            "summary": True,
+            "turns": (previous.get("turns", 0) if previous else 0) + len(folded),
+            "content": text,
+        }
+        async with self.locks.hold(session_id):
+            if not await self.store.acontains(session_id):
+                self.discarded += 1
+                return
+            history = await self.store.aget_or_create(session_id)
+            if [(m.get("role"), m.get("content")) for m in history[:cut]] != \
+                    [(m.get("role"), m.get("content")) for m in snapshot[:cut]]:
+                self.discarded += 1
+                logger.info("Rolling summary for session %s discarded: history changed", session_id)
+                return
+            history[:cut] = [entry]
+            await self.store.asave(session_id, history)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.folds += 1
+        self.turns_folded += len(folded)
+        self.total_ms += elapsed_ms
+        logger.info("Folded %d messages of session %s into summary (%d chars, %.0f ms)",
+                    len(folded), session_id, len(text), elapsed_ms)
+
+    async def aclose(self):
+        """Cancel folds still in flight (their sessions keep the full history)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._tasks),
+            "folds": self.folds,
+            "messages_folded": self.turns_folded,
+            "discarded": self.discarded,
+            "failures": self.failures,
+            "avg_fold_ms": round(self.total_ms / self.folds, 1) if self.folds else 0.0,
+        }
@@ -0,0 +1,133 @@
+"""
+Per-session serialization for webhook processing.
+
+Two webhooks for the same conversation (a double-clicked button, a message
+sent while the LLM is still answering) must not mutate the same history at
+once. Each session gets an `asyncio.Lock`, created on first use and dropped
+as soon as nobody holds or waits for it, so the table only ever contains
+sessions with requests in flight. asyncio locks wake waiters in FIFO order,
+which gives per-session ordering; different sessions never block each other.
+
+An asyncio lock only covers one process. With a shared session store
+(SQLite/Redis, several uvicorn workers) the lock holder also takes the
+store's per-session lease, polling until the other worker releases it or
+its `lease_seconds` TTL lapses (a crashed worker can't wedge a session).
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Waits longer than this are logged individually
+_SLOW_WAIT_MS = 250.0
+
+# Poll interval while another worker holds a session's lease (doubles up to the max)
+_LEASE_POLL_SECONDS = 0.02
+_LEASE_POLL_MAX_SECONDS = 0.2
+
+
+class _Slot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class SessionLocks:
+    """Lazily-created, self-cleaning per-session locks with wait statistics.
+
+    - `store`: the session store; its lease is taken too if it is shared.
+    - `lease_seconds`: lease TTL, longer than any request may run.
+    """
+
+    def __init__(self, store=None, lease_seconds: float = 60.0):
+        self._slots: Dict[str, _Slot] = {}
+        self.store = store if store is not None and store.shared else None
+        self.lease_seconds = lease_seconds
+        self.lease_waits = 0
+        self.acquired = 0
+        self.contended = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        """Run the body with exclusive access to `session_id`, in arrival order."""
+        slot = self._slots.get(session_id)
+        if slot is None:
+            slot = self._slots[session_id] = _Slot()
+        slot.users += 1
+
+        start = time.perf_counter()
+        contended = slot.lock.locked()
+        try:
+            await slot.lock.acquire()
+        except BaseException:
+            self._release_slot(session_id, slot)
+            raise
+        token = None
+        try:
+            if self.store is not None:
+                token = uuid.uuid4().hex
+                contended |= await self._take_lease(session_id, token)
+            waited_ms = (time.perf_counter() - start) * 1000
+            self._record(waited_ms, contended, session_id)
+            yield waited_ms
+        finally:
+            if token is not None:
+                try:
+                    await self.store.arelease_lease(session_id, token)
+                except Exception as exc:
+                    # The lease lapses on its own after lease_seconds
+                    logger.warning("Releasing session lease for %s failed: %s", session_id, exc)
+            slot.lock.release()
+            self._release_slot(session_id, slot)
+
+    async def _take_lease(self, session_id: str, token: str) -> bool:
+        """Wait for the store-level lease; True if another worker held it."""
+        delay = _LEASE_POLL_SECONDS
+        waited = False
+        while not await self.store.atry_lease(session_id, token, self.lease_seconds):
+            if not waited:
+                waited = True
+                self.lease_waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _LEASE_POLL_MAX_SECONDS)
+        return waited
+
+    def _release_slot(self, session_id: str, slot: _Slot):
+        slot.users -= 1
+        if slot.users == 0 and self._slots.get(session_id) is slot:
+            del self._slots[session_id]
+
+    def _record(self, waited_ms: float, contended: bool, session_id: str):
+        self.acquired += 1
+        if not contended:
+            return
+        self.contended += 1
+        self.total_wait_ms += waited_ms
+        self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+        if waited_ms >= _SLOW_WAIT_MS:
+            logger.info("Session %s waited %.0f ms for its previous request", session_id, waited_ms)
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self._slots),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "avg_wait_ms": round(self.total_wait_ms / self.contended, 1) if self.contended else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "shared_leases": self.store is not None,
+            "lease_waits": self.lease_waits,
+        }
+
+    def __len__(self) -> int:
+        return len(self._slots)
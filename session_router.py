@@ -0,0 +1,248 @@
+"""
+Consistent-hash session routing across replicas.
+
+An alternative to a shared session store when several replicas sit behind
+one SalesIQ webhook URL: every replica is given the same peer list, places
+the peers on a hash ring (`vnodes` points each) and hashes the session id
+(`active_conversation_id`) onto it. The replica that owns a session handles
+all of its webhooks, so history, session locks, debounce buffers and sticky
+prompt procedures stay local to one process.
+
+A webhook that lands on another replica is forwarded to the owner over a
+pooled keep-alive connection and the owner's reply is returned unchanged.
+Forwarded requests carry
+
+    X-Chatbot-Forwarded-By → the forwarding replica; never forwarded again
+    X-Chatbot-Deadline     → seconds left of the original request's budget
+
+and the reply carries X-Chatbot-Handled-By with the owner's URL.
+
+If the owner cannot be reached it is taken off the ring for
+`down_seconds`; because the ring is consistent only that peer's share of
+sessions moves (to the next point on the ring), and the request is handled
+locally rather than failed. The peer rejoins the ring after the cooldown.
+
+Only a request that never reached the owner (connection refused or timed
+out) is handled locally. Once it may have been delivered (read timeout,
+dropped connection, 5xx), the owner may be handling it: `forward` raises
+ForwardUnanswered and the caller replies without handling it a second time.
+"""
+
+from __future__ import annotations
+
+import time
+import bisect
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from deadline import DeadlineExceeded, timeout_for
+from metrics import SESSION_ROUTING
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_HEADER = "X-Chatbot-Forwarded-By"
+DEADLINE_HEADER = "X-Chatbot-Deadline"
+# Set on a forwarded webhook's reply: the replica that actually handled it
+HANDLED_BY_HEADER = "X-Chatbot-Handled-By"
+
+# Request headers passed through to the owner
+_FORWARD_HEADERS = ("content-type", "x-webhook-secret")
+
+
+# Errors raised before the request reached the owner: safe to handle locally
+_NOT_DELIVERED = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class ForwardUnanswered(Exception):
+    """The owner may have received the webhook but no usable reply came back."""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` points per node.
+
+    Adding or removing a node only moves the keys between its points and
+    their predecessors — about 1/N of all keys.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self._nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def _rebuild(self):
+        ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self._nodes
+            for i in range(self.vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def add(self, node: str):
+        if node not in self._nodes:
+            self._nodes.append(node)
+            self._rebuild()
+
+    def remove(self, node: str):
+        if node in self._nodes:
+            self._nodes.remove(node)
+            self._rebuild()
+
+    def owner(self, key: str) -> Optional[str]:
+        """Node owning `key` (first point clockwise from its hash)."""
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+
+class SessionRouter:
+    """Decides which replica owns a session and forwards webhooks to it.
+
+    - `self_url` and `peers` are base URLs ("http://10.0.0.5:8000");
+      `self_url` is added to the peers if missing.
+    - Routing is off (`enabled` False) with fewer than two peers.
+    - `timeout` caps a forward, further capped by the request deadline.
+    """
+
+    def __init__(self, self_url: str, peers: Iterable[str], vnodes: int = 128,
+                 timeout: float = 8.0, down_seconds: float = 10.0, max_connections: int = 50):
+        self.self_url = self_url.rstrip("/")
+        self.peers = list(dict.fromkeys([p.rstrip("/") for p in peers if p.strip()] + [self.self_url]))
+        self.ring = HashRing(self.peers, vnodes)
+        self.timeout = timeout
+        self.down_seconds = down_seconds
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._down_until: Dict[str, float] = {}
+
+        self.local = 0
+        self.forwarded = 0
+        self.forward_failures = 0
+        self.forward_unanswered = 0
+        self.received = 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.peers) > 1
+
+    # ── Ownership ─────────────────────────────────────────────────
+
+    def _revive(self):
+        now = time.monotonic()
+        for peer, until in list(self._down_until.items()):
+            if now >= until:
+                del self._down_until[peer]
+                self.ring.add(peer)
+                logger.info("Peer %s back on the session ring", peer)
+
+    def _mark_down(self, peer: str, reason: str):
+        if peer == self.self_url:
+            return
+        self.ring.remove(peer)
+        self._down_until[peer] = time.monotonic() + self.down_seconds
+        logger.warning("Peer %s taken off the session ring for %.0fs: %s", peer, self.down_seconds, reason)
+
+    def owner(self, session_id: str) -> str:
+        if self._down_until:
+            self._revive()
+        return self.ring.owner(session_id) or self.self_url
+
+    def is_local(self, session_id: str) -> bool:
+        return not self.enabled or self.owner(session_id) == self.self_url
+
+    def note_local(self, forwarded_by: Optional[str] = None):
+        """Count a webhook handled here (`forwarded_by` if a peer sent it)."""
+        if forwarded_by:
+            self.received += 1
+            SESSION_ROUTING.labels("received").inc()
+        else:
+            self.local += 1
+            SESSION_ROUTING.labels("local").inc()
+
+    # ── Forwarding ────────────────────────────────────────────────
+
+    def _client_for_peers(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self._limits)
+        return self._client
+
+    async def forward(self, session_id: str, path: str, body: bytes, headers: Dict[str, str],
+                      remaining: Optional[float] = None) -> Optional[httpx.Response]:
+        """Send the webhook to the session's owner.
+
+        Returns the owner's response, or None if the request never reached
+        the owner (the caller then handles it itself; an unreachable owner is
+        also taken off the ring). Raises ForwardUnanswered if the owner may
+        have received it but did not answer in time or answered with a 5xx.
+        """
+        owner = self.owner(session_id)
+        if owner == self.self_url:
+            return None
+        out_headers = {k: v for k, v in headers.items() if k.lower() in _FORWARD_HEADERS}
+        out_headers[FORWARDED_HEADER] = self.self_url
+        if remaining is not None:
+            out_headers[DEADLINE_HEADER] = f"{remaining:.3f}"
+
+        with span("router.forward", owner=owner) as s:
+            try:
+                response = await self._client_for_peers().post(
+                    f"{owner}{path}", content=body, headers=out_headers,
+                    timeout=timeout_for(self.timeout, minimum=0.2),
+                )
+            except DeadlineExceeded:
+                return None
+            except _NOT_DELIVERED as exc:
+                self.forward_failures += 1
+                SESSION_ROUTING.labels("forward_failed").inc()
+                self._mark_down(owner, f"{type(exc).__name__}: {exc}")
+                return None
+            except httpx.HTTPError as exc:
+                # Possibly delivered: a slow owner is still alive and may be
+                # handling it, so it stays on the ring and nothing runs here
+                self.forward_unanswered += 1
+                SESSION_ROUTING.labels("forward_unanswered").inc()
+                raise ForwardUnanswered(f"{owner}: {type(exc).__name__}: {exc}") from exc
+            s.set("status_code", response.status_code)
+
+        if response.status_code >= 500:
+            self.forward_unanswered += 1
+            SESSION_ROUTING.labels("forward_unanswered").inc()
+            self._mark_down(owner, f"HTTP {response.status_code}")
+            raise ForwardUnanswered(f"{owner}: HTTP {response.status_code}")
+        self.forwarded += 1
+        SESSION_ROUTING.labels("forwarded").inc()
+        return response
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "self": self.self_url,
+            "ring": self.ring.nodes,
+            "down": {peer: round(until - time.monotonic(), 1) for peer, until in self._down_until.items()},
+            "local": self.local,
+            "received": self.received,
+            "forwarded": self.forwarded,
+            "forward_failures": self.forward_failures,
+            "forward_unanswered": self.forward_unanswered,
+        }
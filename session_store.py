@@ -0,0 +1,758 @@
+"""
+Conversation session stores.
+
+Three interchangeable backends behind one `SessionStore` interface:
+
+  1. memory  → in-process OrderedDict (single worker, the original behaviour)
+  2. sqlite  → SQLite in WAL mode, shared by every worker process on one host
+  3. redis   → any Redis-protocol server, shared across hosts
+
+All backends keep the same semantics:
+  - Sessions idle for longer than `ttl_minutes` are expired.
+  - At most `max_sessions` sessions are kept (least recently used evicted).
+  - At most `max_messages` messages are kept per session (oldest dropped).
+
+`get_or_create` returns a list the caller may mutate; call `save` afterwards
+so non-memory backends persist the change.
+
+The SQLite and Redis backends make blocking calls (sqlite3, a blocking
+socket). Async code uses the `a*` variants (`aget_or_create`, `asave`,
+`areset`, `acontains`, `acleanup_expired`, `acount`), which run those
+backends in a worker thread and the memory backend inline. `count` is the
+size seen by the last `acount()`/`acleanup_expired()`, for metric gauges
+that must not do I/O at scrape time.
+
+Shared backends (`shared = True`) also provide per-session leases —
+`try_lease` / `release_lease` with a random token and a TTL — which
+SessionLocks takes on top of its in-process lock, so two workers never
+read-modify-write the same history at once.
+
+The memory backend can also `snapshot()` its sessions to a file and
+`restore()` them after a restart, so a redeploy doesn't wipe conversations
+in progress. The file is length-prefixed binary:
+
+    header  = magic "SESSNAP1" | written_at f64 | count u32
+    record  = id_len u16 | last_active f64 | history_len u32 | id | history
+
+`last_active` is wall-clock time (monotonic clocks don't survive a
+restart) and `history` is compact JSON. Records are written least recently
+used first. Restore skips expired records and keeps each history as its raw
+JSON bytes; a history is only parsed when its session is next accessed, so
+restoring costs little more than reading the file, and sessions that never
+come back are never decoded (an untouched one is written back as-is).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import asyncio
+import socket
+import sqlite3
+import struct
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from metrics import SESSION_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+# Expired sessions the in-memory store frees inline on each access
+_SWEEP_PER_ACCESS = 32
+
+_SNAPSHOT_MAGIC = b"SESSNAP1"
+_SNAPSHOT_HEADER = struct.Struct("<8sdI")   # magic, written_at, record count
+_SNAPSHOT_RECORD = struct.Struct("<HdI")    # id length, last_active, history length
+
+
+class SnapshotError(Exception):
+    """Snapshot file is not a session snapshot or is truncated."""
+
+
+class SessionStore(ABC):
+    """Bounded, TTL-based conversation store interface."""
+
+    # Backends whose calls block on I/O; their async variants run in a thread
+    blocking = True
+    # Backends visible to other worker processes (need cross-process leases)
+    shared = True
+
+    def __init__(self, max_sessions: int = 1000, ttl_minutes: int = 30, max_messages: int = 50):
+        self.max_sessions = max_sessions
+        self.ttl_minutes = ttl_minutes
+        self.max_messages = max_messages
+        self._count = 0
+
+    @abstractmethod
+    def get_or_create(self, session_id: str) -> List[Dict]:
+        """Return message history for session, creating if needed."""
+
+    @abstractmethod
+    def save(self, session_id: str, history: List[Dict]):
+        """Persist `history` for a session, trimming to max_messages."""
+
+    @abstractmethod
+    def reset(self, session_id: str):
+        """Clear history for a session."""
+
+    @abstractmethod
+    def cleanup_expired(self) -> int:
+        """Remove sessions idle longer than TTL. Returns count removed."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def __contains__(self, session_id: str) -> bool:
+        ...
+
+    def add_message(self, session_id: str, message: Dict):
+        """Append a message, dropping oldest if over max_messages."""
+        history = self.get_or_create(session_id)
+        history.append(message)
+        self.save(session_id, history)
+
+    def _trim(self, history: List[Dict]):
+        if len(history) > self.max_messages:
+            # Keep a leading rolling summary (see rolling_summary) in front
+            head = 1 if history[0].get("summary") else 0
+            del history[head: head + len(history) - self.max_messages]
+
+    def close(self):
+        """Release backend resources (connections, file handles)."""
+
+    def snapshot(self, path: str) -> int:
+        """Write all live sessions to `path`. Returns the number written.
+
+        Only the memory backend needs this; SQLite and Redis already
+        outlive the process, so the default writes nothing.
+        """
+        return 0
+
+    def restore(self, path: str) -> int:
+        """Load sessions from a snapshot, skipping expired ones. Returns count loaded."""
+        return 0
+
+    def try_lease(self, session_id: str, token: str, ttl: float) -> bool:
+        """Take the session's cross-process lease unless another live token holds it."""
+        return True
+
+    def release_lease(self, session_id: str, token: str):
+        """Drop the lease if `token` still holds it (an expired one may have moved on)."""
+
+    # ── Async access (off the event loop for blocking backends) ───
+
+    async def _call(self, fn, *args):
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def aget_or_create(self, session_id: str) -> List[Dict]:
+        return await self._call(self.get_or_create, session_id)
+
+    async def asave(self, session_id: str, history: List[Dict]):
+        await self._call(self.save, session_id, history)
+
+    async def areset(self, session_id: str):
+        await self._call(self.reset, session_id)
+
+    async def acontains(self, session_id: str) -> bool:
+        return await self._call(self.__contains__, session_id)
+
+    async def acleanup_expired(self) -> int:
+        removed = await self._call(self.cleanup_expired)
+        await self.acount()
+        return removed
+
+    async def atry_lease(self, session_id: str, token: str, ttl: float) -> bool:
+        return await self._call(self.try_lease, session_id, token, ttl)
+
+    async def arelease_lease(self, session_id: str, token: str):
+        await self._call(self.release_lease, session_id, token)
+
+    async def acount(self) -> int:
+        self._count = await self._call(self.__len__)
+        return self._count
+
+    @property
+    def count(self) -> int:
+        """Session count without I/O: live for memory, last `acount()` otherwise."""
+        return self._count if self.blocking else len(self)
+
+
+def write_snapshot(path: str, records: List[Tuple[str, float, object]]) -> int:
+    """Write (session_id, last_active_wall_clock, history) records to `path`.
+
+    `history` is a message list, or already-encoded JSON bytes.
+
+    Written to a temporary file and renamed into place, so a crash mid-write
+    leaves the previous snapshot intact.
+    """
+    chunks = []
+    for session_id, last_active, history in records:
+        sid = session_id.encode("utf-8")
+        if len(sid) > 0xFFFF:
+            continue
+        if isinstance(history, bytes):
+            payload = history
+        else:
+            payload = json.dumps(history, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        chunks.append(_SNAPSHOT_RECORD.pack(len(sid), last_active, len(payload)))
+        chunks.append(sid)
+        chunks.append(payload)
+    count = len(chunks) // 3
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, time.time(), count))
+        f.write(b"".join(chunks))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot(path: str, max_age: float) -> List[Tuple[str, float, bytes]]:
+    """Read a snapshot, dropping records idle for more than `max_age` seconds.
+
+    Histories are returned as undecoded JSON bytes.
+
+    Raises FileNotFoundError if there is no snapshot and SnapshotError if
+    the file is damaged.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _SNAPSHOT_HEADER.size:
+        raise SnapshotError("file too short")
+    magic, _, count = _SNAPSHOT_HEADER.unpack_from(data, 0)
+    if magic != _SNAPSHOT_MAGIC:
+        raise SnapshotError("bad magic")
+
+    cutoff = time.time() - max_age
+    offset = _SNAPSHOT_HEADER.size
+    records = []
+    try:
+        for _ in range(count):
+            sid_len, last_active, payload_len = _SNAPSHOT_RECORD.unpack_from(data, offset)
+            offset += _SNAPSHOT_RECORD.size
+            end = offset + sid_len + payload_len
+            if end > len(data):
+                raise SnapshotError("truncated record")
+            if last_active >= cutoff:
+                session_id = data[offset:offset + sid_len].decode("utf-8")
+                records.append((session_id, last_active, data[offset + sid_len:end]))
+            offset = end
+    except struct.error as exc:
+        raise SnapshotError(f"truncated record: {exc}") from exc
+    return records
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 1. IN-MEMORY
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class MemorySessionStore(SessionStore):
+    """In-process store. Histories are shared by reference, so `save` only
+    trims and refreshes the session's LRU position.
+
+    Every access moves a session to the end of the OrderedDict and stamps it
+    with the monotonic clock, so the dict is always sorted by last activity.
+    With one TTL for all sessions, the expired ones are exactly a prefix of
+    the dict: expiry pops from the front and stops at the first live session,
+    costing O(expired) instead of a scan over every session. A few expired
+    sessions are also freed on each access, and a session past its TTL is
+    treated as absent even before it is swept.
+    """
+
+    blocking = False
+    shared = False
+
+    def __init__(self, max_sessions: int = 1000, ttl_minutes: int = 30, max_messages: int = 50):
+        super().__init__(max_sessions, ttl_minutes, max_messages)
+        self._store: OrderedDict[str, List[Dict]] = OrderedDict()
+        self._last_active: Dict[str, float] = {}
+        # Encoded history per session from the previous snapshot, keyed on its
+        # last_active stamp: any change to a session goes through get_or_create,
+        # which moves the stamp, so only sessions active since then are re-encoded
+        self._encoded: Dict[str, Tuple[float, bytes]] = {}
+        self._snapshot_lock = threading.Lock()
+
+    def _expired(self, session_id: str, now: float) -> bool:
+        return now - self._last_active[session_id] > self.ttl_minutes * 60
+
+    def _sweep(self, now: float, limit: Optional[int] = None) -> int:
+        removed = 0
+        while self._store and (limit is None or removed < limit):
+            oldest = next(iter(self._store))
+            if not self._expired(oldest, now):
+                break
+            del self._store[oldest]
+            del self._last_active[oldest]
+            removed += 1
+        if removed:
+            SESSION_EVICTIONS.labels("ttl").inc(removed)
+        return removed
+
+    def get_or_create(self, session_id: str) -> List[Dict]:
+        now = time.monotonic()
+        # Free a few expired sessions per access; cleanup_expired() does the rest
+        self._sweep(now, limit=_SWEEP_PER_ACCESS)
+        if session_id in self._store and self._expired(session_id, now):
+            # Past its TTL but not swept yet: never serve the stale history
+            del self._store[session_id]
+            del self._last_active[session_id]
+            SESSION_EVICTIONS.labels("ttl").inc()
+        if session_id in self._store:
+            self._store.move_to_end(session_id)
+            if type(self._store[session_id]) is bytes:
+                # Restored from a snapshot and not touched since: decode now
+                self._store[session_id] = json.loads(self._store[session_id])
+        else:
+            # Evict LRU session if at capacity
+            if len(self._store) >= self.max_sessions:
+                oldest_key, _ = self._store.popitem(last=False)
+                self._last_active.pop(oldest_key, None)
+                SESSION_EVICTIONS.labels("lru").inc()
+                logger.info("Session evicted (LRU): %s", oldest_key)
+            self._store[session_id] = []
+        self._last_active[session_id] = now
+        return self._store[session_id]
+
+    def save(self, session_id: str, history: List[Dict]):
+        self._trim(history)
+        self.get_or_create(session_id)
+        self._store[session_id] = history
+
+    def reset(self, session_id: str):
+        self._store.pop(session_id, None)
+        self._last_active.pop(session_id, None)
+
+    def cleanup_expired(self) -> int:
+        removed = self._sweep(time.monotonic())
+        if removed:
+            logger.info("Cleaned up %d expired sessions", removed)
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._store and not self._expired(session_id, time.monotonic())
+
+    def snapshot(self, path: str) -> int:
+        """Write live sessions to `path` (callable from a worker thread).
+
+        The session table is copied in one step and each history is encoded
+        by a single C-level json.dumps call, both of which hold the GIL, so
+        the event loop can keep mutating sessions meanwhile. Sessions idle
+        since the previous snapshot reuse its encoding.
+        """
+        with self._snapshot_lock:
+            now_wall, now = time.time(), time.monotonic()
+            ttl = self.ttl_minutes * 60
+            items = list(self._store.items())
+            last_active = dict(self._last_active)
+            records, encoded = [], {}
+            for session_id, history in items:
+                active = last_active.get(session_id)
+                if active is None or now - active > ttl:
+                    continue
+                cached = self._encoded.get(session_id)
+                if cached is not None and cached[0] == active:
+                    payload = cached[1]
+                elif isinstance(history, bytes):
+                    payload = history
+                else:
+                    payload = json.dumps(history, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+                encoded[session_id] = (active, payload)
+                records.append((session_id, now_wall - (now - active), payload))
+            written = write_snapshot(path, records)
+            self._encoded = encoded
+            return written
+
+    def restore(self, path: str) -> int:
+        """Load a snapshot written by `snapshot()`.
+
+        Sessions already in the store are kept; expired ones are skipped and
+        only the most recent `max_sessions` are loaded. Histories stay JSON
+        bytes until `get_or_create` first touches the session.
+        """
+        try:
+            records = read_snapshot(path, self.ttl_minutes * 60)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, SnapshotError) as exc:
+            logger.warning("Session snapshot %s not restored: %s", path, exc)
+            return 0
+
+        now_wall, now = time.time(), time.monotonic()
+        # Restored sessions are older than any created since startup, so they
+        # go in front to keep the dict ordered by last activity
+        existing = self._store
+        self._store = OrderedDict()
+        restored = 0
+        for session_id, active, history in records[-self.max_sessions:]:
+            if session_id in existing:
+                continue
+            self._store[session_id] = history
+            self._last_active[session_id] = now - (now_wall - active)
+            restored += 1
+        self._store.update(existing)
+        while len(self._store) > self.max_sessions:
+            oldest, _ = self._store.popitem(last=False)
+            self._last_active.pop(oldest, None)
+            restored -= 1
+        return restored
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 2. SQLITE (WAL) — multiple worker processes on one host
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store; every worker process opens the same file."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id  TEXT PRIMARY KEY,
+        history     TEXT NOT NULL,
+        last_active REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+    CREATE TABLE IF NOT EXISTS session_leases (
+        session_id  TEXT PRIMARY KEY,
+        token       TEXT NOT NULL,
+        expires_at  REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, max_sessions: int = 1000, ttl_minutes: int = 30,
+                 max_messages: int = 50):
+        super().__init__(max_sessions, ttl_minutes, max_messages)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+
+    def get_or_create(self, session_id: str) -> List[Dict]:
+        now = time.time()
+        cutoff = now - self.ttl_minutes * 60
+        with self._lock:
+            # Rows past their TTL count as absent even before cleanup removes them
+            row = self._db.execute(
+                "UPDATE sessions SET last_active = ? WHERE session_id = ? AND last_active >= ? "
+                "RETURNING history",
+                (now, session_id, cutoff),
+            ).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+
+            # New session: evict LRU sessions if at capacity, then insert
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+                if count >= self.max_sessions:
+                    evicted = self._db.execute(
+                        "DELETE FROM sessions WHERE session_id IN ("
+                        " SELECT session_id FROM sessions ORDER BY last_active LIMIT ?"
+                        ") RETURNING session_id",
+                        (count - self.max_sessions + 1,),
+                    ).fetchall()
+                    SESSION_EVICTIONS.labels("lru").inc(len(evicted))
+                    for (sid,) in evicted:
+                        logger.info("Session evicted (LRU): %s", sid)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, history, last_active) VALUES (?, '[]', ?)",
+                    (session_id, now),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return []
+
+    def save(self, session_id: str, history: List[Dict]):
+        self._trim(history)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (session_id, history, last_active) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET history = excluded.history, "
+                "last_active = excluded.last_active",
+                (session_id, json.dumps(history), time.time()),
+            )
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def cleanup_expired(self) -> int:
+        cutoff = time.time() - self.ttl_minutes * 60
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM sessions WHERE last_active < ?", (cutoff,)
+            ).rowcount
+        if removed:
+            SESSION_EVICTIONS.labels("ttl").inc(removed)
+            logger.info("Cleaned up %d expired sessions", removed)
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def try_lease(self, session_id: str, token: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # Single statement, so the check-and-take is atomic across processes
+            row = self._db.execute(
+                "INSERT INTO session_leases (session_id, token, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET token = excluded.token, "
+                "expires_at = excluded.expires_at WHERE session_leases.expires_at < ? "
+                "RETURNING token",
+                (session_id, token, now + ttl, now),
+            ).fetchone()
+        return row is not None
+
+    def release_lease(self, session_id: str, token: str):
+        with self._lock:
+            self._db.execute("DELETE FROM session_leases WHERE session_id = ? AND token = ?",
+                             (session_id, token))
+
+    def __contains__(self, session_id: str) -> bool:
+        cutoff = time.time() - self.ttl_minutes * 60
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ? AND last_active >= ?",
+                (session_id, cutoff),
+            ).fetchone() is not None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 3. REDIS PROTOCOL — shared across hosts
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """Minimal blocking RESP2 client (one connection, pipelining, reconnect).
+
+    Only what the session store needs; avoids a hard dependency on redis-py.
+    """
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._roundtrip([("AUTH", self.password)])
+        if self.db:
+            self._roundtrip([("SELECT", self.db)])
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._read_reply() for _ in range(size)]
+        raise ConnectionError(f"Unexpected RESP reply: {line!r}")
+
+    def _roundtrip(self, commands: List[tuple]) -> list:
+        self._sock.sendall(b"".join(self._encode(cmd) for cmd in commands))
+        return [self._read_reply() for _ in commands]
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Send several commands in one round trip and return their replies."""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    replies = self._roundtrip(commands)
+                    break
+                except (OSError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+# Delete the lease only if it still holds our token (atomic on the server)
+_RELEASE_LEASE_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-protocol store.
+
+    - `{prefix}h:{id}` holds the JSON history with a native TTL, refreshed
+      on every access, so idle sessions expire server-side.
+    - `{prefix}lru` is a sorted set of session ids scored by last access,
+      used for LRU eviction and for counting live sessions.
+    """
+
+    def __init__(self, url: str, max_sessions: int = 1000, ttl_minutes: int = 30,
+                 max_messages: int = 50, prefix: str = "acebuddy:"):
+        super().__init__(max_sessions, ttl_minutes, max_messages)
+        self.client = RespClient(url)
+        self.prefix = prefix
+        self._lru_key = f"{prefix}lru"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}h:{session_id}"
+
+    @property
+    def _ttl_seconds(self) -> int:
+        return self.ttl_minutes * 60
+
+    def get_or_create(self, session_id: str) -> List[Dict]:
+        key = self._key(session_id)
+        raw, _, _ = self.client.pipeline([
+            ("GET", key),
+            ("EXPIRE", key, self._ttl_seconds),
+            ("ZADD", self._lru_key, time.time(), session_id),
+        ])
+        if raw is not None:
+            return json.loads(raw)
+
+        # New session: create it, then evict LRU sessions beyond the cap
+        _, count = self.client.pipeline([
+            ("SET", key, "[]", "EX", self._ttl_seconds, "NX"),
+            ("ZCARD", self._lru_key),
+        ])
+        if count > self.max_sessions:
+            popped = self.client.execute("ZPOPMIN", self._lru_key, count - self.max_sessions)
+            evicted = popped[0::2]
+            if evicted:
+                self.client.execute("DEL", *[self._key(sid) for sid in evicted])
+                SESSION_EVICTIONS.labels("lru").inc(len(evicted))
+                for sid in evicted:
+                    logger.info("Session evicted (LRU): %s", sid)
+        return []
+
+    def save(self, session_id: str, history: List[Dict]):
+        self._trim(history)
+        self.client.pipeline([
+            ("SET", self._key(session_id), json.dumps(history), "EX", self._ttl_seconds),
+            ("ZADD", self._lru_key, time.time(), session_id),
+        ])
+
+    def reset(self, session_id: str):
+        self.client.pipeline([
+            ("DEL", self._key(session_id)),
+            ("ZREM", self._lru_key, session_id),
+        ])
+
+    def cleanup_expired(self) -> int:
+        # History keys expire on their own; drop their stale LRU entries
+        cutoff = time.time() - self._ttl_seconds
+        removed = self.client.execute("ZREMRANGEBYSCORE", self._lru_key, "-inf", cutoff)
+        if removed:
+            SESSION_EVICTIONS.labels("ttl").inc(removed)
+            logger.info("Cleaned up %d expired sessions", removed)
+        return removed
+
+    def __len__(self) -> int:
+        return self.client.execute("ZCARD", self._lru_key)
+
+    def try_lease(self, session_id: str, token: str, ttl: float) -> bool:
+        key = f"{self.prefix}lease:{session_id}"
+        return self.client.execute("SET", key, token, "NX", "PX", max(1, int(ttl * 1000))) is not None
+
+    def release_lease(self, session_id: str, token: str):
+        self.client.execute("EVAL", _RELEASE_LEASE_SCRIPT, 1, f"{self.prefix}lease:{session_id}", token)
+
+    def __contains__(self, session_id: str) -> bool:
+        return bool(self.client.execute("EXISTS", self._key(session_id)))
+
+    def close(self):
+        self.client.close()
+
+
+def create_session_store(backend: str, max_sessions: int = 1000, ttl_minutes: int = 30,
+                         max_messages: int = 50, sqlite_path: str = "",
+                         redis_url: str = "") -> SessionStore:
+    """Build the session store selected by `backend` (memory / sqlite / redis)."""
+    backend = backend.lower()
+    limits = dict(max_sessions=max_sessions, ttl_minutes=ttl_minutes, max_messages=max_messages)
+    if backend == "memory":
+        store: SessionStore = MemorySessionStore(**limits)
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(sqlite_path, **limits)
+    elif backend == "redis":
+        store = RedisSessionStore(redis_url, **limits)
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND '{backend}' (expected memory, sqlite or redis)")
+    logger.info("Session store backend: %s", backend)
+    return store
@@ -0,0 +1,365 @@
+"""
+Lightweight in-process tracing with head-based sampling.
+
+Each webhook opens a root span; anything awaited inside it (session store,
+LLM attempts, Zoho calls, token refreshes) opens child spans through a
+context variable, so spans follow the request across tasks:
+
+    with trace("webhook", request_id=request_id) as root:
+        with span("llm.attempt", attempt=1) as s:
+            ...
+            s.set("model", model)
+
+Whether a trace is recorded is decided once, when its root starts
+(TRACE_SAMPLE_RATE). Unsampled traces cost one object per request and no
+allocation per child span; their trace id still goes into every log line
+(TraceLogFilter) so logs of one request can be grouped.
+
+Finished spans are buffered in a bounded queue and exported in batches from
+a background task, off the event loop thread:
+
+  - TRACE_EXPORTER=jsonl → one JSON object per span in TRACE_JSONL_PATH
+  - TRACE_EXPORTER=otlp  → OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT/v1/traces
+                           (Jaeger, Tempo, an OpenTelemetry Collector, ...)
+  - unset                → tracing off (trace ids are still logged)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import random
+import asyncio
+import inspect
+import logging
+import functools
+import contextvars
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "").lower()
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", os.path.join(os.path.dirname(__file__), "data", "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318")
+TRACE_OTLP_HEADERS = os.getenv("TRACE_OTLP_HEADERS", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "llm-chatbot")
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", "5000"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "2"))
+
+_current: contextvars.ContextVar[Optional[Union["Span", "_Unsampled"]]] = \
+    contextvars.ContextVar("span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """A recorded span; use as a context manager (see Tracer.span)."""
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "status", "error", "start_ns", "_start", "duration_ms", "_token")
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.duration_ms = 0.0
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if exc_type is not None:
+            self.status = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error"
+            self.error = f"{exc_type.__name__}: {exc}"[:300]
+        _current.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned for spans that are not recorded; accepts and ignores attributes."""
+    __slots__ = ()
+    sampled = False
+    trace_id = None
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Unsampled(_NoopSpan):
+    """Root of a trace that is not recorded: only carries the trace id."""
+    __slots__ = ("trace_id", "_token")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+
+    def __enter__(self) -> "_Unsampled":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current.reset(self._token)
+        return False
+
+
+class JsonlExporter:
+    """Appends spans, one JSON object per line, to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def export(self, spans: List[Dict]):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(s, default=str) + "\n" for s in spans))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """Sends spans as OTLP/HTTP JSON to `<endpoint>/v1/traces`."""
+
+    def __init__(self, endpoint: str, service_name: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self._client = httpx.Client(headers=headers or {}, timeout=timeout)
+
+    def _payload(self, spans: List[Dict]) -> Dict:
+        otlp_spans = []
+        for s in spans:
+            end_ns = s["start_unix_nano"] + int(s["duration_ms"] * 1_000_000)
+            entry = {
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "name": s["name"],
+                "kind": 2 if s["parent_id"] is None else 1,     # SERVER for roots, else INTERNAL
+                "startTimeUnixNano": str(s["start_unix_nano"]),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+            }
+            if s["parent_id"]:
+                entry["parentSpanId"] = s["parent_id"]
+            otlp_spans.append(entry)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+        }]}
+
+    def export(self, spans: List[Dict]):
+        resp = self._client.post(self.url, json=self._payload(spans))
+        resp.raise_for_status()
+
+    def close(self):
+        self._client.close()
+
+
+class Tracer:
+    """Creates spans, samples traces at their root and exports finished spans.
+
+    - `exporter=None` disables recording (trace ids are still assigned).
+    - `sample_rate` is the fraction of root spans whose trace is recorded.
+    - At most `max_queue` finished spans wait for export; beyond that new
+      spans are dropped (and counted) rather than growing memory.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 0.1, max_queue: int = 5000,
+                 flush_interval: float = 2.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+
+        self._queue: Deque[Dict] = deque()
+        self._flusher: Optional[asyncio.Task] = None
+
+        self.traces = 0
+        self.sampled = 0
+        self.exported = 0
+        self.dropped = 0
+        self.export_failures = 0
+
+    def trace(self, name: str, **attributes) -> Union[Span, _NoopSpan]:
+        """Root span of a new trace (a child span if one is already current)."""
+        parent = _current.get()
+        if parent is not None:
+            return self.span(name, **attributes)
+        self.traces += 1
+        trace_id = _new_id(128)
+        if self.sample_rate and random.random() < self.sample_rate:
+            self.sampled += 1
+            return Span(self, name, trace_id, None, attributes)
+        return _Unsampled(trace_id)
+
+    def span(self, name: str, **attributes) -> Union[Span, _NoopSpan]:
+        """Child of the current span; a no-op outside a sampled trace."""
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return _NOOP
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def _finish(self, span: Span):
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span.to_dict())
+
+    def start(self):
+        if self.exporter is not None and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Hand the queued spans to the exporter (on a worker thread)."""
+        if not self._queue or self.exporter is None:
+            return
+        batch = list(self._queue)
+        self._queue.clear()
+        try:
+            await asyncio.to_thread(self.exporter.export, batch)
+            self.exported += len(batch)
+        except Exception as exc:
+            self.export_failures += 1
+            logger.warning("Trace export of %d spans failed: %s", len(batch), exc)
+
+    async def aclose(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        if self.exporter is not None:
+            await asyncio.to_thread(self.exporter.close)
+
+    def stats(self) -> Dict:
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "sample_rate": self.sample_rate,
+            "traces": self.traces,
+            "sampled": self.sampled,
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_failures": self.export_failures,
+        }
+
+
+class TraceLogFilter(logging.Filter):
+    """Adds the current trace id to log records (sampled or not)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current.get()
+        if current is not None and not hasattr(record, "trace_id"):
+            record.trace_id = current.trace_id
+        return True
+
+
+def _exporter_from_env():
+    if TRACE_EXPORTER == "jsonl":
+        return JsonlExporter(TRACE_JSONL_PATH)
+    if TRACE_EXPORTER == "otlp":
+        headers = dict(h.split("=", 1) for h in TRACE_OTLP_HEADERS.split(",") if "=" in h)
+        return OtlpHttpExporter(TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME, headers)
+    return None
+
+
+tracer = Tracer(
+    exporter=_exporter_from_env(),
+    sample_rate=TRACE_SAMPLE_RATE,
+    max_queue=TRACE_MAX_QUEUE,
+    flush_interval=TRACE_FLUSH_INTERVAL,
+)
+
+
+def trace(name: str, **attributes) -> Union[Span, _NoopSpan]:
+    return tracer.trace(name, **attributes)
+
+
+def span(name: str, **attributes) -> Union[Span, _NoopSpan]:
+    return tracer.span(name, **attributes)
+
+
+def current_span() -> Union[Span, _NoopSpan]:
+    """The innermost open span (a no-op stand-in outside a sampled trace)."""
+    return _current.get() or _NOOP
+
+
+def traced(name: str) -> Callable:
+    """Decorator: run each call of a (sync or async) function in a child span."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
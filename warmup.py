@@ -0,0 +1,89 @@
+"""
+Startup warm-up and readiness.
+
+The app registers named warm-up steps (open pooled connections to the LLM
+provider and the Zoho hosts, refresh Zoho tokens, optionally prime the
+model); `start()` runs them concurrently in the background right after
+startup, each bounded by `timeout`. `ready` flips to True once every step
+has finished — failed or timed-out steps are logged and reported but never
+keep the instance out of rotation, since a cold request still works.
+
+GET /ready reports this state (503 until warm-up is done) while /health
+keeps answering from the first moment for liveness checks.
+"""
+
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Awaitable[Optional[Dict]]]
+
+
+class Warmup:
+    """Runs warm-up steps once and tracks readiness."""
+
+    def __init__(self, timeout: float = 15.0, enabled: bool = True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._steps: Dict[str, Step] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.ready = False
+        self.results: Dict[str, Dict] = {}
+        self.total_ms: Optional[float] = None
+
+    def add(self, name: str, step: Step):
+        """Register a step; it may return a dict of details for /ready."""
+        self._steps[name] = step
+
+    def start(self):
+        if not self.enabled:
+            self.ready = True
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def _run_step(self, name: str, step: Step):
+        start = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(step(), self.timeout)
+            result = {"ok": True}
+            if details:
+                result.update(details)
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout:.0f}s"}
+        except Exception as exc:
+            result = {"ok": False, "error": f"{type(exc).__name__}: {exc}"[:200]}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.results[name] = result
+        if not result["ok"]:
+            logger.warning("Warm-up step %s failed (%.0f ms): %s", name, result["ms"], result["error"])
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self._steps.items()))
+        self.total_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.ready = True
+        STARTUP_SECONDS.labels("warmup").set(self.total_ms / 1000)
+        logger.info("Warm-up finished in %.0f ms", self.total_ms,
+                    extra={"warmup_ms": self.total_ms, "steps": self.results})
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "steps": self.results,
+        }
@@ -0,0 +1,164 @@
+"""
+SalesIQ webhook payload decoding and reply rendering.
+
+Incoming bodies are decoded once into a small typed struct — only the
+fields the bot uses (`handler`, `message.text`, `visitor.active_conversation_id`,
+`visitor.email`, `visitor.name`) — and validated on the way, so a malformed
+request gets a clear 4xx instead of surfacing as an error deep in a handler:
+
+    400  empty body or invalid JSON
+    413  body larger than `MAX_BODY_BYTES`
+    422  valid JSON of the wrong shape (not an object, wrong field types)
+
+`message` may also be a plain string, taken as the message text. Text
+fields must be strings; only the conversation ids also accept integers.
+
+Replies are rendered straight to bytes. Fixed replies (greeting, reset,
+transfer, fallbacks) are `StaticReply` objects serialized once at startup:
+per request only the session id is encoded and spliced in.
+
+orjson is used when installed (several times faster than the stdlib for
+both directions); otherwise the stdlib `json` module with compact output.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    dumps = orjson.dumps
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover - depends on the environment
+    loads = json.loads
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    JSON_BACKEND = "json"
+
+# Far above any real SalesIQ event (messages are capped well below this)
+MAX_BODY_BYTES = 256 * 1024
+
+_JSON_MEDIA_TYPE = "application/json"
+
+
+class PayloadError(ValueError):
+    """The webhook body is not a usable SalesIQ payload."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+    def response(self) -> Response:
+        return Response(dumps({"error": self.detail}), status_code=self.status_code,
+                        media_type=_JSON_MEDIA_TYPE)
+
+
+@dataclass(slots=True)
+class Visitor:
+    active_conversation_id: str = ""
+    email: str = ""
+    name: str = ""
+
+
+@dataclass(slots=True)
+class WebhookPayload:
+    handler: str
+    message: str
+    session_id: str
+    visitor: Visitor
+
+
+def _field(obj: Dict, key: str, where: str) -> str:
+    """Optional string field; anything else is a 422."""
+    value = obj.get(key)
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    raise PayloadError(422, f"{where}{key} must be a string")
+
+
+def _id_field(obj: Dict, key: str, where: str) -> str:
+    """Optional id field: a string or an integer (some senders emit numeric ids)."""
+    value = obj.get(key)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    return _field(obj, key, where)
+
+
+def _object(obj: Dict, key: str) -> Dict:
+    value = obj.get(key)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise PayloadError(422, f"{key} must be an object")
+    return value
+
+
+def parse_webhook(body: bytes) -> WebhookPayload:
+    """Decode and validate a SalesIQ webhook body (raises PayloadError)."""
+    if not body:
+        raise PayloadError(400, "empty request body")
+    if len(body) > MAX_BODY_BYTES:
+        raise PayloadError(413, f"request body larger than {MAX_BODY_BYTES} bytes")
+    try:
+        data = loads(body)
+    except ValueError as exc:  # orjson.JSONDecodeError and json.JSONDecodeError both subclass it
+        raise PayloadError(400, f"invalid JSON: {exc}") from None
+    if not isinstance(data, dict):
+        raise PayloadError(422, "payload must be a JSON object")
+
+    message = data.get("message")
+    text = message if isinstance(message, str) else _field(_object(data, "message"), "text", "message.")
+    visitor = _object(data, "visitor")
+    session_id = _id_field(visitor, "active_conversation_id", "visitor.") or _id_field(data, "session_id", "")
+    return WebhookPayload(
+        handler=_field(data, "handler", ""),
+        message=text,
+        session_id=session_id or "unknown",
+        visitor=Visitor(
+            active_conversation_id=session_id,
+            email=_field(visitor, "email", "visitor."),
+            name=_field(visitor, "name", "visitor."),
+        ),
+    )
+
+
+def render_reply(replies: List[str], session_id: str, suggestions: Optional[List[Dict]] = None) -> Response:
+    """SalesIQ "reply" action, encoded in one pass."""
+    content: Dict = {"action": "reply", "replies": replies, "session_id": session_id}
+    if suggestions:
+        content["suggestions"] = suggestions
+    return Response(dumps(content), media_type=_JSON_MEDIA_TYPE)
+
+
+class StaticReply:
+    """A reply whose body is fixed except for the session id.
+
+    Everything but the session id is serialized once; `render()` encodes the
+    id and joins three byte strings.
+    """
+
+    def __init__(self, replies: List[str], suggestions: Optional[List[Dict]] = None, **extra):
+        content: Dict = {"action": "reply", **extra, "replies": replies}
+        if suggestions:
+            content["suggestions"] = suggestions
+        encoded = dumps(content)
+        # '{..."replies":[...]}' → '{..."replies":[...],"session_id":' + id + '}'
+        self._prefix = encoded[:-1] + b',"session_id":'
+        self._suffix = b"}"
+
+    def render(self, session_id: str) -> Response:
+        return Response(self._prefix + dumps(session_id) + self._suffix, media_type=_JSON_MEDIA_TYPE)
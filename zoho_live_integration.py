@@ -7,23 +7,215 @@ Three separate token sets:
   3. Desk Standard      → callback activities
 
 Each auto-refreshes on 401/400 "Invalid OAuthToken" errors.
+
+All calls share one long-lived, keep-alive `httpx.AsyncClient` per Zoho host
+(salesiq / desk / accounts) via `zoho_http`, opened and closed by the app's
+lifespan.
 """
 
 from __future__ import annotations
 
 import os
+import time
+import asyncio
 import logging
+import contextvars
 from typing import Dict, List, Optional
 
 import httpx
 
+from deadline import stage, timeout_for
+from metrics import ZOHO_SECONDS
+from tracing import span, trace
+
 logger = logging.getLogger(__name__)
 
 ZOHO_ACCOUNTS_URL = os.getenv("ZOHO_ACCOUNTS_URL", "https://accounts.zoho.in")
 
+# ── HTTP pool configuration ──
+ZOHO_HTTP_MAX_CONNECTIONS = int(os.getenv("ZOHO_HTTP_MAX_CONNECTIONS", "20"))
+ZOHO_HTTP_MAX_KEEPALIVE = int(os.getenv("ZOHO_HTTP_MAX_KEEPALIVE", "10"))
+ZOHO_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("ZOHO_HTTP_KEEPALIVE_EXPIRY", "60"))
+ZOHO_HTTP2 = os.getenv("ZOHO_HTTP2", "false").lower() == "true"
+
+# Per-endpoint request timeouts (seconds), overridable via ZOHO_TIMEOUT_<NAME>
+ZOHO_TIMEOUTS = {
+    name: float(os.getenv(f"ZOHO_TIMEOUT_{name.upper()}", default))
+    for name, default in (
+        ("transfer", "15"),
+        ("callback", "10"),
+        ("close", "10"),
+        ("token", "10"),
+    )
+}
+
+
+class ZohoHttpPool:
+    """One pooled, keep-alive `httpx.AsyncClient` per Zoho host.
+
+    - Clients are created lazily on first use, or up-front by `start()`.
+    - Pool limits and HTTP/2 come from the ZOHO_HTTP_* settings; HTTP/2 is
+      only enabled when the optional `h2` package is installed.
+    - Every request goes through `request()`, which applies the endpoint's
+      timeout and records per-host statistics for `stats()`.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive: int = 10,
+                 keepalive_expiry: float = 60.0, http2: bool = False):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and self._h2_available()
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _h2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("ZOHO_HTTP2 requested but 'h2' is not installed — using HTTP/1.1")
+            return False
+
+    def client_for(self, host: str) -> httpx.AsyncClient:
+        """Return the shared client for `host`, creating it if needed."""
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(limits=self._limits, http2=self.http2)
+            self._clients[host] = client
+            self._stats.setdefault(host, {
+                "requests": 0, "errors": 0, "in_flight": 0, "total_ms": 0.0,
+            })
+        return client
+
+    async def start(self, urls: List[str]):
+        """Create clients for the given base URLs ahead of the first request."""
+        for url in urls:
+            self.client_for(httpx.URL(url).host)
+        logger.info("Zoho HTTP pool ready: hosts=%s, http2=%s", list(self._clients), self.http2)
+
+    async def warm_up(self, urls: List[str], timeout: float = 5.0) -> Dict:
+        """Open one pooled connection per host (TCP + TLS) before real traffic.
+
+        Sends a HEAD to each base URL; any HTTP status means the connection
+        is up and kept alive, so only transport errors are reported.
+        """
+        async def _open(url: str):
+            start = time.perf_counter()
+            try:
+                response = await self.client_for(httpx.URL(url).host).head(url, timeout=timeout)
+                result = {"status_code": response.status_code}
+            except httpx.HTTPError as exc:
+                result = {"error": f"{type(exc).__name__}: {exc}"[:200]}
+            result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return httpx.URL(url).host, result
+
+        hosts = dict(await asyncio.gather(*(_open(url) for url in dict.fromkeys(urls))))
+        failed = [host for host, result in hosts.items() if "error" in result]
+        if failed:
+            logger.warning("Zoho warm-up could not connect to %s", failed)
+        return hosts
+
+    async def aclose(self):
+        """Close every pooled client (called on app shutdown)."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    async def request(self, method: str, url: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Send a request through the host's pooled client with the endpoint timeout.
+
+        Inside a webhook the timeout is capped by the request's remaining
+        deadline budget (DeadlineExceeded if it is already spent).
+        """
+        host = httpx.URL(url).host
+        client = self.client_for(host)
+        stats = self._stats[host]
+        kwargs.setdefault("timeout", timeout_for(ZOHO_TIMEOUTS.get(endpoint, 10.0), minimum=0.2))
+
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with stage(f"zoho_{endpoint}"), span(f"zoho.{endpoint}", method=method, host=host) as s:
+                response = await client.request(method, url, **kwargs)
+                s.set("status_code", response.status_code)
+            outcome = f"{response.status_code // 100}xx"
+            return response
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats["in_flight"] -= 1
+            stats["total_ms"] += elapsed * 1000
+            ZOHO_SECONDS.labels(endpoint, outcome).observe(elapsed)
+
+    def stats(self) -> Dict:
+        """Per-host request counters and connection-pool occupancy."""
+        out = {}
+        for host, stats in self._stats.items():
+            entry = dict(stats)
+            entry["avg_ms"] = round(stats["total_ms"] / stats["requests"], 1) if stats["requests"] else 0.0
+            entry["total_ms"] = round(stats["total_ms"], 1)
+            # httpx does not expose pool state publicly; read it best-effort from httpcore
+            client = self._clients.get(host)
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = getattr(pool, "connections", None)
+            if connections is not None:
+                entry["connections"] = len(connections)
+                entry["idle_connections"] = sum(1 for c in connections if c.is_idle())
+            out[host] = entry
+        return out
+
+
+zoho_http = ZohoHttpPool(
+    max_connections=ZOHO_HTTP_MAX_CONNECTIONS,
+    max_keepalive=ZOHO_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=ZOHO_HTTP_KEEPALIVE_EXPIRY,
+    http2=ZOHO_HTTP2,
+)
+
+SALESIQ_BASE_URL = os.getenv("SALESIQ_BASE_URL", "https://salesiq.zoho.in")
+DESK_BASE_URL = os.getenv("DESK_BASE_URL", "https://desk.zoho.in")
+
+# ── Token refresh configuration ──
+# Refresh this many seconds before `expires_in` runs out
+ZOHO_TOKEN_REFRESH_MARGIN = float(os.getenv("ZOHO_TOKEN_REFRESH_MARGIN", "300"))
+# Upper bound on how long the background refresher sleeps between checks
+ZOHO_TOKEN_CHECK_INTERVAL = float(os.getenv("ZOHO_TOKEN_CHECK_INTERVAL", "60"))
+# Wait this long before retrying a failed background refresh
+ZOHO_TOKEN_RETRY_DELAY = float(os.getenv("ZOHO_TOKEN_RETRY_DELAY", "60"))
+# Lifetime assumed when a token response has no usable `expires_in` (Zoho: 1 hour)
+ZOHO_TOKEN_DEFAULT_TTL = float(os.getenv("ZOHO_TOKEN_DEFAULT_TTL", "3600"))
+
+# label → (access token attr, client id attr, client secret attr, refresh token attr)
+_TOKEN_SETS = {
+    "SalesIQ-Standard": (
+        "salesiq_access_token", "_salesiq_client_id", "_salesiq_client_secret", "_salesiq_refresh",
+    ),
+    "SalesIQ-Visitor": (
+        "visitor_access_token", "_visitor_client_id", "_visitor_client_secret", "_visitor_refresh",
+    ),
+    "Desk": (
+        "desk_access_token", "_desk_client_id", "_desk_client_secret", "_desk_refresh",
+    ),
+}
+
 
 class TokenManager:
-    """Manages three Zoho OAuth token sets with automatic refresh."""
+    """Manages three Zoho OAuth token sets with automatic refresh.
+
+    - Concurrent refreshes of the same token set share one in-flight request.
+    - Callers pass the token that was rejected; if it has already been
+      replaced, no new refresh is made.
+    - A background task refreshes each token `ZOHO_TOKEN_REFRESH_MARGIN`
+      seconds before its `expires_in` runs out.
+    """
 
     def __init__(self):
         # ── SalesIQ Standard Token (chat closure) ──
@@ -53,6 +245,12 @@ class TokenManager:
         self.desk_org_id = os.getenv("DESK_ORG_ID", "").strip()
         self.desk_dept_id = os.getenv("DESK_DEPARTMENT_ID", "").strip()
 
+        # ── Refresh state ──
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._expires_at: Dict[str, float] = {}     # monotonic deadline per label
+        self._retry_at: Dict[str, float] = {}       # backoff after a failed refresh
+        self._refresher: Optional[asyncio.Task] = None
+
         self._log_status()
 
     # ── Internal helpers ──────────────────────────────────────────
@@ -73,6 +271,14 @@ class TokenManager:
             logger.warning("Token refresh skipped (%s) — missing credentials", label)
             return None
 
+        # Its own trace when run by the background refresher
+        with trace("zoho.token_refresh", label=label) as s:
+            new_token = await self._request_token(client_id, client_secret, refresh_token, label)
+            s.set("refreshed", bool(new_token))
+            return new_token
+
+    async def _request_token(self, client_id: str, client_secret: str,
+                             refresh_token: str, label: str) -> Optional[str]:
         try:
             url = f"{ZOHO_ACCOUNTS_URL}/oauth/v2/token"
             payload = {
@@ -81,13 +287,24 @@ class TokenManager:
                 "client_secret": client_secret,
                 "refresh_token": refresh_token,
             }
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(url, data=payload)
+            resp = await zoho_http.request("POST", url, "token", data=payload)
 
             if resp.status_code == 200:
                 data = resp.json()
                 new_token = data.get("access_token", "")
-                logger.info("%s token refreshed (expires_in=%s)", label, data.get("expires_in"))
+                expires_in = data.get("expires_in")
+                logger.info("%s token refreshed (expires_in=%s)", label, expires_in)
+                if new_token:
+                    try:
+                        ttl = float(expires_in)
+                    except (TypeError, ValueError):
+                        ttl = 0.0
+                    if ttl <= 0:
+                        # Unknown expiry would make the background loop refresh every second
+                        logger.warning("%s token response has no usable expires_in — assuming %.0fs",
+                                       label, ZOHO_TOKEN_DEFAULT_TTL)
+                        ttl = ZOHO_TOKEN_DEFAULT_TTL
+                    self._expires_at[label] = time.monotonic() + ttl
                 return new_token
 
             logger.error("%s refresh failed: %s — %s", label, resp.status_code, resp.text[:200])
@@ -96,40 +313,128 @@ class TokenManager:
             logger.error("%s refresh exception: %s", label, exc)
             return None
 
-    # ── Public refresh methods ────────────────────────────────────
+    def _configured(self, label: str) -> bool:
+        _, client_id, client_secret, refresh_token = _TOKEN_SETS[label]
+        return all(getattr(self, a) for a in (client_id, client_secret, refresh_token))
 
-    async def refresh_salesiq_standard(self) -> bool:
-        """Refresh the SalesIQ standard token (chat closure)."""
+    async def _refresh_set(self, label: str) -> bool:
+        attr, client_id, client_secret, refresh_token = _TOKEN_SETS[label]
         new = await self._refresh(
-            self._salesiq_client_id, self._salesiq_client_secret,
-            self._salesiq_refresh, "SalesIQ-Standard",
+            getattr(self, client_id), getattr(self, client_secret),
+            getattr(self, refresh_token), label,
         )
         if new:
-            self.salesiq_access_token = new
+            setattr(self, attr, new)
+            self._retry_at.pop(label, None)
             return True
+        self._retry_at[label] = time.monotonic() + ZOHO_TOKEN_RETRY_DELAY
         return False
 
-    async def refresh_salesiq_visitor(self) -> bool:
-        """Refresh the SalesIQ visitor/org token (chat transfer)."""
-        new = await self._refresh(
-            self._visitor_client_id, self._visitor_client_secret,
-            self._visitor_refresh, "SalesIQ-Visitor",
-        )
-        if new:
-            self.visitor_access_token = new
+    async def refresh(self, label: str, stale_token: Optional[str] = None) -> bool:
+        """Refresh a token set, coalescing concurrent callers into one request.
+
+        If `stale_token` is given and the current token differs from it, the
+        token was already refreshed by someone else and True is returned
+        without calling Zoho.
+        """
+        attr = _TOKEN_SETS[label][0]
+        if stale_token is not None and getattr(self, attr) != stale_token:
+            logger.info("%s token already refreshed — reusing", label)
             return True
-        return False
 
-    async def refresh_desk(self) -> bool:
+        future = self._inflight.get(label)
+        if future is None:
+            # Created in an empty context: the shared refresh must not inherit
+            # the first caller's request deadline or trace
+            future = contextvars.Context().run(asyncio.ensure_future, self._refresh_set(label))
+            self._inflight[label] = future
+
+            def _done(fut, label=label):
+                if self._inflight.get(label) is fut:
+                    del self._inflight[label]
+            future.add_done_callback(_done)
+        else:
+            logger.info("%s refresh already in flight — waiting", label)
+
+        # Shield so a cancelled caller doesn't cancel the shared refresh
+        return await asyncio.shield(future)
+
+    # ── Public refresh methods ────────────────────────────────────
+
+    async def refresh_salesiq_standard(self, stale_token: Optional[str] = None) -> bool:
+        """Refresh the SalesIQ standard token (chat closure)."""
+        return await self.refresh("SalesIQ-Standard", stale_token)
+
+    async def refresh_salesiq_visitor(self, stale_token: Optional[str] = None) -> bool:
+        """Refresh the SalesIQ visitor/org token (chat transfer)."""
+        return await self.refresh("SalesIQ-Visitor", stale_token)
+
+    async def refresh_desk(self, stale_token: Optional[str] = None) -> bool:
         """Refresh the Desk standard token (callbacks)."""
-        new = await self._refresh(
-            self._desk_client_id, self._desk_client_secret,
-            self._desk_refresh, "Desk",
-        )
-        if new:
-            self.desk_access_token = new
-            return True
-        return False
+        return await self.refresh("Desk", stale_token)
+
+    # ── Proactive background refresh ──────────────────────────────
+
+    def _next_due(self, label: str, now: float) -> float:
+        """Seconds until `label` should be refreshed (<= 0 means now)."""
+        retry_at = self._retry_at.get(label)
+        if retry_at is not None:
+            return retry_at - now
+        expires_at = self._expires_at.get(label)
+        if expires_at is None:
+            return 0.0  # Expiry unknown (token came from env) → refresh to learn it
+        return expires_at - ZOHO_TOKEN_REFRESH_MARGIN - now
+
+    async def _refresh_loop(self):
+        while True:
+            now = time.monotonic()
+            sleep_for = ZOHO_TOKEN_CHECK_INTERVAL
+            for label in _TOKEN_SETS:
+                if not self._configured(label):
+                    continue
+                due_in = self._next_due(label, now)
+                if due_in <= 0:
+                    await self.refresh(label)
+                    due_in = self._next_due(label, time.monotonic())
+                sleep_for = min(sleep_for, max(due_in, 1.0))
+            await asyncio.sleep(sleep_for)
+
+    async def warm_up(self) -> Dict[str, bool]:
+        """Refresh every configured token set whose expiry is unknown or close.
+
+        Run once at startup so the first transfer/close/callback doesn't pay
+        for a 401 and a refresh, and so bad refresh credentials show up in the
+        startup log. Sets are refreshed concurrently; shares in-flight
+        refreshes with the background task.
+        """
+        now = time.monotonic()
+        labels = [label for label in _TOKEN_SETS
+                  if self._configured(label) and self._next_due(label, now) <= 0]
+        results = await asyncio.gather(*(self.refresh(label) for label in labels))
+        return dict(zip(labels, results))
+
+    def start_background_refresh(self):
+        """Start refreshing tokens ahead of expiry (call from app startup)."""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def status(self) -> Dict:
+        """Seconds until each configured token expires (None if unknown)."""
+        now = time.monotonic()
+        return {
+            label: (round(self._expires_at[label] - now) if label in self._expires_at else None)
+            for label in _TOKEN_SETS
+            if self._configured(label)
+        }
 
 
 # ── Singleton ─────────────────────────────────────────────────────
@@ -159,7 +464,7 @@ async def transfer_to_agent(
             "message": "Bot preview sessions cannot be transferred. Use a real visitor session.",
         }
 
-    base_url = f"https://salesiq.zoho.in/api/visitor/v1/{tokens.screen_name}"
+    base_url = f"{SALESIQ_BASE_URL}/api/visitor/v1/{tokens.screen_name}"
     endpoint = f"{base_url}/conversations"
 
     # Fallback defaults — overridden below by real visitor data from SalesIQ
@@ -188,22 +493,21 @@ async def transfer_to_agent(
         },
     }
 
+    used_token = tokens.visitor_access_token
     headers = {
-        "Authorization": f"Zoho-oauthtoken {tokens.visitor_access_token}",
+        "Authorization": f"Zoho-oauthtoken {used_token}",
         "Content-Type": "application/json",
     }
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(endpoint, json=payload, headers=headers)
+        response = await zoho_http.request("POST", endpoint, "transfer", json=payload, headers=headers)
 
         # Auto-refresh on expired token
         if response.status_code in (400, 401) and "Invalid" in response.text:
             logger.warning("Visitor token expired (%s). Refreshing…", response.status_code)
-            if await tokens.refresh_salesiq_visitor():
+            if await tokens.refresh_salesiq_visitor(stale_token=used_token):
                 headers["Authorization"] = f"Zoho-oauthtoken {tokens.visitor_access_token}"
-                async with httpx.AsyncClient(timeout=15.0) as client:
-                    response = await client.post(endpoint, json=payload, headers=headers)
+                response = await zoho_http.request("POST", endpoint, "transfer", json=payload, headers=headers)
                 logger.info("Transfer retry response: %s", response.status_code)
             else:
                 return {"success": False, "error": "token_refresh_failed",
@@ -269,32 +573,29 @@ async def create_callback_activity(
         # Remove 'type' since Calls API uses explicit endpoint
     }
 
+    used_token = tokens.desk_access_token
     headers = {
-        "Authorization": f"Zoho-oauthtoken {tokens.desk_access_token}",
+        "Authorization": f"Zoho-oauthtoken {used_token}",
         "Content-Type": "application/json",
         "orgId": tokens.desk_org_id,
     }
 
     try:
         # Desk API v1 specific endpoint for Calls
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                "https://desk.zoho.in/api/v1/calls",
-                json=activity_data,
-                headers=headers,
-            )
+        response = await zoho_http.request(
+            "POST", f"{DESK_BASE_URL}/api/v1/calls", "callback",
+            json=activity_data, headers=headers,
+        )
 
         # Auto-refresh on expired token
-        if response.status_code in (400, 401) and "Invalid" in response.text.lower():
+        if response.status_code in (400, 401) and "invalid" in response.text.lower():
             logger.warning("Desk token expired (%s). Refreshing…", response.status_code)
-            if await tokens.refresh_desk():
+            if await tokens.refresh_desk(stale_token=used_token):
                 headers["Authorization"] = f"Zoho-oauthtoken {tokens.desk_access_token}"
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.post(
-                        "https://desk.zoho.in/api/v1/calls",
-                        json=activity_data,
-                        headers=headers,
-                    )
+                response = await zoho_http.request(
+                    "POST", f"{DESK_BASE_URL}/api/v1/calls", "callback",
+                    json=activity_data, headers=headers,
+                )
                 logger.info("Callback retry response: %s", response.status_code)
             else:
                 return {"success": False, "error": "token_refresh_failed",
@@ -334,25 +635,24 @@ async def close_chat(session_id: str) -> Dict:
     Called when the issue is resolved and confirmed by the user.
     Uses the SalesIQ v2 API (PUT method).
     """
-    base_url = f"https://salesiq.zoho.in/api/v2/{tokens.screen_name}"
+    base_url = f"{SALESIQ_BASE_URL}/api/v2/{tokens.screen_name}"
     endpoint = f"{base_url}/conversations/{session_id}/close"
 
+    used_token = tokens.salesiq_access_token
     headers = {
-        "Authorization": f"Zoho-oauthtoken {tokens.salesiq_access_token}",
+        "Authorization": f"Zoho-oauthtoken {used_token}",
         "Content-Type": "application/json",
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.put(endpoint, headers=headers)
+        response = await zoho_http.request("PUT", endpoint, "close", headers=headers)
 
         # Auto-refresh on expired token
         if response.status_code in (400, 401) and "Invalid" in response.text:
             logger.warning("SalesIQ standard token expired. Refreshing…")
-            if await tokens.refresh_salesiq_standard():
+            if await tokens.refresh_salesiq_standard(stale_token=used_token):
                 headers["Authorization"] = f"Zoho-oauthtoken {tokens.salesiq_access_token}"
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.put(endpoint, headers=headers)
+                response = await zoho_http.request("PUT", endpoint, "close", headers=headers)
             else:
                 return {"success": False, "error": "token_refresh_failed"}
 